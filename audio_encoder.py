@@ -1,84 +1,339 @@
-import subprocess
 import asyncio
+import hashlib
+import json
+import time
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Optional
+from typing import Dict, Iterable, List, Optional
 
-AUDIO_DIR = Path(__file__).resolve().parent / "Molda Voice" / "greetings"
+import metrics
+from audio_source import invalidate_packets, validate_opus_file
+from config import ENCODE_CONCURRENCY
+from log import audio_log
+
+BASE_DIR = Path(__file__).resolve().parent
+AUDIO_DIR = BASE_DIR / "Molda Voice" / "greetings"
+MANIFEST_FILE = BASE_DIR / ".cache" / "encode_manifest.json"
+
+# Everything that affects the encoded bytes; changing any value rebuilds all outputs
+ENCODE_PROFILE = {
+    "codec": "libopus",
+    "sample_rate": 48000,  # Discord requires 48kHz
+    "channels": 2,  # Stereo
+    "bitrate": "128k",  # Proper bitrate
+    "application": "voip",  # Optimize for voice
+}
+PROFILE_ID = hashlib.sha256(json.dumps(ENCODE_PROFILE, sort_keys=True).encode()).hexdigest()[:16]
+
+
+@dataclass
+class EncodeResult:
+    source: Path
+    output: Optional[Path]
+    seconds: float
+    skipped: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return self.output is not None
+
+
+@dataclass
+class EncodeReport:
+    results: List[EncodeResult] = field(default_factory=list)
+    wall_seconds: float = 0.0
+    concurrency: int = 1
+    cancelled: bool = False
+
+    @property
+    def encoded(self) -> int:
+        return sum(1 for r in self.results if r.ok and not r.skipped)
+
+    @property
+    def skipped(self) -> int:
+        return sum(1 for r in self.results if r.skipped)
+
+    @property
+    def failed(self) -> int:
+        return sum(1 for r in self.results if not r.ok)
+
+    def summary(self) -> str:
+        cpu = sum(r.seconds for r in self.results)
+        return (
+            f"{self.encoded} encoded, {self.skipped} up to date, {self.failed} failed "
+            f"in {self.wall_seconds:.1f}s wall ({cpu:.1f}s total, {self.concurrency} parallel)"
+            + (" [cancelled]" if self.cancelled else "")
+        )
+
+
+# source path (relative to BASE_DIR) -> {source/output size, mtime_ns, sha256, profile}
+_manifest: Dict[str, dict] = {}
+_manifest_loaded = False
+
+# Batch of the running `encode_all_mp3s`, so it can be cancelled from a command
+_current_encode: Optional[asyncio.Future] = None
+
+
+def _load_manifest() -> None:
+    global _manifest_loaded
+    _manifest_loaded = True
+    try:
+        _manifest.update(json.loads(MANIFEST_FILE.read_text(encoding="utf8")))
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError) as e:
+        audio_log.warning("Ignoring unreadable encode manifest: %s", e)
+
+
+def reload_manifest() -> None:
+    """Re-read the manifest from disk, dropping what's in memory."""
+    _manifest.clear()
+    _load_manifest()
+
+
+def _save_manifest() -> None:
+    try:
+        MANIFEST_FILE.parent.mkdir(exist_ok=True)
+        tmp = MANIFEST_FILE.with_suffix(".tmp")
+        tmp.write_text(json.dumps(_manifest, indent=2, sort_keys=True), encoding="utf8")
+        tmp.replace(MANIFEST_FILE)
+    except OSError as e:
+        audio_log.error("Failed to save encode manifest: %s", e)
+
+
+def _manifest_key(path: Path) -> str:
+    path = path.resolve()
+    try:
+        return path.relative_to(BASE_DIR).as_posix()
+    except ValueError:
+        return str(path)
+
+
+def _sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _stat_matches(st, entry: dict, prefix: str) -> bool:
+    return entry.get(f"{prefix}_size") == st.st_size and entry.get(f"{prefix}_mtime_ns") == st.st_mtime_ns
+
+
+async def _rebuild_reason(mp3_file: Path, opus_file: Path) -> Optional[str]:
+    """Return why `opus_file` must be (re)built, or None if it is up to date.
+
+    The common case costs two stats: files whose size and mtime match the
+    manifest are trusted without hashing or validating.
+    """
+    entry = _manifest.get(_manifest_key(mp3_file))
+    if not opus_file.exists():
+        return "missing output"
+    if entry is None:
+        return "not in manifest"
+    if entry.get("profile") != PROFILE_ID:
+        return "encode profile changed"
+
+    src_st = mp3_file.stat()
+    if not _stat_matches(src_st, entry, "source"):
+        if await asyncio.to_thread(_sha256, mp3_file) != entry.get("source_sha256"):
+            return "source changed"
+        # Touched but identical: remember the new stat so we don't hash again
+        entry["source_size"], entry["source_mtime_ns"] = src_st.st_size, src_st.st_mtime_ns
+
+    out_st = opus_file.stat()
+    if not _stat_matches(out_st, entry, "output"):
+        if not await asyncio.to_thread(validate_opus_file, opus_file):
+            return "output failed validation"
+        if await asyncio.to_thread(_sha256, opus_file) != entry.get("output_sha256"):
+            return "output modified"
+        entry["output_size"], entry["output_mtime_ns"] = out_st.st_size, out_st.st_mtime_ns
+    return None
+
+
+async def _record(mp3_file: Path, opus_file: Path) -> None:
+    src_st, out_st = mp3_file.stat(), opus_file.stat()
+    _manifest[_manifest_key(mp3_file)] = {
+        "profile": PROFILE_ID,
+        "source_size": src_st.st_size,
+        "source_mtime_ns": src_st.st_mtime_ns,
+        "source_sha256": await asyncio.to_thread(_sha256, mp3_file),
+        "output_size": out_st.st_size,
+        "output_mtime_ns": out_st.st_mtime_ns,
+        "output_sha256": await asyncio.to_thread(_sha256, opus_file),
+    }
 
 
 async def encode_mp3_to_opus(
-    mp3_file: Path, opus_file: Optional[Path] = None, ffmpeg_exec: Optional[str] = None
+    mp3_file: Path,
+    opus_file: Optional[Path] = None,
+    ffmpeg_exec: Optional[str] = None,
+    force: bool = False,
 ) -> Optional[Path]:
     """Convert an MP3 file to Opus format (more memory-efficient).
-    
+
+    The output is written to a temporary file, validated and then moved into
+    place, so a failed encode never leaves a broken .opus behind.
     Returns the path to the .opus file if successful, else None.
     """
     if not mp3_file.exists():
-        print(f"[OPUS] Source file not found: {mp3_file}")
+        audio_log.warning("Source file not found: %s", mp3_file)
         return None
 
     if opus_file is None:
         opus_file = mp3_file.with_suffix(".opus")
 
-    if opus_file.exists():
-        print(f"[OPUS] Opus file already exists: {opus_file.name}")
+    if opus_file.exists() and not force:
+        audio_log.debug("Opus file already exists: %s", opus_file.name)
         return opus_file
 
+    tmp_file = opus_file.with_name(opus_file.name + ".tmp")
     cmd = [
         ffmpeg_exec or "ffmpeg",
         "-i", str(mp3_file),
-        "-c:a", "libopus",
+        "-c:a", ENCODE_PROFILE["codec"],
         "-vn",  # No video
-        "-ar", "48000",  # Discord requires 48kHz
-        "-ac", "2",  # Stereo
-        "-b:a", "128k",  # Proper bitrate
-        "-application", "voip",  # Optimize for voice
+        "-ar", str(ENCODE_PROFILE["sample_rate"]),
+        "-ac", str(ENCODE_PROFILE["channels"]),
+        "-b:a", ENCODE_PROFILE["bitrate"],
+        "-application", ENCODE_PROFILE["application"],
+        "-f", "ogg",  # temp file has no extension to infer the container from
         "-y",
-        str(opus_file)
+        str(tmp_file)
     ]
 
+    proc = None
     try:
-        print(f"[OPUS] Encoding {mp3_file.name} to Opus...")
+        audio_log.info("Encoding %s to Opus...", mp3_file.name)
         proc = await asyncio.create_subprocess_exec(
             *cmd,
             stdout=asyncio.subprocess.PIPE,
             stderr=asyncio.subprocess.PIPE
         )
         stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=300)
-        
+
         if proc.returncode != 0:
-            print(f"[OPUS] Encoding failed ({mp3_file.name}): {stderr.decode()}")
+            audio_log.error("Encoding failed (%s): %s", mp3_file.name, stderr.decode(errors="replace"))
+            tmp_file.unlink(missing_ok=True)
             return None
 
-        print(f"[OPUS] Encoded: {opus_file.name}")
+        if not await asyncio.to_thread(validate_opus_file, tmp_file):
+            audio_log.error("Encoded output for %s failed validation", mp3_file.name)
+            tmp_file.unlink(missing_ok=True)
+            return None
+
+        tmp_file.replace(opus_file)
+        invalidate_packets(opus_file)
+        audio_log.info("Encoded: %s", opus_file.name)
         return opus_file
 
-    except asyncio.TimeoutError:
-        print(f"[OPUS] Encoding timeout for {mp3_file.name}")
+    except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+        # Don't leave ffmpeg running or a half-written .opus behind
+        if proc is not None and proc.returncode is None:
+            proc.kill()
+            await proc.wait()
+        tmp_file.unlink(missing_ok=True)
+        if isinstance(e, asyncio.CancelledError):
+            audio_log.info("Encoding cancelled for %s", mp3_file.name)
+            raise
+        audio_log.error("Encoding timeout for %s", mp3_file.name)
         return None
     except Exception as e:
-        print(f"[OPUS] Encoding error ({mp3_file.name}): {e}")
+        audio_log.error("Encoding error (%s): %s", mp3_file.name, e)
+        tmp_file.unlink(missing_ok=True)
         return None
 
 
-async def encode_all_mp3s(ffmpeg_exec: Optional[str] = None) -> None:
-    """Pre-encode all MP3 files in Molda Voice to Opus format."""
-    if not AUDIO_DIR.exists():
-        print("[OPUS] Molda Voice directory not found")
-        return
-
-    mp3_files = list(AUDIO_DIR.glob("*.mp3"))
-    if not mp3_files:
-        # Silently skip if no MP3 files (they may already be encoded)
-        return
+async def _encode_timed(
+    sem: asyncio.Semaphore, mp3_file: Path, ffmpeg_exec: Optional[str]
+) -> EncodeResult:
+    opus_file = mp3_file.with_suffix(".opus")
+    start = time.perf_counter()
+    try:
+        reason = await _rebuild_reason(mp3_file, opus_file)
+    except OSError as e:
+        reason = f"stat failed ({e})"
+    if reason is None:
+        return EncodeResult(mp3_file, opus_file, time.perf_counter() - start, skipped=True)
 
-    print(f"[OPUS] Found {len(mp3_files)} MP3 files. Starting encoding...")
-    for mp3_file in mp3_files:
+    async with sem:
+        audio_log.info("Rebuilding %s: %s", opus_file.name, reason)
+        start = time.perf_counter()
         try:
-            await encode_mp3_to_opus(mp3_file, ffmpeg_exec=ffmpeg_exec)
+            output = await encode_mp3_to_opus(mp3_file, opus_file, ffmpeg_exec=ffmpeg_exec, force=True)
+            if output is not None:
+                await _record(mp3_file, output)
+        except asyncio.CancelledError:
+            raise
         except Exception as e:
-            print(f"[OPUS] Skipped encoding for {mp3_file.name}: {e}")
             # Continue encoding other files even if one fails
-            continue
+            audio_log.warning("Skipped encoding for %s: %s", mp3_file.name, e)
+            output = None
+        elapsed = time.perf_counter() - start
+        metrics.encode_file.observe(elapsed, result="ok" if output is not None else "failed")
+        audio_log.debug("%s: %.2fs", mp3_file.name, elapsed)
+        return EncodeResult(mp3_file, output, elapsed)
+
+
+async def encode_all_mp3s(
+    ffmpeg_exec: Optional[str] = None,
+    files: Optional[Iterable[Path]] = None,
+    directory: Path = AUDIO_DIR,
+    concurrency: Optional[int] = None,
+) -> EncodeReport:
+    """Pre-encode MP3 files to Opus format, up to `concurrency` ffmpeg jobs at once.
+
+    Encodes `files` if given, otherwise every MP3 under `directory` (recursively).
+    Outputs are only rebuilt when the encode manifest says the source or the
+    encode profile changed, or the output is missing or fails validation.
+    `concurrency` defaults to ENCODE_CONCURRENCY (CPU count). Cancelling the
+    task kills the running ffmpeg processes and returns a partial report.
+    """
+    global _current_encode
+    if not _manifest_loaded:
+        _load_manifest()
+    concurrency = max(1, concurrency or ENCODE_CONCURRENCY)
+    report = EncodeReport(concurrency=concurrency)
+
+    if files is None:
+        if not directory.exists():
+            audio_log.warning("Molda Voice directory not found")
+            return report
+        mp3_files = sorted(directory.rglob("*.mp3"))
+    else:
+        mp3_files = [Path(f) for f in files]
+
+    if not mp3_files:
+        # Silently skip if no MP3 files (they may already be encoded)
+        return report
+
+    audio_log.info("Found %d MP3 files. Checking against encode manifest (%d parallel)...", len(mp3_files), concurrency)
+    sem = asyncio.Semaphore(concurrency)
+    start = time.perf_counter()
+    tasks = [asyncio.create_task(_encode_timed(sem, f, ffmpeg_exec)) for f in mp3_files]
+    batch = _current_encode = asyncio.gather(*tasks)
+    try:
+        await batch
+    except asyncio.CancelledError:
+        # Let the per-file tasks kill their ffmpeg processes before reporting
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if asyncio.current_task().cancelling():
+            raise  # the caller itself was cancelled, not just the batch
+        report.cancelled = True
+    finally:
+        _current_encode = None
+        _save_manifest()
+
+    report.results = [t.result() for t in tasks if t.done() and not t.cancelled()]
+    report.wall_seconds = time.perf_counter() - start
+    audio_log.info("Encoding complete: %s (failures may be acceptable; playback will fall back to MP3)", report.summary())
+    return report
+
 
-    print("[OPUS] Encoding complete (failures may be acceptable; playback will fall back to MP3)")
+def cancel_encoding() -> bool:
+    """Cancel the running `encode_all_mp3s`, if any. Returns True if one was running."""
+    if _current_encode is None or _current_encode.done():
+        return False
+    _current_encode.cancel()
+    return True
@@ -0,0 +1,82 @@
+"""Cross-process lock around audio preparation (encoding and probe indexing).
+
+Shard processes started by shard_launcher.py share the greetings directory
+and .cache/: encodes write `*.opus.tmp` files, and the encode manifest and
+probe index are rewritten through tmp files and os.replace. Holding an
+exclusive lock on .cache/audio_prep.lock makes the processes take turns;
+whoever gets it first does the work, and the others reload what it wrote,
+find everything up to date and only read.
+"""
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+import audio_encoder
+import probe_index
+from log import audio_log
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+LOCK_FILE = Path(__file__).resolve().parent / ".cache" / "audio_prep.lock"
+
+
+def _try_lock(fd: int) -> bool:
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        return False
+
+
+def _lock(fd: int) -> None:
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        return
+    while True:
+        try:
+            msvcrt.locking(fd, msvcrt.LK_LOCK, 1)  # gives up after ~10s, so retry
+            return
+        except OSError:
+            continue
+
+
+def _release(fd: int) -> None:
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        else:
+            os.lseek(fd, 0, os.SEEK_SET)
+            msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+    finally:
+        os.close(fd)
+
+
+@asynccontextmanager
+async def audio_prep_lock():
+    """Hold the audio-prep lock; on entry, reload the manifest and probe index from disk."""
+    LOCK_FILE.parent.mkdir(exist_ok=True)
+    fd = os.open(LOCK_FILE, os.O_RDWR | os.O_CREAT, 0o644)
+    if not _try_lock(fd):
+        audio_log.info("Waiting for another process to finish audio preparation...")
+        wait = asyncio.get_running_loop().run_in_executor(None, _lock, fd)
+        try:
+            await asyncio.shield(wait)
+        except asyncio.CancelledError:
+            # The thread may still get the lock; release it once it does
+            wait.add_done_callback(lambda f: _release(fd))
+            raise
+    try:
+        # Another process may have rewritten these since we last read them
+        audio_encoder.reload_manifest()
+        probe_index.load_index()
+        yield
+    finally:
+        _release(fd)
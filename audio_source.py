@@ -0,0 +1,132 @@
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import discord
+from discord.oggparse import OggError, OggStream
+
+from decoder_pool import decoder_pool
+from log import audio_log
+from probe_index import get_probe_info
+
+AUDIO_DIR = Path(__file__).resolve().parent / "Molda Voice" / "greetings"
+
+# Ogg Opus header packets (RFC 7845) are not audio and must not be sent
+_HEADER_PREFIXES = (b"OpusHead", b"OpusTags")
+
+# Containers ffmpeg may need to seek in (index at the end), so they can't be fed over a pipe
+_PIPE_UNSAFE_SUFFIXES = {".m4a", ".mp4", ".mov", ".3gp"}
+
+# path -> demuxed 20 ms Opus packets, kept in RAM for the life of the process
+_packet_cache: Dict[Path, List[bytes]] = {}
+
+
+class CachedOpusAudio(discord.AudioSource):
+    """Replay pre-demuxed Opus packets straight to the voice client.
+
+    The packets are shared between plays; each source only keeps its own
+    read position, so creating one per join is essentially free.
+    """
+
+    def __init__(self, packets: List[bytes]):
+        self._packets = packets
+        self._index = 0
+
+    def read(self) -> bytes:
+        if self._index >= len(self._packets):
+            return b""
+        packet = self._packets[self._index]
+        self._index += 1
+        return packet
+
+    def is_opus(self) -> bool:
+        return True
+
+
+def load_packets(path: Path) -> Optional[List[bytes]]:
+    """Return the Opus packets of an Ogg file, demuxing it on first use."""
+    path = Path(path)
+    packets = _packet_cache.get(path)
+    if packets is not None:
+        return packets
+
+    try:
+        with path.open("rb") as f:
+            packets = [
+                p for p in OggStream(f).iter_packets()
+                if p and not p.startswith(_HEADER_PREFIXES)
+            ]
+    except (OSError, OggError) as e:
+        audio_log.error("Failed to demux %s: %s", path.name, e)
+        return None
+
+    if not packets:
+        audio_log.warning("No Opus packets in %s", path.name)
+        return None
+
+    _packet_cache[path] = packets
+    return packets
+
+
+def validate_opus_file(path: Path) -> bool:
+    """Fast container/packet check for an Ogg Opus file.
+
+    Requires the OpusHead and OpusTags header packets followed by at least one
+    audio packet, without decoding anything.
+    """
+    try:
+        with Path(path).open("rb") as f:
+            packets = OggStream(f).iter_packets()
+            if not next(packets, b"").startswith(b"OpusHead"):
+                return False
+            if not next(packets, b"").startswith(b"OpusTags"):
+                return False
+            return bool(next(packets, b""))
+    except (OSError, OggError):
+        return False
+
+
+def invalidate_packets(path: Path) -> None:
+    """Drop cached packets for `path` (e.g. after it was re-encoded)."""
+    _packet_cache.pop(Path(path), None)
+
+
+def preload_packets(directory: Path = AUDIO_DIR) -> int:
+    """Demux every .opus file in `directory` into the cache. Returns the count loaded."""
+    if not directory.exists():
+        return 0
+    loaded = 0
+    for p in sorted(directory.glob("*.opus")):
+        if load_packets(p) is not None:
+            loaded += 1
+    audio_log.info("Cached Opus packets for %d file(s)", loaded)
+    return loaded
+
+
+async def build_source(path: Path, ffmpeg_exec: Optional[str]) -> Optional[discord.AudioSource]:
+    """Build a playback source for `path`.
+
+    `.opus` files are served from the in-memory packet cache; anything else
+    (or an Opus file that fails to demux) goes through ffmpeg, using the
+    probe index for codec/bitrate so ffprobe only runs for unindexed files.
+    Files that need re-encoding take a pre-spawned decoder pool worker when
+    one is idle. Returns None if no source can be built without ffmpeg.
+    """
+    if path.suffix.lower() == ".opus":
+        packets = load_packets(path)
+        if packets is not None:
+            return CachedOpusAudio(packets)
+
+    if ffmpeg_exec is None:
+        return None
+
+    info = get_probe_info(path)
+    if (info is None or not info.is_opus) and path.suffix.lower() not in _PIPE_UNSAFE_SUFFIXES:
+        pooled = decoder_pool.open(path)
+        if pooled is not None:
+            return pooled
+    if info is None:
+        return await discord.FFmpegOpusAudio.from_probe(str(path), executable=ffmpeg_exec)
+    if info.is_opus:
+        return discord.FFmpegOpusAudio(str(path), codec="copy", executable=ffmpeg_exec)
+    bitrate = min(max(round((info.bit_rate or 128000) / 1000), 16), 512)
+    return discord.FFmpegOpusAudio(str(path), bitrate=bitrate, executable=ffmpeg_exec)
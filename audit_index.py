@@ -0,0 +1,158 @@
+import asyncio
+import time
+from typing import Dict, List, Optional, Tuple
+
+import discord
+
+import metrics
+from config import AUDIT_COALESCE_WINDOW
+
+# Same window `find_recent_mute_actor` has always used
+MUTE_WINDOW_SEC = 30
+
+Key = Tuple[int, int]  # (guild_id, target_member_id)
+
+
+def is_server_mute_entry(entry: discord.AuditLogEntry) -> bool:
+    """True if `entry` is a member_update that turned server mute on."""
+    if entry.action is not discord.AuditLogAction.member_update:
+        return False
+    before_mute = getattr(entry.changes.before, "mute", None)
+    after_mute = getattr(entry.changes.after, "mute", None)
+    # Дозволяємо (False або None) -> True
+    return after_mute is True and (before_mute is False or before_mute is None)
+
+
+class MuteAuditIndex:
+    """Recent server-mute audit entries keyed by (guild, target member).
+
+    Fed by the gateway `on_audit_log_entry_create` event, so a mute actor can
+    be resolved with a dict lookup instead of paging the audit log over REST.
+    Entries older than `ttl` seconds are evicted lazily.
+    """
+
+    def __init__(self, ttl: float = MUTE_WINDOW_SEC):
+        self.ttl = ttl
+        # key -> (created_at timestamp, actor); insertion order ~ creation order
+        self._entries: Dict[Key, Tuple[float, discord.abc.Snowflake]] = {}
+        self._waiters: Dict[Key, List[asyncio.Future]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _evict(self, now: float) -> None:
+        while self._entries:
+            key = next(iter(self._entries))
+            created, _ = self._entries[key]
+            if now - created <= self.ttl:
+                break
+            del self._entries[key]
+
+    def record(self, entry: discord.AuditLogEntry) -> bool:
+        """Index `entry` if it is a server mute. Returns True if it was indexed."""
+        if entry.target is None or not is_server_mute_entry(entry):
+            return False
+        # The actor may not be cached; callers only need its id
+        actor = entry.user or (discord.Object(id=entry.user_id) if entry.user_id else None)
+        if actor is None:
+            return False
+
+        created = entry.created_at.timestamp()
+        now = time.time()
+        if now - created > self.ttl:
+            return False
+
+        key = (entry.guild.id, entry.target.id)
+        # Re-insert so the dict stays ordered by arrival for eviction
+        self._entries.pop(key, None)
+        self._entries[key] = (created, actor)
+        self._evict(now)
+
+        for fut in self._waiters.pop(key, ()):
+            if not fut.done():
+                fut.set_result(actor)
+        return True
+
+    def lookup(self, guild_id: int, target_id: int) -> Optional[discord.abc.Snowflake]:
+        """Return the actor of a mute on `target_id` within the TTL, if indexed."""
+        hit = self._entries.get((guild_id, target_id))
+        if hit is None:
+            return None
+        created, actor = hit
+        if time.time() - created > self.ttl:
+            del self._entries[(guild_id, target_id)]
+            return None
+        return actor
+
+    async def wait_for(
+        self, guild_id: int, target_id: int, timeout: float
+    ) -> Optional[discord.abc.Snowflake]:
+        """Return the actor as soon as its entry arrives, or None after `timeout`."""
+        actor = self.lookup(guild_id, target_id)
+        if actor is not None or timeout <= 0:
+            return actor
+
+        key = (guild_id, target_id)
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(key, []).append(fut)
+        try:
+            return await asyncio.wait_for(fut, timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            waiters = self._waiters.get(key)
+            if waiters and fut in waiters:
+                waiters.remove(fut)
+                if not waiters:
+                    del self._waiters[key]
+
+
+class AuditLogCoalescer:
+    """Share one REST audit-log page between mute lookups in the same guild.
+
+    The first lookup opens a short collection window; lookups for the same
+    guild that arrive before the window closes await the same request
+    instead of issuing their own. Lookups arriving after the request went out
+    start a new batch, so nobody reads a page older than their mute.
+    """
+
+    def __init__(self, window: float = AUDIT_COALESCE_WINDOW, limit: int = 50):
+        self.window = window
+        self.limit = limit
+        # guild_id -> fetch task still collecting lookups
+        self._open: Dict[int, asyncio.Task] = {}
+        self.requests_issued = 0
+        self.requests_saved = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {"issued": self.requests_issued, "saved": self.requests_saved}
+
+    async def _fetch(self, guild: discord.Guild) -> List[discord.AuditLogEntry]:
+        try:
+            await asyncio.sleep(self.window)
+        finally:
+            self._open.pop(guild.id, None)
+        entries = [
+            entry async for entry in guild.audit_logs(
+                limit=self.limit, action=discord.AuditLogAction.member_update
+            )
+        ]
+        self.requests_issued += 1
+        metrics.audit_log_requests.inc(result="issued")
+        return entries
+
+    async def fetch(self, guild: discord.Guild) -> List[discord.AuditLogEntry]:
+        """Return a recent page of member_update entries, shared with concurrent callers."""
+        task = self._open.get(guild.id)
+        if task is None:
+            task = asyncio.create_task(self._fetch(guild))
+            self._open[guild.id] = task
+        else:
+            self.requests_saved += 1
+            metrics.audit_log_requests.inc(result="saved")
+        # shield: one caller being cancelled must not cancel the shared request
+        return await asyncio.shield(task)
+
+
+mute_audit_index = MuteAuditIndex()
+audit_log_coalescer = AuditLogCoalescer()
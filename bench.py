@@ -0,0 +1,447 @@
+#!/usr/bin/env python3
+"""Offline benchmarks for the bot's hot paths, driven through fakes.py.
+
+    python bench.py                         # run everything, print a table
+    python bench.py --json run.json         # also write machine-readable results
+    python bench.py --baseline old.json     # run and compare against an earlier run
+    python bench.py --compare old.json new.json [--threshold 0.2]
+
+Benchmarks needing ffmpeg (ffmpeg-built sources, encode_all_mp3s) use
+`--ffmpeg`, FFMPEG_PATH or ffmpeg on PATH, and are skipped without it; the
+bench never downloads ffmpeg. Comparisons flag a benchmark whose p50 grew
+by more than `--threshold` and exit with status 1 if any did.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import discord
+
+import log
+from config import MONITORED_ROLE_ID
+from fakes import FakeGuild, FakeRole, move
+
+BASE_DIR = Path(__file__).resolve().parent
+
+GUILD_ID = 900_000_000_000_000_001
+CHANNEL_A = 910_000_000_000_000_001
+CHANNEL_B = 910_000_000_000_000_002
+FIRST_MEMBER_ID = 920_000_000_000_000_000
+MOD_ID = 930_000_000_000_000_001
+
+# name -> stats dict; filled by the benchmarks in the order they run
+Results = Dict[str, Dict[str, float]]
+
+
+def _stats(samples: List[float], total: float) -> Dict[str, float]:
+    """Per-operation latency stats in microseconds plus throughput."""
+    ordered = sorted(samples)
+    n = len(ordered)
+
+    def pct(q: float) -> float:
+        return ordered[min(n - 1, int(q * n))] * 1e6
+
+    return {
+        "n": n,
+        "ops_per_sec": n / total if total else 0.0,
+        "mean_us": statistics.fmean(ordered) * 1e6,
+        "p50_us": pct(0.50),
+        "p95_us": pct(0.95),
+        "p99_us": pct(0.99),
+        "max_us": ordered[-1] * 1e6,
+    }
+
+
+def _time_sync(fn: Callable[[int], object], n: int, batch: int = 100) -> Dict[str, float]:
+    """Time `fn(i)` in batches so sub-microsecond calls aren't swamped by the timer."""
+    samples = []
+    start = time.perf_counter()
+    for base in range(0, n, batch):
+        t0 = time.perf_counter()
+        for i in range(base, min(n, base + batch)):
+            fn(i)
+        samples.append((time.perf_counter() - t0) / (min(n, base + batch) - base))
+    total = time.perf_counter() - start
+    stats = _stats(samples, total)
+    stats.update(n=n, ops_per_sec=n / total)
+    return stats
+
+
+async def _time_async(fn: Callable[[int], Awaitable[object]], n: int) -> Dict[str, float]:
+    samples = []
+    start = time.perf_counter()
+    for i in range(n):
+        t0 = time.perf_counter()
+        await fn(i)
+        samples.append(time.perf_counter() - t0)
+    return _stats(samples, time.perf_counter() - start)
+
+
+def _ffmpeg(explicit: Optional[str]) -> Optional[str]:
+    return explicit or os.getenv("FFMPEG_PATH") or shutil.which("ffmpeg")
+
+
+def _generate_mp3s(ffmpeg: str, directory: Path, count: int, seconds: float) -> List[Path]:
+    """Write `count` sine-tone MP3s; returns [] if this ffmpeg can't make MP3s."""
+    files = []
+    for i in range(count):
+        out = directory / f"Bench{i}_Molda.mp3"
+        result = subprocess.run(
+            [ffmpeg, "-hide_banner", "-loglevel", "error", "-y", "-f", "lavfi",
+             "-i", f"sine=frequency={220 + 40 * i}:duration={seconds}",
+             "-c:a", "libmp3lame", "-b:a", "128k", str(out)],
+            capture_output=True,
+        )
+        if result.returncode != 0:
+            return []
+        files.append(out)
+    return files
+
+
+class Bench:
+    def __init__(self, iterations: int, ffmpeg: Optional[str], only: Optional[str]):
+        self.iterations = iterations
+        self.ffmpeg = ffmpeg
+        self.only = only
+        self.results: Results = {}
+        self.skipped: Dict[str, str] = {}
+        self.guild = FakeGuild(GUILD_ID)
+        self.channel_a = self.guild.add_channel(CHANNEL_A, "bench-a")
+        self.channel_b = self.guild.add_channel(CHANNEL_B, "bench-b")
+        self.mod = self.guild.add_member(MOD_ID, "moderator", roles=[FakeRole(MONITORED_ROLE_ID)])
+        self.members = [self.guild.add_member(FIRST_MEMBER_ID + i) for i in range(iterations)]
+
+    def wanted(self, name: str) -> bool:
+        return self.only is None or self.only in name
+
+    def record(self, name: str, stats: Dict[str, float]) -> None:
+        self.results[name] = stats
+        print(f"  {name:<40} p50 {stats['p50_us']:>10.1f} us   {stats['ops_per_sec']:>12.0f} ops/s")
+
+    def skip(self, name: str, reason: str) -> None:
+        self.skipped[name] = reason
+        print(f"  {name:<40} skipped: {reason}")
+
+    async def run(self) -> None:
+        for bench in (self.voice_events, self.greeting_lookup, self.mute_actor, self.sources, self.encode):
+            await bench()
+
+    # --- on_voice_state_update, end to end (dispatch + handler tasks) ---
+
+    async def voice_events(self) -> None:
+        import events
+        from audit_index import mute_audit_index
+        from event_router import voice_router
+        from playback_queue import playback_scheduler
+        from voice_supervisor import voice_connections
+
+        guild, a, b = self.guild, self.channel_a, self.channel_b
+        voice_connections[guild.id] = guild.connect_voice(a)
+        n = self.iterations
+
+        async def handle(member, before, after):
+            await events.on_voice_state_update(member, before, after)
+            await voice_router.drain()
+
+        def prepare(channel=None, **flags):
+            for m in self.members:
+                move(m, channel, **flags)
+
+        cases = []
+
+        async def join(i):
+            m = self.members[i]
+            await handle(m, *move(m, a))
+        cases.append(("join", lambda: prepare(None), join))
+
+        async def leave(i):
+            m = self.members[i]
+            await handle(m, *move(m, None))
+        cases.append(("leave", lambda: prepare(b), leave))
+
+        async def move_channel(i):
+            m = self.members[i]
+            await handle(m, *move(m, b))
+        cases.append(("move", lambda: prepare(a), move_channel))
+
+        async def self_mute(i):
+            m = self.members[i]
+            await handle(m, *move(m, a, self_mute=True))
+        cases.append(("noop_self_mute", lambda: prepare(a, self_mute=False), self_mute))
+
+        def prepare_mutes():
+            prepare(a, mute=False)
+            # Mute actors resolve from the gateway index, as they do in production
+            for m in self.members:
+                mute_audit_index.record(guild.add_audit_entry(m, self.mod))
+
+        async def server_mute(i):
+            m = self.members[i]
+            await handle(m, *move(m, a, mute=True))
+        cases.append(("server_mute", prepare_mutes, server_mute))
+
+        async def server_unmute(i):
+            m = self.members[i]
+            await handle(m, *move(m, a, mute=False))
+        # Runs right after server_mute, so every unmute cancels a pending timer
+        cases.append(("server_unmute", lambda: None, server_unmute))
+
+        async def bot_self_move(i):
+            await handle(guild.me, *move(guild.me, b if i % 2 == 0 else a))
+        cases.append(("bot_self_move", lambda: move(guild.me, a), bot_self_move))
+
+        for kind, prepare_case, fn in cases:
+            name = f"voice_state_update.{kind}"
+            if not self.wanted(name):
+                continue
+            prepare_case()
+            self.record(name, await _time_async(fn, n))
+
+        # Greetings queued by the join case would start playing after JOIN_PLAY_DELAY
+        playback_scheduler.player(guild.id).clear()
+        voice_connections.pop(guild.id, None)
+        guild.audit_entries.clear()
+
+    # --- greeting lookup ---
+
+    async def greeting_lookup(self) -> None:
+        from greeting_store import _key, greeting_store
+        from greetings import greeting_registry
+
+        if not greeting_registry.name_to_filename:
+            self.skip("greeting_lookup", "no greeting files found")
+            return
+        names = sorted(greeting_registry.name_to_filename)
+        env_ids = list(greeting_registry.id_to_filename) or [FIRST_MEMBER_ID]
+        n = max(self.iterations, 10_000)
+
+        # Synthetic stored assignments, in memory only; the database is never written
+        saved = greeting_store._map
+        greeting_store._map = {
+            _key(GUILD_ID, FIRST_MEMBER_ID + i): names[i % len(names)] for i in range(n)
+        }
+        try:
+            cases = {
+                "greeting_lookup.stored": lambda i: greeting_registry.resolve_member(FIRST_MEMBER_ID + i, GUILD_ID),
+                "greeting_lookup.env_token": lambda i: greeting_registry.resolve_member(env_ids[i % len(env_ids)]),
+                "greeting_lookup.miss": lambda i: greeting_registry.resolve_member(1 + i, GUILD_ID),
+                "greeting_lookup.default": lambda i: greeting_registry.resolve_default(),
+            }
+            for name, fn in cases.items():
+                if self.wanted(name):
+                    self.record(name, _time_sync(fn, n))
+        finally:
+            greeting_store._map = saved
+
+    # --- find_recent_mute_actor against a synthetic audit log ---
+
+    async def mute_actor(self) -> None:
+        import utils
+        from audit_index import audit_log_coalescer, mute_audit_index
+
+        guild, n = self.guild, self.iterations
+        # 50 entries (one REST page): half unrelated mutes, the target in the middle
+        others = [guild.add_member(MOD_ID + 1 + i) for i in range(25)]
+        for member in others:
+            guild.add_audit_entry(member, self.mod, age=1.0)
+        target = guild.add_member(MOD_ID + 100, "rest-target")
+        guild.add_audit_entry(target, self.mod, age=0.5)
+        for member in others[:24]:
+            guild.add_audit_entry(member, self.mod, age=0.1, mute=False)
+        indexed = guild.add_member(MOD_ID + 200, "indexed-target")
+        mute_audit_index.record(guild.add_audit_entry(indexed, self.mod))
+        missing = guild.add_member(MOD_ID + 300, "never-muted")
+
+        saved_wait, saved_window = utils.AUDIT_EVENT_WAIT, audit_log_coalescer.window
+        # Don't wait for gateway events or a coalescing window between REST lookups
+        utils.AUDIT_EVENT_WAIT, audit_log_coalescer.window = 0, 0
+        try:
+            cases = {"mute_actor.index": indexed, "mute_actor.rest": target, "mute_actor.miss": missing}
+            for name, member in cases.items():
+                if not self.wanted(name):
+                    continue
+                self.record(name, await _time_async(
+                    lambda i, m=member: utils.find_recent_mute_actor(guild, m), n
+                ))
+        finally:
+            utils.AUDIT_EVENT_WAIT, audit_log_coalescer.window = saved_wait, saved_window
+            guild.audit_entries.clear()
+
+    # --- playback source construction ---
+
+    async def sources(self) -> None:
+        from audio_source import build_source
+        from decoder_pool import DecoderPool
+
+        opus_files = sorted((BASE_DIR / "Molda Voice" / "greetings").glob("*.opus"))
+        if self.wanted("source.cached_opus"):
+            if opus_files:
+                for path in opus_files:
+                    # First build demuxes into the cache; time steady-state joins
+                    (await build_source(path, None)).cleanup()
+
+                async def cached(i):
+                    (await build_source(opus_files[i % len(opus_files)], None)).cleanup()
+                self.record("source.cached_opus", await _time_async(cached, self.iterations))
+            else:
+                self.skip("source.cached_opus", "no .opus greetings found")
+
+        if not (self.wanted("source.ffmpeg_mp3") or self.wanted("source.decoder_pool")):
+            return
+        if self.ffmpeg is None:
+            self.skip("source.ffmpeg_mp3", "ffmpeg not found")
+            return
+        with tempfile.TemporaryDirectory() as tmp:
+            mp3s = await asyncio.to_thread(_generate_mp3s, self.ffmpeg, Path(tmp), 1, 2.0)
+            if not mp3s:
+                self.skip("source.ffmpeg_mp3", "ffmpeg could not generate MP3s")
+                return
+            n = min(self.iterations, 100)
+
+            async def ffmpeg_mp3(i):
+                (await build_source(mp3s[0], self.ffmpeg)).cleanup()
+            if self.wanted("source.ffmpeg_mp3"):
+                self.record("source.ffmpeg_mp3", await _time_async(ffmpeg_mp3, n))
+
+            if self.wanted("source.decoder_pool"):
+                pool = DecoderPool(size=4)
+                await pool.start(self.ffmpeg)
+
+                async def pooled(i):
+                    # Wait for the background refill, as a steady trickle of plays would
+                    while not pool.stats()["idle"]:
+                        await asyncio.sleep(0.005)
+                    t0 = time.perf_counter()
+                    pool.open(mp3s[0]).cleanup()
+                    return time.perf_counter() - t0
+
+                samples = [await pooled(i) for i in range(n)]
+                pool.stop()
+                self.record("source.decoder_pool", _stats(samples, sum(samples)))
+
+    # --- encode_all_mp3s on generated audio ---
+
+    async def encode(self) -> None:
+        import audio_encoder
+
+        if not (self.wanted("encode_all_mp3s.cold") or self.wanted("encode_all_mp3s.warm")):
+            return
+        if self.ffmpeg is None:
+            self.skip("encode_all_mp3s", "ffmpeg not found")
+            return
+        with tempfile.TemporaryDirectory() as tmp:
+            directory = Path(tmp)
+            mp3s = await asyncio.to_thread(_generate_mp3s, self.ffmpeg, directory, 8, 5.0)
+            if not mp3s:
+                self.skip("encode_all_mp3s", "ffmpeg could not generate MP3s")
+                return
+            # Private manifest so the real .cache/encode_manifest.json is untouched
+            saved = (audio_encoder.MANIFEST_FILE, dict(audio_encoder._manifest), audio_encoder._manifest_loaded)
+            audio_encoder.MANIFEST_FILE = directory / "manifest.json"
+            audio_encoder._manifest.clear()
+            audio_encoder._manifest_loaded = True
+            try:
+                for name in ("encode_all_mp3s.cold", "encode_all_mp3s.warm"):
+                    t0 = time.perf_counter()
+                    report = await audio_encoder.encode_all_mp3s(ffmpeg_exec=self.ffmpeg, directory=directory)
+                    wall = time.perf_counter() - t0
+                    stats = _stats([r.seconds for r in report.results] or [0.0], wall)
+                    stats.update(files=len(mp3s), wall_s=wall, encoded=report.encoded, failed=report.failed)
+                    self.record(name, stats)
+            finally:
+                audio_encoder.MANIFEST_FILE = saved[0]
+                audio_encoder._manifest.clear()
+                audio_encoder._manifest.update(saved[1])
+                audio_encoder._manifest_loaded = saved[2]
+
+
+def _git_rev() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR,
+                             capture_output=True, text=True, timeout=5)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def compare(old: dict, new: dict, threshold: float) -> bool:
+    """Print per-benchmark p50 changes. Returns True if anything regressed."""
+    regressed = False
+    print(f"{'benchmark':<40} {'old p50':>12} {'new p50':>12} {'change':>9}")
+    for name, stats in new["results"].items():
+        before = old["results"].get(name)
+        if before is None or not before["p50_us"]:
+            print(f"{name:<40} {'-':>12} {stats['p50_us']:>10.1f}us {'new':>9}")
+            continue
+        change = stats["p50_us"] / before["p50_us"] - 1
+        flag = ""
+        if change > threshold:
+            regressed = True
+            flag = "  REGRESSION"
+        print(f"{name:<40} {before['p50_us']:>10.1f}us {stats['p50_us']:>10.1f}us {change:>+8.1%}{flag}")
+    for name in sorted(old["results"].keys() - new["results"].keys()):
+        print(f"{name:<40} missing from new run")
+    return regressed
+
+
+def _load(path: str) -> dict:
+    return json.loads(Path(path).read_text(encoding="utf8"))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", "--iterations", type=int, default=1000, help="operations per benchmark")
+    parser.add_argument("-k", "--only", help="run benchmarks whose name contains this")
+    parser.add_argument("--ffmpeg", help="ffmpeg executable for the ffmpeg benchmarks")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--baseline", help="compare this run against an earlier --json file")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two result files and exit")
+    parser.add_argument("--threshold", type=float, default=0.2, help="p50 growth counted as a regression")
+    parser.add_argument("-v", "--verbose", action="store_true", help="keep the bot's INFO logging")
+    args = parser.parse_args()
+
+    if args.compare:
+        return 1 if compare(_load(args.compare[0]), _load(args.compare[1]), args.threshold) else 0
+
+    if not args.verbose:
+        for subsystem in log.LOG_SUBSYSTEMS:
+            log.set_level(subsystem, "WARNING")
+
+    bench = Bench(args.iterations, _ffmpeg(args.ffmpeg), args.only)
+    print(f"Running benchmarks ({args.iterations} iterations)")
+    asyncio.run(bench.run())
+
+    run = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "git_rev": _git_rev(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "discord_py": discord.__version__,
+            "iterations": args.iterations,
+            "ffmpeg": bench.ffmpeg,
+        },
+        "results": bench.results,
+        "skipped": bench.skipped,
+    }
+    if args.json:
+        Path(args.json).write_text(json.dumps(run, indent=2), encoding="utf8")
+        print(f"Wrote {args.json}")
+    if args.baseline:
+        return 1 if compare(_load(args.baseline), run, args.threshold) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
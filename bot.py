@@ -4,22 +4,37 @@
 import discord
 from discord.ext import commands
 import asyncio
+from pathlib import Path
 
 from config import TOKEN, MONITORED_ROLE_ID
 from config import TOKEN, MONITORED_ROLE_ID, MOLDA_CHANNEL_ID
-from voice_commands import join_voice, leave_voice, play_join, stop_audio
+from voice_commands import join_voice, leave_voice, play_join, stop_audio, show_playback_queue
 import events
-from events import molda_rejoin_targets, molda_rejoin_tasks
-from greetings import register_greeting_commands
-from audio_encoder import encode_all_mp3s
-from ffmpeg_helper import get_ffmpeg_exec
+from molda_watchdog import molda_watchdog
+from greetings import register_greeting_commands, assign_greeting, unassign_greeting
+from audio_encoder import encode_all_mp3s, cancel_encoding
+from audio_prep import audio_prep_lock
+from probe_index import refresh_index
+from unmute_scheduler import unmute_scheduler
+from unmute_dispatcher import unmute_dispatcher
+from ffmpeg_helper import resolve_ffmpeg
+from startup import startup
+from voice_supervisor import voice_supervisor
+from decoder_pool import decoder_pool
+from voice_trace import default_trace_path, trace_recorder
+from profiler import live_profiler
+from loop_monitor import loop_monitor
+from sharding import create_bot, cluster_status
+from cache_profile import build_intents, client_options, describe as describe_cache_profile
+import log
+import metrics
 
-intents = discord.Intents.default()
-intents.guilds = True
-intents.voice_states = True
-intents.message_content = True
+# Default intents/caches, or the lean profile with LEAN_CACHE=1 (see cache_profile.py)
+intents = build_intents()
+log.task_log.info("Gateway cache profile: %s", describe_cache_profile())
 
-bot = commands.Bot(command_prefix="!", intents=intents)
+# Plain Bot unless SHARD_COUNT is set (see sharding.py / shard_launcher.py)
+bot = create_bot(intents, **client_options())
 
 # Register dynamic greeting commands (from `Molda Voice` files)
 register_greeting_commands(bot)
@@ -83,28 +98,16 @@ async def join_channel_molda_cmd(ctx: commands.Context, channel_id: int | None =
 @commands.has_permissions(administrator=True)
 async def leave_channel_molda_cmd(ctx: commands.Context):
     """Leave the molda voice channel and disable auto-rejoin."""
-    from voice_commands import voice_connections
-    
     guild_id = ctx.guild.id
     
-    # Cancel auto-rejoin task if running
-    if guild_id in molda_rejoin_tasks:
-        task = molda_rejoin_tasks[guild_id]
-        if not task.done():
-            task.cancel()
-        del molda_rejoin_tasks[guild_id]
-    
     # Disable auto-rejoin
-    molda_rejoin_targets.pop(guild_id, None)
+    molda_watchdog.clear_target(guild_id)
     
     # Disconnect from voice
-    if guild_id not in voice_connections or voice_connections[guild_id] is None:
-        await ctx.send("I'm not in a voice channel!")
-        return
-    
     try:
-        await voice_connections[guild_id].disconnect()
-        voice_connections.pop(guild_id, None)
+        if not await voice_supervisor.disconnect(guild_id):
+            await ctx.send("I'm not in a voice channel!")
+            return
         await ctx.send("Left the voice channel and disabled auto-rejoin!")
     except Exception as e:
         await ctx.send(f"Failed to leave channel: {e}")
@@ -117,6 +120,20 @@ async def play_join_cmd(ctx: commands.Context, filename: str = None):
     await play_join(ctx, filename)
 
 
+@bot.command(name="greeting-assign")
+@commands.has_permissions(administrator=True)
+async def greeting_assign_cmd(ctx: commands.Context, member: discord.Member, name: str):
+    """Assign a greeting to a member in this server (admin only). Usage: !greeting-assign <member> <name>"""
+    await assign_greeting(ctx, member, name)
+
+
+@bot.command(name="greeting-unassign")
+@commands.has_permissions(administrator=True)
+async def greeting_unassign_cmd(ctx: commands.Context, member: discord.Member):
+    """Remove a member's greeting in this server (admin only). Usage: !greeting-unassign <member>"""
+    await unassign_greeting(ctx, member)
+
+
 @bot.command(name="current-audio-stop")
 @commands.has_permissions(administrator=True)
 async def stop_audio_cmd(ctx: commands.Context):
@@ -124,23 +141,182 @@ async def stop_audio_cmd(ctx: commands.Context):
     await stop_audio(ctx)
 
 
+@bot.command(name="playback-queue")
+@commands.has_permissions(administrator=True)
+async def playback_queue_cmd(ctx: commands.Context):
+    """Show the current and queued audio for this server (admin only)."""
+    await show_playback_queue(ctx)
+
+
 @bot.command(name="encode-audio")
 @commands.has_permissions(administrator=True)
 async def encode_audio_cmd(ctx: commands.Context):
     """Pre-encode all MP3 files to Opus format for lower memory usage (admin only)."""
     await ctx.send("Starting audio encoding... (this may take a while)")
-    ffmpeg_exec = get_ffmpeg_exec()
-    await encode_all_mp3s(ffmpeg_exec=ffmpeg_exec)
-    await ctx.send("Audio encoding complete!")
+    ffmpeg_exec = await resolve_ffmpeg()
+    # Serialized with startup and other shard processes writing the same files
+    async with audio_prep_lock():
+        report = await encode_all_mp3s(ffmpeg_exec=ffmpeg_exec)
+        await refresh_index(ffmpeg_exec)
+    if report.cancelled:
+        await ctx.send(f"Audio encoding cancelled: {report.summary()}")
+    else:
+        await ctx.send(f"Audio encoding complete! {report.summary()}")
+
+
+@bot.command(name="encode-audio-cancel")
+@commands.has_permissions(administrator=True)
+async def encode_audio_cancel_cmd(ctx: commands.Context):
+    """Cancel a running audio encode (admin only)."""
+    if cancel_encoding():
+        await ctx.send("Cancelling audio encoding...")
+    else:
+        await ctx.send("No audio encoding is running")
+
+
+@bot.command(name="unmute-queue")
+@commands.has_permissions(administrator=True)
+async def unmute_queue_cmd(ctx: commands.Context):
+    """Show auto-unmute scheduler depth and lateness (admin only)."""
+    stats = unmute_scheduler.stats()
+    dispatch = unmute_dispatcher.stats()
+    await ctx.send(
+        f"Pending unmutes: {stats['depth']} (heap {stats['heap_size']}) | "
+        f"fired: {stats['fired']} | "
+        f"lateness avg {stats['avg_lateness_ms']:.1f} ms, max {stats['max_lateness_ms']:.1f} ms\n"
+        f"Dispatch queue: {dispatch['queued']} | sent: {dispatch['sent']} | "
+        f"dropped (stale): {dispatch['dropped']} | failed: {dispatch['failed']}"
+    )
+
+
+@bot.command(name="startup-stats")
+@commands.has_permissions(administrator=True)
+async def startup_stats_cmd(ctx: commands.Context):
+    """Show how long each startup phase took (admin only)."""
+    await ctx.send("\n".join(startup.describe()))
+
+
+@bot.command(name="voice-status")
+@commands.has_permissions(administrator=True)
+async def voice_status_cmd(ctx: commands.Context):
+    """Show voice connection state, last reconnect time and open circuit breakers (admin only)."""
+    await ctx.send("\n".join(voice_supervisor.describe() + [molda_watchdog.describe()]))
+
+
+@bot.command(name="trace")
+@commands.has_permissions(administrator=True)
+async def trace_cmd(ctx: commands.Context, action: str = None, filename: str = None):
+    """Record voice events for offline replay (admin only). Usage: !trace [start [file]|stop]"""
+    if action == "start":
+        path = default_trace_path() if not filename else default_trace_path().with_name(Path(filename).name)
+        trace_recorder.start(path, bot.user.id)
+        await ctx.send(f"Recording voice trace to `{path.name}`. Replay it with `python replay.py data/traces/{path.name}`")
+    elif action == "stop":
+        if not trace_recorder.active:
+            await ctx.send("No voice trace is being recorded")
+            return
+        path = trace_recorder.path
+        events_written = trace_recorder.stop()
+        await ctx.send(f"Stopped voice trace `{path.name}` ({events_written} events)")
+    else:
+        await ctx.send(trace_recorder.describe())
+
+
+@bot.command(name="profile")
+@commands.has_permissions(administrator=True)
+async def profile_cmd(ctx: commands.Context, action: str = None, seconds: float = 30.0):
+    """Profile the bot for a bounded time (admin only). Usage: !profile start [seconds] | !profile stop"""
+    if action == "start":
+        async def _post(report):
+            await ctx.send(report.render())
+
+        try:
+            seconds = live_profiler.start(seconds, _post)
+        except RuntimeError as e:
+            await ctx.send(f"Can't start profiling: {e}")
+            return
+        await ctx.send(f"Profiling for {seconds:.0f}s (`!profile stop` to end early)")
+    elif action == "stop":
+        report = await live_profiler.stop()
+        if report is None:
+            await ctx.send("No profile is running")
+            return
+        await ctx.send(report.render())
+    elif live_profiler.active:
+        await ctx.send(f"Profiling, {live_profiler.elapsed():.0f}s so far")
+    else:
+        await ctx.send("Profiler is off. Usage: `!profile start [seconds]` / `!profile stop`")
+
+
+@bot.command(name="loop-stalls")
+@commands.has_permissions(administrator=True)
+async def loop_stalls_cmd(ctx: commands.Context, action: str = None):
+    """Show the worst event-loop stalls with the stack that was running (admin only). Usage: !loop-stalls [clear]"""
+    if action == "clear":
+        loop_monitor.clear()
+        await ctx.send("Cleared recorded loop stalls")
+        return
+    # Split into messages under Discord's 2000-character limit
+    chunk = ""
+    for line in loop_monitor.describe():
+        if chunk and len(chunk) + len(line) > 1900:
+            await ctx.send(chunk)
+            chunk = ""
+        chunk += line + "\n"
+    await ctx.send(chunk)
+
+
+@bot.command(name="stats")
+@commands.has_permissions(administrator=True)
+async def stats_cmd(ctx: commands.Context):
+    """Show latency histograms and hit rates for the key paths (admin only)."""
+    pool = decoder_pool.stats()
+    pool_line = (
+        f"Decoder pool: {pool['idle']}/{pool['size']} idle | served {pool['served']} | "
+        f"misses {pool['misses']} | recycled {pool['recycled']} | failed {pool['failed']}"
+    )
+    await ctx.send("\n".join(metrics.describe() + [pool_line]))
+
+
+@bot.command(name="log-level")
+@commands.has_permissions(administrator=True)
+async def log_level_cmd(ctx: commands.Context, subsystem: str = None, level: str = None):
+    """Show or change log levels (admin only). Usage: !log-level [VOICE|AUDIO|AUDIT|MOLDA|TASK] [DEBUG|INFO|WARNING|ERROR]"""
+    if subsystem and level:
+        if subsystem.upper() not in log.LOG_SUBSYSTEMS:
+            await ctx.send(f"Unknown subsystem `{subsystem}`. Choose from: {', '.join(log.LOG_SUBSYSTEMS)}")
+            return
+        try:
+            log.set_level(subsystem, level)
+        except ValueError:
+            await ctx.send(f"Unknown level `{level}`")
+            return
+    await ctx.send(" | ".join(f"{name}: {lvl}" for name, lvl in log.levels().items()))
+
+
+@bot.command(name="shards")
+@commands.has_permissions(administrator=True)
+async def shards_cmd(ctx: commands.Context):
+    """Show guilds, voice connections and latency per shard across all processes (admin only)."""
+    lines = []
+    for proc in await cluster_status(bot):
+        if "error" in proc:
+            lines.append(f"Process {proc['process']}: unreachable ({proc['error']})")
+            continue
+        lines.append(f"Process {proc['process']}: pending unmutes {proc['pending_unmutes']}")
+        for shard_id, info in proc["shards"].items():
+            latency = f"{info['latency_ms']} ms" if info.get("latency_ms") is not None else "n/a"
+            lines.append(
+                f"  shard {shard_id}/{proc['shard_count']}: {info['guilds']} guilds, "
+                f"{info['voice_connections']} voice, {info['molda_targets']} molda, latency {latency}"
+            )
+    await ctx.send("\n".join(lines))
 
 
 @bot.event
 async def on_ready():
-    # Pre-encode MP3s to Opus on startup for lower memory usage
-    print("[BOT] Pre-encoding audio files to Opus...")
-    ffmpeg_exec = get_ffmpeg_exec()
-    await encode_all_mp3s(ffmpeg_exec=ffmpeg_exec)
-    await events.on_ready(bot)
+    # Join voice right away; encoding/probing/caching run in the background
+    await startup.on_ready(bot)
 
 
 @bot.event
@@ -152,6 +328,11 @@ async def on_voice_state_update(
     await events.on_voice_state_update(member, before, after)
 
 
+@bot.event
+async def on_audit_log_entry_create(entry: discord.AuditLogEntry):
+    await events.on_audit_log_entry_create(entry)
+
+
 @bot.event
 async def on_error(event, *args, **kwargs):
     """Handle errors and log them properly."""
@@ -0,0 +1,56 @@
+"""Gateway intents and client cache settings, default or lean (LEAN_CACHE=1).
+
+The bot reads voice states, the roles of mute actors, channels and command
+messages. The lean profile subscribes to just those events and drops the
+message cache:
+
+- intents: guilds, voice_states, moderation (audit-log entries),
+  guild_messages and message_content (prefix commands); no DMs, reactions,
+  typing, expressions, invites, webhooks, integrations, scheduled events,
+  automod or polls
+- max_messages=None: no message cache (commands are handled as they arrive)
+- MemberCacheFlags voice only and chunk_guilds_at_startup=False. Without
+  the privileged members intent discord.py already caches just the bot
+  and members in voice and never chunks, so these only pin that down
+
+The per-member cost is therefore the same in both profiles; the saving is
+the fixed size of the message cache plus the events no longer received.
+Members who aren't cached (e.g. a moderator who isn't in voice) are
+fetched on demand with `utils.get_or_fetch_member`. `measure_cache.py`
+compares the memory of both profiles.
+"""
+from typing import Any, Dict
+
+import discord
+
+from config import LEAN_CACHE
+
+
+def build_intents(lean: bool = LEAN_CACHE) -> discord.Intents:
+    if lean:
+        intents = discord.Intents.none()
+    else:
+        intents = discord.Intents.default()
+    intents.guilds = True
+    intents.voice_states = True
+    intents.moderation = True  # on_audit_log_entry_create (mute actor lookups)
+    intents.guild_messages = True
+    intents.message_content = True
+    return intents
+
+
+def client_options(lean: bool = LEAN_CACHE) -> Dict[str, Any]:
+    """Extra keyword arguments for the Bot constructor ({} keeps discord.py's defaults)."""
+    if not lean:
+        return {}
+    member_cache = discord.MemberCacheFlags.none()
+    member_cache.voice = True
+    return {
+        "member_cache_flags": member_cache,
+        "max_messages": None,
+        "chunk_guilds_at_startup": False,
+    }
+
+
+def describe(lean: bool = LEAN_CACHE) -> str:
+    return "lean (minimal intents, no message cache)" if lean else "default"
@@ -1,9 +1,15 @@
 #!/usr/bin/env python3
-"""Clean up incorrectly encoded Opus files."""
+"""Clean up incorrectly encoded Opus files.
+
+Normally not needed: the encoder's manifest (.cache/encode_manifest.json)
+rebuilds outputs whose source or encode profile changed, or that fail
+validation. Use this only to force a full re-encode.
+"""
 
 from pathlib import Path
 
 audio_dir = Path(__file__).resolve().parent / "Molda Voice" / "greetings"
+manifest = Path(__file__).resolve().parent / ".cache" / "encode_manifest.json"
 opus_files = list(audio_dir.glob("*.opus"))
 
 if not opus_files:
@@ -18,6 +24,7 @@ else:
         for f in opus_files:
             f.unlink()
             print(f"✅ Deleted {f.name}")
+        manifest.unlink(missing_ok=True)
         print("\nRun `!encode-audio` command to re-encode with proper settings")
     else:
         print("Cancelled")
@@ -1,4 +1,5 @@
 import os
+from pathlib import Path
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -9,6 +10,62 @@ VOICE_CHANNEL_ID = int(os.getenv("VOICE_CHANNEL_ID", "0"))
 MOLDA_CHANNEL_ID = int(os.getenv("MOLDA_CHANNEL_ID", "0"))
 # Seconds to wait after a member joins before playing join audio (float)
 JOIN_PLAY_DELAY = float(os.getenv("JOIN_PLAY_DELAY", "3.0"))
+# Joins into the same channel within this many seconds share one queued greeting
+GREETING_COALESCE_WINDOW = float(os.getenv("GREETING_COALESCE_WINDOW", "1.0"))
 # Molda channel auto-rejoin configuration
 MOLDA_REJOIN_ENABLED = False
-MOLDA_REJOIN_INTERVAL = 3600  # 1 hour in seconds
+# Seconds between watchdog sweeps over all molda targets (drops are also handled immediately)
+MOLDA_SWEEP_INTERVAL = float(os.getenv("MOLDA_SWEEP_INTERVAL", "60"))
+# Max seconds to wait for the gateway audit-log event before scanning audit logs over REST
+AUDIT_EVENT_WAIT = float(os.getenv("AUDIT_EVENT_WAIT", "2.0"))
+# Seconds REST audit-log fallbacks in one guild wait to share a single request
+AUDIT_COALESCE_WINDOW = float(os.getenv("AUDIT_COALESCE_WINDOW", "0.25"))
+# Max ffmpeg encode jobs run in parallel (defaults to CPU count)
+ENCODE_CONCURRENCY = int(os.getenv("ENCODE_CONCURRENCY", "0")) or (os.cpu_count() or 1)
+# SQLite database for per-guild member -> greeting assignments
+GREETING_DB_PATH = Path(os.getenv("GREETING_DB_PATH", Path(__file__).resolve().parent / "data" / "greetings.sqlite3"))
+# Sharding: unset = single gateway connection, "auto" = Discord's recommended count, or a number
+SHARD_COUNT = os.getenv("SHARD_COUNT", "").strip().lower()
+# Shards run by this process, e.g. "0-3" or "0,2" (empty = all); set by shard_launcher.py
+SHARD_IDS = os.getenv("SHARD_IDS", "")
+# Cross-process admin queries: process i listens on 127.0.0.1:(SHARD_IPC_PORT + i); 0 disables
+SHARD_IPC_PORT = int(os.getenv("SHARD_IPC_PORT", "0"))
+SHARD_PROCESS_INDEX = int(os.getenv("SHARD_PROCESS_INDEX", "0"))
+SHARD_PROCESSES = int(os.getenv("SHARD_PROCESSES", "1"))
+SHARD_IPC_TOKEN = os.getenv("SHARD_IPC_TOKEN", "")
+# Logging: default level, per-subsystem overrides (LOG_LEVEL_VOICE=DEBUG, ...), "text" or "json" output
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+LOG_SUBSYSTEMS = ("VOICE", "AUDIO", "AUDIT", "MOLDA", "TASK")
+LOG_LEVELS = {name: os.getenv(f"LOG_LEVEL_{name}", LOG_LEVEL).upper() for name in LOG_SUBSYSTEMS}
+# Fraction (0-1) of voice-state events whose diagnostic line is logged when VOICE is at DEBUG
+VOICE_LOG_SAMPLE_RATE = float(os.getenv("VOICE_LOG_SAMPLE_RATE", "1.0"))
+# Prometheus metrics on 127.0.0.1:METRICS_PORT/metrics (0 disables; shard process i uses port + i)
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+# Voice connections (voice_supervisor.py): per-attempt timeout, attempts per connect, backoff
+VOICE_CONNECT_TIMEOUT = float(os.getenv("VOICE_CONNECT_TIMEOUT", "15.0"))
+VOICE_CONNECT_RETRIES = int(os.getenv("VOICE_CONNECT_RETRIES", "3"))
+VOICE_BACKOFF_BASE = float(os.getenv("VOICE_BACKOFF_BASE", "1.0"))
+VOICE_BACKOFF_MAX = float(os.getenv("VOICE_BACKOFF_MAX", "30.0"))
+# Consecutive handshake failures (4006 / no encryption modes) before a channel is skipped for a cooldown
+VOICE_CIRCUIT_THRESHOLD = int(os.getenv("VOICE_CIRCUIT_THRESHOLD", "3"))
+VOICE_CIRCUIT_COOLDOWN = float(os.getenv("VOICE_CIRCUIT_COOLDOWN", "300"))
+# Seconds discord.py gets to finish its own voice reconnect (reconnect=True) before we tear the client down
+VOICE_RECONNECT_GRACE = float(os.getenv("VOICE_RECONNECT_GRACE", "2.0"))
+# Pre-spawned ffmpeg workers for playing files without a cached Opus version (0 disables)
+DECODER_POOL_SIZE = int(os.getenv("DECODER_POOL_SIZE", "2"))
+# Idle workers older than this (seconds) are replaced; pool workers encode at this bitrate (kbps)
+DECODER_POOL_MAX_AGE = float(os.getenv("DECODER_POOL_MAX_AGE", "600"))
+DECODER_POOL_BITRATE = int(os.getenv("DECODER_POOL_BITRATE", "128"))
+# Record every voice-state update and mute lookup to this JSONL trace from startup (empty = off; see replay.py)
+VOICE_TRACE_PATH = os.getenv("VOICE_TRACE_PATH", "")
+# !profile: longest allowed run (seconds) and rows in the posted summary
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "300"))
+PROFILE_TOP_N = int(os.getenv("PROFILE_TOP_N", "15"))
+# Event-loop lag monitor: heartbeat period and the lag (seconds) counted as a stall (0 disables)
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", "0.1"))
+LOOP_STALL_THRESHOLD = float(os.getenv("LOOP_STALL_THRESHOLD", "0.25"))
+# Worst stalls (with stacks) kept for !loop-stalls
+LOOP_STALL_KEEP = int(os.getenv("LOOP_STALL_KEEP", "10"))
+# Lean gateway cache profile: minimal intents, voice-only member cache, no message cache (see cache_profile.py)
+LEAN_CACHE = os.getenv("LEAN_CACHE", "0").strip().lower() in ("1", "true", "yes")
@@ -0,0 +1,245 @@
+import asyncio
+import shutil
+import subprocess
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Callable, Deque, Dict, List, Optional
+
+import discord
+from discord.oggparse import OggError, OggStream
+
+from config import DECODER_POOL_BITRATE, DECODER_POOL_MAX_AGE, DECODER_POOL_SIZE
+from log import audio_log
+
+# Seconds between health checks of idle workers
+HEALTH_CHECK_INTERVAL = 15.0
+
+
+def _worker_args(ffmpeg_exec: str, bitrate: int) -> List[str]:
+    # Reads any audio from stdin and writes Ogg Opus to stdout
+    return [
+        ffmpeg_exec, "-hide_banner", "-loglevel", "error",
+        "-i", "pipe:0",
+        "-map_metadata", "-1", "-vn",
+        "-c:a", "libopus", "-b:a", f"{bitrate}k", "-ar", "48000", "-ac", "2",
+        "-f", "opus", "pipe:1",
+    ]
+
+
+class _Worker:
+    __slots__ = ("proc", "spawned_at")
+
+    def __init__(self, proc: subprocess.Popen):
+        self.proc = proc
+        self.spawned_at = time.monotonic()
+
+    def alive(self) -> bool:
+        return self.proc.poll() is None
+
+    def kill(self, on_exit: Optional[Callable[[Optional[int]], None]] = None) -> None:
+        """Kill the process without blocking the caller, which can be the event loop.
+
+        A daemon thread reaps it and then calls `on_exit(returncode)`.
+        """
+        exited = self.proc.poll() is not None
+        if not exited:
+            self.proc.kill()
+        for pipe in (self.proc.stdin, self.proc.stdout):
+            try:
+                pipe.close()
+            except OSError:
+                pass
+        if exited:
+            if on_exit is not None:
+                on_exit(self.proc.returncode)
+            return
+        threading.Thread(target=self._reap, args=(on_exit,), daemon=True).start()
+
+    def _reap(self, on_exit: Optional[Callable[[Optional[int]], None]]) -> None:
+        try:
+            self.proc.wait(timeout=2)
+        except subprocess.TimeoutExpired:
+            pass
+        if on_exit is not None:
+            on_exit(self.proc.returncode)
+
+
+class PooledOpusAudio(discord.AudioSource):
+    """Opus packets from a pre-spawned ffmpeg worker fed `path` over stdin.
+
+    A feeder thread copies the file into ffmpeg's stdin while the audio
+    thread demuxes its Ogg output, the same way FFmpegOpusAudio reads
+    stdout. Workers are single-use; the pool replaces them in the background.
+    """
+
+    def __init__(self, worker: _Worker, path: Path, on_done=None):
+        self._worker = worker
+        self._on_done = on_done
+        self._packets = OggStream(worker.proc.stdout).iter_packets()
+        self._started = False
+        self._feeder = threading.Thread(target=self._feed, args=(path,), daemon=True)
+        self._feeder.start()
+
+    def _feed(self, path: Path) -> None:
+        stdin = self._worker.proc.stdin
+        try:
+            with path.open("rb") as f:
+                shutil.copyfileobj(f, stdin, 64 * 1024)
+        except (OSError, ValueError):
+            # ffmpeg exited early or we were cleaned up mid-copy
+            pass
+        finally:
+            try:
+                stdin.close()
+            except OSError:
+                pass
+
+    def read(self) -> bytes:
+        try:
+            if not self._started:
+                self._started = True
+                # Skip the OpusHead/OpusTags header packets, as load_packets does
+                for _ in range(2):
+                    head = next(self._packets, b"")
+                    if not (head.startswith(b"OpusHead") or head.startswith(b"OpusTags")):
+                        return head
+            return next(self._packets, b"")
+        except (OggError, OSError, ValueError):
+            return b""
+
+    def is_opus(self) -> bool:
+        return True
+
+    def cleanup(self) -> None:
+        worker, self._worker = self._worker, None
+        if worker is None:
+            return
+        worker.kill(self._on_done)
+
+
+class DecoderPool:
+    """Keeps `size` ffmpeg processes started and waiting on stdin.
+
+    Playback of a file without a cached Opus version takes a ready worker
+    instead of paying process start-up, so only the actual decode remains.
+    Used workers are replaced in a worker thread; idle ones are checked
+    every HEALTH_CHECK_INTERVAL and recycled when dead or older than
+    DECODER_POOL_MAX_AGE.
+    """
+
+    def __init__(self, size: int = DECODER_POOL_SIZE, max_age: float = DECODER_POOL_MAX_AGE):
+        self.size = max(0, size)
+        self.max_age = max_age
+        self._ffmpeg_exec: Optional[str] = None
+        self._idle: Deque[_Worker] = deque()
+        self._refilling = False
+        self._task: Optional[asyncio.Task] = None
+        self.spawned = 0
+        self.served = 0
+        self.recycled = 0
+        self.failed = 0
+        self.misses = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self, ffmpeg_exec: str) -> None:
+        """Spawn the workers and start health checks (no-op if running or size is 0)."""
+        if self.size == 0 or self.running:
+            return
+        self._ffmpeg_exec = ffmpeg_exec
+        await self._refill()
+        self._task = asyncio.create_task(self._maintain())
+        audio_log.info("Decoder pool ready with %d ffmpeg worker(s)", len(self._idle))
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        while self._idle:
+            self._idle.popleft().kill()
+
+    def _spawn(self) -> Optional[_Worker]:
+        try:
+            proc = subprocess.Popen(
+                _worker_args(self._ffmpeg_exec, DECODER_POOL_BITRATE),
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            )
+        except OSError as e:
+            audio_log.error("Failed to spawn decoder worker: %s", e)
+            return None
+        self.spawned += 1
+        return _Worker(proc)
+
+    async def _refill(self) -> None:
+        if self._refilling or self._ffmpeg_exec is None:
+            return
+        self._refilling = True
+        try:
+            missing = self.size - len(self._idle)
+            if missing > 0:
+                workers = await asyncio.to_thread(lambda: [self._spawn() for _ in range(missing)])
+                self._idle.extend(w for w in workers if w is not None)
+        finally:
+            self._refilling = False
+
+    def _schedule_refill(self) -> None:
+        if self.running and not self._refilling:
+            asyncio.get_running_loop().create_task(self._refill())
+
+    async def _maintain(self) -> None:
+        while True:
+            await asyncio.sleep(HEALTH_CHECK_INTERVAL)
+            now = time.monotonic()
+            keep: Deque[_Worker] = deque()
+            stale: List[_Worker] = []
+            for worker in self._idle:
+                if worker.alive() and now - worker.spawned_at < self.max_age:
+                    keep.append(worker)
+                else:
+                    stale.append(worker)
+            self._idle = keep
+            if stale:
+                self.recycled += len(stale)
+                for worker in stale:
+                    worker.kill()
+            await self._refill()
+
+    def open(self, path: Path) -> Optional[PooledOpusAudio]:
+        """A source playing `path` through an idle worker, or None if none is ready."""
+        worker = None
+        while self._idle:
+            candidate = self._idle.popleft()
+            if candidate.alive():
+                worker = candidate
+                break
+            self.recycled += 1
+            candidate.kill()
+        self._schedule_refill()
+        if worker is None:
+            self.misses += 1
+            return None
+        self.served += 1
+        return PooledOpusAudio(worker, Path(path), on_done=self._worker_done)
+
+    def _worker_done(self, returncode: Optional[int]) -> None:
+        # Killed by cleanup (negative) or clean exit (0) are both fine
+        if returncode is not None and returncode > 0:
+            self.failed += 1
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "idle": len(self._idle),
+            "size": self.size,
+            "spawned": self.spawned,
+            "served": self.served,
+            "misses": self.misses,
+            "recycled": self.recycled,
+            "failed": self.failed,
+        }
+
+
+decoder_pool = DecoderPool()
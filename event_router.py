@@ -0,0 +1,94 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Set, Tuple
+
+import discord
+
+import metrics
+from log import voice_log
+
+# Kinds of voice-state change a diff is sorted into (one diff can carry several)
+JOIN = "join"
+LEAVE = "leave"
+MOVE = "move"
+SERVER_MUTE = "server_mute"
+SERVER_UNMUTE = "server_unmute"
+BOT_SELF_MOVE = "bot_self_move"
+
+VoiceHandler = Callable[[discord.Member, discord.VoiceState, discord.VoiceState], Awaitable[None]]
+
+
+def classify(member: discord.Member, before: discord.VoiceState, after: discord.VoiceState) -> Tuple[str, ...]:
+    """Sort a voice-state diff into the kinds we act on; () means nothing to do.
+
+    Self-mute/deafen, stream and video toggles are all no-ops here.
+    """
+    kinds = []
+    before_id = before.channel.id if before.channel is not None else None
+    after_id = after.channel.id if after.channel is not None else None
+    if before_id != after_id:
+        me = member.guild.me
+        if me is not None and member.id == me.id:
+            kinds.append(BOT_SELF_MOVE)
+        elif before_id is None:
+            kinds.append(JOIN)
+        elif after_id is None:
+            kinds.append(LEAVE)
+        else:
+            kinds.append(MOVE)
+    if before.mute != after.mute:
+        kinds.append(SERVER_MUTE if after.mute else SERVER_UNMUTE)
+    return tuple(kinds)
+
+
+class VoiceEventRouter:
+    """Runs each kind of voice-state change in its own task.
+
+    A slow handler (audit-log lookup for a mute, reconnecting after the bot
+    is moved) no longer holds up the others for the same event, and each
+    kind has its own concurrency limit so a burst of one kind queues behind
+    its semaphore without starving the rest. Diffs with no registered kind
+    return before any task is created.
+    """
+
+    def __init__(self):
+        self._handlers: Dict[str, Tuple[VoiceHandler, asyncio.Semaphore]] = {}
+        # Strong refs so running handler tasks aren't garbage-collected
+        self._tasks: Set[asyncio.Task] = set()
+
+    def register(self, kind: str, handler: VoiceHandler, concurrency: int) -> None:
+        self._handlers[kind] = (handler, asyncio.Semaphore(max(1, concurrency)))
+
+    def in_flight(self) -> int:
+        return len(self._tasks)
+
+    async def drain(self) -> None:
+        """Wait until every running handler task has finished."""
+        while self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def dispatch(self, member: discord.Member, before: discord.VoiceState, after: discord.VoiceState) -> int:
+        """Start a task per matching handler. Returns how many were started."""
+        started = 0
+        for kind in classify(member, before, after):
+            entry = self._handlers.get(kind)
+            if entry is None:
+                continue
+            metrics.voice_events.inc(kind=kind)
+            task = asyncio.create_task(self._run(kind, entry, member, before, after))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+            started += 1
+        if not started:
+            metrics.voice_events.inc(kind="noop")
+        return started
+
+    async def _run(self, kind, entry, member, before, after) -> None:
+        handler, sem = entry
+        async with sem:
+            try:
+                await handler(member, before, after)
+            except Exception:
+                voice_log.exception("%s handler failed for %s", kind, member)
+
+
+voice_router = VoiceEventRouter()
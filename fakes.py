@@ -0,0 +1,193 @@
+"""In-process stand-ins for the discord.py objects the event handlers touch.
+
+Only the attributes and methods this bot actually uses are implemented, so
+handlers can be driven (by bench.py, or replaying recorded traces) without a
+gateway connection. Nothing here talks to Discord.
+"""
+
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from typing import Dict, Iterable, List, Optional
+
+import discord
+
+
+@dataclass(eq=False)
+class FakeRole:
+    id: int
+    name: str = "role"
+
+
+@dataclass(eq=False)
+class FakeVoiceChannel:
+    id: int
+    guild: "FakeGuild"
+    name: str = "voice"
+
+    def permissions_for(self, member) -> discord.Permissions:
+        return discord.Permissions.all()
+
+
+@dataclass(eq=False)
+class FakeVoiceState:
+    channel: Optional[FakeVoiceChannel] = None
+    mute: bool = False
+    deaf: bool = False
+    self_mute: bool = False
+    self_deaf: bool = False
+    self_stream: bool = False
+    self_video: bool = False
+
+
+@dataclass(eq=False)
+class FakeMember:
+    id: int
+    guild: "FakeGuild"
+    name: str = "member"
+    bot: bool = False
+    roles: List[FakeRole] = field(default_factory=list)
+    voice: Optional[FakeVoiceState] = None
+
+    def __str__(self) -> str:
+        return self.name
+
+    @property
+    def display_name(self) -> str:
+        return self.name
+
+
+class FakeVoiceClient:
+    """Plays a source by reading it to the end on a thread, like the audio player.
+
+    No packets are sent anywhere; `played` counts packets read, so playback
+    benchmarks still exercise the source's `read()` path.
+    """
+
+    def __init__(self, guild: "FakeGuild", channel: FakeVoiceChannel):
+        self.guild = guild
+        self.channel = channel
+        self.played = 0
+        self._connected = True
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def is_connected(self) -> bool:
+        return self._connected
+
+    def is_playing(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def play(self, source: discord.AudioSource, *, after=None) -> None:
+        self._stop.clear()
+
+        def _run():
+            try:
+                while not self._stop.is_set() and source.read():
+                    self.played += 1
+            finally:
+                source.cleanup()
+                if after is not None:
+                    after(None)
+
+        self._thread = threading.Thread(target=_run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    async def move_to(self, channel: FakeVoiceChannel) -> None:
+        self.channel = channel
+
+    async def disconnect(self, *, force: bool = False) -> None:
+        self._connected = False
+        self.stop()
+        self.channel = None
+
+
+class FakeAuditLogEntry:
+    """A member_update audit-log entry, by default a server mute."""
+
+    action = discord.AuditLogAction.member_update
+
+    def __init__(self, guild, target, user, created_at: datetime, mute: bool = True):
+        self.guild = guild
+        self.target = target
+        self.user = user
+        self.user_id = user.id if user is not None else None
+        self.created_at = created_at
+        self.changes = SimpleNamespace(
+            before=SimpleNamespace(mute=not mute),
+            after=SimpleNamespace(mute=mute),
+        )
+
+
+class FakeGuild:
+    def __init__(self, id: int, name: str = "guild", bot_user_id: int = 1):
+        self.id = id
+        self.name = name
+        self.members: Dict[int, FakeMember] = {}
+        self.channels: Dict[int, FakeVoiceChannel] = {}
+        self.voice_client: Optional[FakeVoiceClient] = None
+        # Newest first, as the REST endpoint returns them
+        self.audit_entries: List[FakeAuditLogEntry] = []
+        self.audit_log_requests = 0
+        self.me = self.add_member(bot_user_id, name="bot", bot=True)
+
+    def add_member(self, member_id: int, name: Optional[str] = None, bot: bool = False,
+                   roles: Iterable[FakeRole] = ()) -> FakeMember:
+        member = FakeMember(member_id, self, name or f"member{member_id}", bot, list(roles))
+        self.members[member_id] = member
+        return member
+
+    def add_channel(self, channel_id: int, name: Optional[str] = None) -> FakeVoiceChannel:
+        channel = FakeVoiceChannel(channel_id, self, name or f"voice{channel_id}")
+        self.channels[channel_id] = channel
+        return channel
+
+    def get_member(self, member_id: int) -> Optional[FakeMember]:
+        return self.members.get(member_id)
+
+    async def fetch_member(self, member_id: int) -> FakeMember:
+        member = self.members.get(member_id)
+        if member is None:
+            raise discord.NotFound(SimpleNamespace(status=404, reason="Not Found"), "Unknown Member")
+        return member
+
+    def get_channel(self, channel_id: int) -> Optional[FakeVoiceChannel]:
+        return self.channels.get(channel_id)
+
+    def connect_voice(self, channel: FakeVoiceChannel) -> FakeVoiceClient:
+        self.voice_client = FakeVoiceClient(self, channel)
+        self.me.voice = FakeVoiceState(channel)
+        return self.voice_client
+
+    def add_audit_entry(self, target: FakeMember, user: FakeMember, age: float = 0.0,
+                        mute: bool = True) -> FakeAuditLogEntry:
+        created = datetime.now(timezone.utc) - timedelta(seconds=age)
+        entry = FakeAuditLogEntry(self, target, user, created, mute)
+        self.audit_entries.insert(0, entry)
+        return entry
+
+    async def audit_logs(self, *, limit: int = 100, action=None):
+        self.audit_log_requests += 1
+        for entry in self.audit_entries[:limit]:
+            if action is None or entry.action is action:
+                yield entry
+
+
+def move(member: FakeMember, channel: Optional[FakeVoiceChannel], **flags) -> tuple:
+    """Update `member.voice` and return the (before, after) pair discord.py would pass."""
+    before = member.voice or FakeVoiceState()
+    after = FakeVoiceState(
+        channel=channel,
+        mute=flags.get("mute", before.mute),
+        deaf=flags.get("deaf", before.deaf),
+        self_mute=flags.get("self_mute", before.self_mute),
+        self_deaf=flags.get("self_deaf", before.self_deaf),
+        self_stream=flags.get("self_stream", before.self_stream),
+        self_video=flags.get("self_video", before.self_video),
+    )
+    member.voice = after if channel is not None else None
+    return before, after
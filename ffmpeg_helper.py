@@ -1,20 +1,82 @@
+import asyncio
+import hashlib
 import os
+import re
 import stat
+import subprocess
 import tarfile
 import tempfile
+import threading
 import urllib.request
+from dataclasses import dataclass
 from pathlib import Path
 import shutil
+from typing import Optional
 
+from log import audio_log
 
-def get_ffmpeg_exec() -> str | None:
-    """Return path to ffmpeg executable.
+DEFAULT_FFMPEG_URL = "https://johnvansickle.com/ffmpeg/releases/ffmpeg-release-amd64-static.tar.xz"
+DEST_DIR = Path(__file__).resolve().parent / ".ffmpeg"
+
+_UNRESOLVED = object()
+# Resolved once per process; guarded because resolution may run in a worker thread
+_ffmpeg_exec = _UNRESOLVED
+_ffmpeg_info: Optional["FFmpegInfo"] = None
+_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class FFmpegInfo:
+    path: str
+    version: Optional[str]
+    has_libopus: bool
+
+
+def _sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _install_from_archive(archive_path: Path, dest: Path, expected_sha256: Optional[str]) -> Optional[str]:
+    """Verify `archive_path` and extract only the `ffmpeg` binary to `dest`."""
+    if expected_sha256:
+        actual = _sha256(archive_path)
+        if actual.lower() != expected_sha256.lower():
+            audio_log.error("Checksum mismatch for %s: expected %s, got %s", archive_path.name, expected_sha256, actual)
+            return None
+    else:
+        audio_log.warning("FFMPEG_SHA256 not set; installing archive without checksum verification")
+
+    with tempfile.TemporaryDirectory() as td, tarfile.open(archive_path, mode="r:*") as tf:
+        for member in tf.getmembers():
+            if member.isfile() and (member.name == "ffmpeg" or member.name.endswith("/ffmpeg")):
+                # extract only the ffmpeg binary
+                member.name = Path(member.name).name
+                tf.extract(member, path=td)
+                extracted = Path(td) / member.name
+                shutil.move(str(extracted), str(dest))
+                dest.chmod(dest.stat().st_mode | stat.S_IEXEC)
+                audio_log.info("ffmpeg extracted to %s", dest)
+                return str(dest)
+    audio_log.error("No ffmpeg binary found in %s", archive_path.name)
+    return None
+
+
+def _resolve() -> Optional[str]:
+    """Find or install ffmpeg. Blocking; call through `get_ffmpeg_exec`/`resolve_ffmpeg`.
 
     Order:
     - `FFMPEG_PATH` env var if set and valid
     - system `ffmpeg` (shutil.which)
-    - try to download a static build and extract `ffmpeg` into `.ffmpeg/`
-    Returns None if not found.
+    - previously installed `.ffmpeg/ffmpeg`
+    - local archive from `FFMPEG_ARCHIVE`
+    - download from `FFMPEG_MIRROR_URL` (defaults to the johnvansickle static build),
+      only when `FFMPEG_SHA256` is set
+    Archives are checked against `FFMPEG_SHA256`; a local archive without it
+    is installed with a warning, a download is refused.
     """
     env_path = os.getenv("FFMPEG_PATH")
     if env_path and Path(env_path).is_file():
@@ -24,31 +86,95 @@ def get_ffmpeg_exec() -> str | None:
     if which_path:
         return which_path
 
-    dest_dir = Path(__file__).resolve().parent / ".ffmpeg"
-    dest_dir.mkdir(exist_ok=True)
-    dest = dest_dir / "ffmpeg"
+    DEST_DIR.mkdir(exist_ok=True)
+    dest = DEST_DIR / "ffmpeg"
     if dest.exists():
         return str(dest)
 
-    # Attempt to download a static ffmpeg build (amd64 Linux)
-    url = "https://johnvansickle.com/ffmpeg/releases/ffmpeg-release-amd64-static.tar.xz"
+    expected_sha256 = os.getenv("FFMPEG_SHA256")
+
+    archive = os.getenv("FFMPEG_ARCHIVE")
+    if archive:
+        try:
+            return _install_from_archive(Path(archive), dest, expected_sha256)
+        except Exception as e:
+            audio_log.error("Failed to install ffmpeg from %s: %s", archive, e)
+            return None
+
+    url = os.getenv("FFMPEG_MIRROR_URL", DEFAULT_FFMPEG_URL)
+    if not expected_sha256:
+        # The release URL's contents change with every release, so there is no
+        # checksum to pin; never run a downloaded binary we can't verify
+        audio_log.error(
+            "Not downloading ffmpeg from %s: set FFMPEG_SHA256 to the archive's checksum, "
+            "or provide ffmpeg via FFMPEG_PATH, PATH or FFMPEG_ARCHIVE", url,
+        )
+        return None
     try:
         with tempfile.TemporaryDirectory() as td:
             archive_path = Path(td) / "ffmpeg.tar.xz"
-            print(f"[FFMPEG] Downloading ffmpeg from {url} ...")
+            audio_log.info("Downloading ffmpeg from %s ...", url)
             urllib.request.urlretrieve(url, archive_path)
-            with tarfile.open(archive_path, mode="r:xz") as tf:
-                for member in tf.getmembers():
-                    if member.isfile() and member.name.endswith("/ffmpeg"):
-                        # extract only the ffmpeg binary
-                        member.name = Path(member.name).name
-                        tf.extract(member, path=td)
-                        extracted = Path(td) / member.name
-                        shutil.move(str(extracted), str(dest))
-                        dest.chmod(dest.stat().st_mode | stat.S_IEXEC)
-                        print(f"[FFMPEG] ffmpeg extracted to {dest}")
-                        return str(dest)
+            return _install_from_archive(archive_path, dest, expected_sha256)
     except Exception as e:
-        print("[FFMPEG] Failed to download/extract ffmpeg:", e)
+        audio_log.error("Failed to download/extract ffmpeg: %s", e)
 
     return None
+
+
+def get_ffmpeg_exec() -> str | None:
+    """Return path to ffmpeg executable, resolving it on first call only.
+
+    The first call may download/extract ffmpeg and block; from async code use
+    `resolve_ffmpeg()` instead. Returns None if not found.
+    """
+    global _ffmpeg_exec
+    with _lock:
+        if _ffmpeg_exec is _UNRESOLVED:
+            _ffmpeg_exec = _resolve()
+            if not _ffmpeg_exec:
+                audio_log.error("ffmpeg executable not found. Set FFMPEG_PATH env var or ensure ffmpeg is available.")
+        return _ffmpeg_exec
+
+
+async def resolve_ffmpeg() -> str | None:
+    """Async `get_ffmpeg_exec`: any lookup or install runs off the event loop."""
+    if _ffmpeg_exec is not _UNRESOLVED:
+        return _ffmpeg_exec
+    return await asyncio.to_thread(get_ffmpeg_exec)
+
+
+def cached_ffmpeg_exec() -> str | None:
+    """ffmpeg path if already resolved, else None. Never blocks; for hot paths."""
+    return None if _ffmpeg_exec is _UNRESOLVED else _ffmpeg_exec
+
+
+def _probe(path: str) -> FFmpegInfo:
+    version = None
+    has_libopus = False
+    try:
+        out = subprocess.run(
+            [path, "-hide_banner", "-version"], capture_output=True, text=True, timeout=10
+        ).stdout
+        m = re.search(r"ffmpeg version (\S+)", out)
+        version = m.group(1) if m else None
+
+        out = subprocess.run(
+            [path, "-hide_banner", "-encoders"], capture_output=True, text=True, timeout=10
+        ).stdout
+        has_libopus = re.search(r"^\s*A\S*\s+libopus\s", out, re.MULTILINE) is not None
+    except (OSError, subprocess.SubprocessError) as e:
+        audio_log.warning("Failed to probe ffmpeg at %s: %s", path, e)
+    return FFmpegInfo(path=path, version=version, has_libopus=has_libopus)
+
+
+async def get_ffmpeg_info() -> Optional[FFmpegInfo]:
+    """Version and libopus support of the resolved ffmpeg, probed once per process."""
+    global _ffmpeg_info
+    if _ffmpeg_info is None:
+        path = await resolve_ffmpeg()
+        if path is None:
+            return None
+        _ffmpeg_info = await asyncio.to_thread(_probe, path)
+        audio_log.info("ffmpeg %s: version %s, libopus: %s", path, _ffmpeg_info.version, _ffmpeg_info.has_libopus)
+    return _ffmpeg_info
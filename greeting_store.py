@@ -0,0 +1,104 @@
+import asyncio
+import sqlite3
+import sys
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+
+from config import GREETING_DB_PATH
+from log import audio_log
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS greeting_assignments (
+    guild_id  INTEGER NOT NULL,
+    member_id INTEGER NOT NULL,
+    greeting  TEXT    NOT NULL,
+    PRIMARY KEY (guild_id, member_id)
+) WITHOUT ROWID
+"""
+
+
+def _key(guild_id: int, member_id: int) -> int:
+    # Snowflakes fit in 64 bits; one packed int is far smaller than a tuple key
+    return (guild_id << 64) | member_id
+
+
+class GreetingStore:
+    """(guild_id, member_id) -> greeting name, persisted in SQLite (WAL mode).
+
+    All rows are loaded once into a dict keyed by a packed int, with greeting
+    names interned so thousands of members share one string per greeting.
+    Reads never touch the database; writes go to SQLite first (in a worker
+    thread) and then update the dict.
+    """
+
+    def __init__(self, path: Path = GREETING_DB_PATH):
+        self.path = Path(path)
+        self._map: Dict[int, str] = {}
+        self._conn: Optional[sqlite3.Connection] = None
+        # sqlite3 connections aren't safe to use from two threads at once
+        self._write_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._map)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(_SCHEMA)
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def load(self) -> int:
+        """Load every assignment into memory. Returns the number loaded."""
+        try:
+            rows = self._connect().execute(
+                "SELECT guild_id, member_id, greeting FROM greeting_assignments"
+            ).fetchall()
+        except sqlite3.Error as e:
+            audio_log.error("Failed to load greeting store %s: %s", self.path, e)
+            return 0
+        self._map = {_key(g, m): sys.intern(greeting) for g, m, greeting in rows}
+        audio_log.info("Loaded %d stored greeting assignment(s)", len(self._map))
+        return len(self._map)
+
+    def get(self, guild_id: int, member_id: int) -> Optional[str]:
+        return self._map.get(_key(guild_id, member_id))
+
+    def _write(self, sql: str, params: tuple) -> int:
+        with self._write_lock:
+            conn = self._connect()
+            cur = conn.execute(sql, params)
+            conn.commit()
+            return cur.rowcount
+
+    async def assign(self, guild_id: int, member_id: int, greeting: str) -> None:
+        await asyncio.to_thread(
+            self._write,
+            "INSERT INTO greeting_assignments (guild_id, member_id, greeting) VALUES (?, ?, ?) "
+            "ON CONFLICT (guild_id, member_id) DO UPDATE SET greeting = excluded.greeting",
+            (guild_id, member_id, greeting),
+        )
+        self._map[_key(guild_id, member_id)] = sys.intern(greeting)
+
+    async def unassign(self, guild_id: int, member_id: int) -> bool:
+        """Remove an assignment. Returns True if one existed."""
+        removed = await asyncio.to_thread(
+            self._write,
+            "DELETE FROM greeting_assignments WHERE guild_id = ? AND member_id = ?",
+            (guild_id, member_id),
+        )
+        self._map.pop(_key(guild_id, member_id), None)
+        return removed > 0
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+greeting_store = GreetingStore()
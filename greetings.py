@@ -1,72 +1,346 @@
+import asyncio
+import ctypes
+import ctypes.util
 import os
 from pathlib import Path
 import re
-from typing import Dict, Optional
+from typing import Dict, Optional, Set, Tuple
 
-from voice_commands import play_join
+from audio_source import invalidate_packets, validate_opus_file
+from greeting_store import greeting_store
+from log import audio_log
+from probe_index import AUDIO_SUFFIXES
 
 AUDIO_DIR = Path(__file__).resolve().parent / "Molda Voice" / "greetings"
 _pattern = re.compile(r"(?P<name>[^_/\\]+)_Molda\.(mp3|opus)$", re.IGNORECASE)
 
-# name (lowercase) -> filename (basename)
-name_to_filename: Dict[str, str] = {}
-# member_id -> filename
-id_to_filename: Dict[int, str] = {}
-
-# Scan audio files
-for p in sorted(AUDIO_DIR.glob("*")):
-    m = _pattern.match(p.name)
-    if not m:
-        continue
-    name = m.group("name")
-    name_key = name.lower()
-    name_to_filename[name_key] = p.name
+# Suffixes that take part in greeting resolution (a valid .opus sibling wins)
+GREETING_SUFFIXES = (".mp3", ".opus")
+
+# Default greeting for members without a personal one
+DEFAULT_GREETING_STEM = "new_comers_molda"
+# Seconds between directory checks when inotify is unavailable
+POLL_INTERVAL = float(os.getenv("GREETINGS_POLL_INTERVAL", "5.0"))
+
+# inotify(7) flags for the events that change the set of greeting files
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_WATCH_MASK = _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE
+
+# (size, mtime_ns) per filename; a change in either triggers a re-validate
+Snapshot = Dict[str, Tuple[int, int]]
+
+
+def _snapshot(directory: Path) -> Snapshot:
+    snap: Snapshot = {}
+    if not directory.exists():
+        return snap
+    for p in directory.iterdir():
+        if p.suffix.lower() in AUDIO_SUFFIXES and p.is_file():
+            st = p.stat()
+            snap[p.name] = (st.st_size, st.st_mtime_ns)
+    return snap
+
 
-# Resolve tokens from env vars. Token name can be uppercase or capitalized.
-for name_key, filename in list(name_to_filename.items()):
+def _member_id_for(name_key: str) -> Optional[int]:
+    """Resolve a greeting name to a member id from env vars (uppercase or capitalized)."""
     candidates = [name_key.upper(), name_key.capitalize()]
-    found = False
     for token in candidates:
         val = os.getenv(token)
         if val:
             try:
                 member_id = int(val)
-                id_to_filename[member_id] = filename
-                print(f"[GREETINGS] Mapped {token}={member_id} -> {filename}")
-                found = True
-                break
+                audio_log.info("Mapped greeting %s=%s -> %s", token, member_id, name_key)
+                return member_id
             except ValueError:
                 # skip invalid env values
-                print(f"[GREETINGS] Invalid {token} value: {val}")
-                pass
-    if not found:
-        # no token set for this name; skip mapping but command will still be registered
-        print(f"[GREETINGS] No token set for {name_key} (checked {candidates})")
+                audio_log.warning("Invalid greeting token %s value: %s", token, val)
+    # no token set for this name; skip mapping but command will still be registered
+    audio_log.debug("No token set for greeting %s (checked %s)", name_key, candidates)
+    return None
 
-print(f"[GREETINGS] Final mappings: {id_to_filename}")
 
+class GreetingRegistry:
+    """Live view of the greetings directory.
 
-def get_greeting_for_member(member_id: int) -> Optional[str]:
-    """Return basename filename for member_id if mapped via env token."""
-    return id_to_filename.get(member_id)
+    Keeps name→file and member→file maps plus a pre-resolved, pre-validated
+    playable path per audio file (for .mp3/.opus, the .opus sibling when it
+    is a valid Ogg Opus file; other formats as they are). The directory is watched with inotify, or polled where inotify is
+    unavailable, and only the files that changed are re-validated, so the join
+    hot path is pure dict lookups with no filesystem calls.
+    """
 
+    def __init__(self, directory: Path = AUDIO_DIR):
+        self.directory = directory
+        # name (lowercase) -> filename (basename)
+        self.name_to_filename: Dict[str, str] = {}
+        # member_id -> filename
+        self.id_to_filename: Dict[int, str] = {}
+        # name (lowercase) -> member_id from env tokens (None if unset)
+        self._name_ids: Dict[str, Optional[int]] = {}
+        # filename -> playable path; lowercase stem -> playable path
+        self._playable: Dict[str, Path] = {}
+        self._by_stem: Dict[str, Path] = {}
+        self._snapshot: Snapshot = {}
+        self._bot = None
+        self._watch_task: Optional[asyncio.Task] = None
+        self.rescan()
 
-def register_greeting_commands(bot):
-    """Dynamically add admin-only commands for available greetings.
+    # --- lookups (hot path, no filesystem access) ---
 
-    Command names: `play-audio-greeting-<name>` where `<name>` is the lowercase name from file.
-    """
-    from discord.ext import commands
+    def filename_for_member(self, member_id: int, guild_id: Optional[int] = None) -> Optional[str]:
+        """Stored per-guild assignment first, then the legacy env-token mapping."""
+        if guild_id is not None:
+            name_key = greeting_store.get(guild_id, member_id)
+            filename = self.name_to_filename.get(name_key) if name_key else None
+            if filename:
+                return filename
+        return self.id_to_filename.get(member_id)
+
+    def resolve_member(self, member_id: int, guild_id: Optional[int] = None) -> Optional[Path]:
+        filename = self.filename_for_member(member_id, guild_id)
+        return self._playable.get(filename) if filename else None
+
+    def resolve_file(self, filename: str) -> Optional[Path]:
+        return self._playable.get(filename)
+
+    def resolve_default(self) -> Optional[Path]:
+        return self._by_stem.get(DEFAULT_GREETING_STEM)
+
+    # --- scanning ---
+
+    def _scan(self) -> Tuple[Snapshot, Set[str]]:
+        """Stat the directory and validate new/changed .opus files (blocking)."""
+        snap = _snapshot(self.directory)
+        valid_opus = {
+            name for name, sig in snap.items()
+            if name.lower().endswith(".opus")
+            and self._snapshot.get(name) != sig
+            and validate_opus_file(self.directory / name)
+        }
+        return snap, valid_opus
+
+    def _apply(self, snap: Snapshot, valid_opus: Set[str]) -> None:
+        changed = {n for n, sig in snap.items() if self._snapshot.get(n) != sig}
+        removed = set(self._snapshot) - set(snap)
+        if not changed and not removed:
+            return
+        self._snapshot = snap
+
+        for filename in changed | removed:
+            invalidate_packets(self.directory / filename)
+
+        # Recompute playable paths per stem, preferring a valid .opus sibling
+        stems: Dict[str, Dict[str, str]] = {}
+        playable: Dict[str, Path] = {}
+        for filename in snap:
+            p = Path(filename)
+            if p.suffix.lower() in GREETING_SUFFIXES:
+                stems.setdefault(p.stem.lower(), {})[p.suffix.lower()] = filename
+            else:
+                # .wav/.ogg/.m4a: playable as-is with !play-join, never a greeting
+                playable[filename] = self.directory / filename
+        by_stem: Dict[str, Path] = {}
+        for stem, variants in stems.items():
+            best = None
+            opus_name = variants.get(".opus")
+            if opus_name:
+                known = self._by_stem.get(stem)
+                if opus_name not in changed and known is not None and known.name == opus_name:
+                    best = known
+                elif opus_name in valid_opus:
+                    best = self.directory / opus_name
+                else:
+                    audio_log.warning("%s failed Opus validation; using MP3 if present", opus_name)
+            if best is None and ".mp3" in variants:
+                best = self.directory / variants[".mp3"]
+            if best is None:
+                continue
+            by_stem[stem] = best
+            for filename in variants.values():
+                playable[filename] = best
+        self._playable = playable
+        self._by_stem = by_stem
+
+        # Greeting names: last match in sorted order wins, as before
+        names: Dict[str, str] = {}
+        for filename in sorted(snap):
+            m = _pattern.match(filename)
+            if m and filename in playable:
+                names[m.group("name").lower()] = filename
+
+        for name_key in set(self.name_to_filename) - set(names):
+            self._unregister(name_key)
+            audio_log.info("Removed greeting %s", name_key)
+        for name_key, filename in names.items():
+            if name_key not in self.name_to_filename:
+                self._register(name_key)
+                audio_log.info("Added greeting %s -> %s", name_key, filename)
+        self.name_to_filename = names
+
+        # Env tokens are only looked up for names we haven't seen before
+        for name_key in names:
+            if name_key not in self._name_ids:
+                self._name_ids[name_key] = _member_id_for(name_key)
+        self.id_to_filename = {
+            self._name_ids[name_key]: filename
+            for name_key, filename in names.items()
+            if self._name_ids[name_key] is not None
+        }
+        audio_log.debug("Greeting mappings: %s", self.id_to_filename)
+
+    def rescan(self) -> None:
+        """Blocking rescan; used once at import before the event loop runs."""
+        self._apply(*self._scan())
+
+    async def rescan_async(self) -> None:
+        """Rescan with all filesystem work in a worker thread."""
+        self._apply(*await asyncio.to_thread(self._scan))
+
+    # --- bot commands ---
+
+    def _register(self, name_key: str) -> None:
+        if self._bot is None:
+            return
+        from discord.ext import commands
+        # voice_commands imports the registry, so import it here, not at module level
+        from voice_commands import play_join
 
-    for name_key, filename in name_to_filename.items():
         cmd_name = f"play-audio-greeting-{name_key}"
+        if self._bot.get_command(cmd_name) is not None:
+            return
 
-        async def _cmd(ctx, _filename=filename):
+        async def _cmd(ctx, _name_key=name_key):
             # Admin check
             if not ctx.author.guild_permissions.administrator:
                 await ctx.send("This command is for administrators only.")
                 return
-            await play_join(ctx, _filename)
+            filename = self.name_to_filename.get(_name_key)
+            path = self.resolve_file(filename) if filename else None
+            if path is None:
+                await ctx.send(f"Greeting {_name_key} is no longer available.")
+                return
+            await play_join(ctx, path.name)
 
         # Add the command to the bot
-        bot.add_command(commands.Command(_cmd, name=cmd_name))
\ No newline at end of file
+        self._bot.add_command(commands.Command(_cmd, name=cmd_name))
+
+    def _unregister(self, name_key: str) -> None:
+        if self._bot is not None:
+            self._bot.remove_command(f"play-audio-greeting-{name_key}")
+
+    def attach(self, bot) -> None:
+        self._bot = bot
+        for name_key in self.name_to_filename:
+            self._register(name_key)
+
+    # --- watching ---
+
+    def start_watching(self) -> None:
+        """Start the directory watcher (no-op if already running)."""
+        if self._watch_task is None or self._watch_task.done():
+            self._watch_task = asyncio.create_task(self._watch())
+
+    async def _watch(self) -> None:
+        fd = _inotify_watch(self.directory)
+        if fd is None:
+            audio_log.info("inotify unavailable; polling greetings every %ss", POLL_INTERVAL)
+            while True:
+                await asyncio.sleep(POLL_INTERVAL)
+                try:
+                    await self.rescan_async()
+                except OSError as e:
+                    audio_log.error("Greetings rescan failed: %s", e)
+
+        loop = asyncio.get_running_loop()
+        changed = asyncio.Event()
+
+        def _on_readable():
+            try:
+                while os.read(fd, 4096):
+                    pass
+            except BlockingIOError:
+                pass
+            changed.set()
+
+        loop.add_reader(fd, _on_readable)
+        audio_log.info("Watching %s with inotify", self.directory)
+        try:
+            while True:
+                await changed.wait()
+                # Let a burst of copies/renames settle before rescanning
+                await asyncio.sleep(0.5)
+                changed.clear()
+                try:
+                    await self.rescan_async()
+                except OSError as e:
+                    audio_log.error("Greetings rescan failed: %s", e)
+        finally:
+            loop.remove_reader(fd)
+            os.close(fd)
+
+
+def _inotify_watch(directory: Path) -> Optional[int]:
+    """Return a non-blocking inotify fd watching `directory`, or None if unsupported."""
+    libc_name = ctypes.util.find_library("c")
+    if not libc_name or not directory.exists():
+        return None
+    try:
+        libc = ctypes.CDLL(libc_name, use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+    except (OSError, AttributeError):
+        return None
+    if fd < 0:
+        return None
+    if libc.inotify_add_watch(fd, os.fsencode(directory), _IN_WATCH_MASK) < 0:
+        os.close(fd)
+        return None
+    return fd
+
+
+greeting_registry = GreetingRegistry()
+
+
+def get_greeting_for_member(member_id: int, guild_id: Optional[int] = None) -> Optional[str]:
+    """Return basename filename for member_id (stored assignment or env token)."""
+    return greeting_registry.filename_for_member(member_id, guild_id)
+
+
+async def assign_greeting(ctx, member, name: str):
+    """Assign greeting `name` to `member` in this guild."""
+    name_key = name.lower()
+    if name_key not in greeting_registry.name_to_filename:
+        available = ", ".join(sorted(greeting_registry.name_to_filename)) or "none"
+        await ctx.send(f"Unknown greeting `{name}`. Available: {available}")
+        return
+    try:
+        await greeting_store.assign(ctx.guild.id, member.id, name_key)
+    except Exception as e:
+        await ctx.send(f"Failed to save greeting: {e}")
+        return
+    await ctx.send(f"✅ {member.display_name} will be greeted with `{name_key}`")
+
+
+async def unassign_greeting(ctx, member):
+    """Remove `member`'s stored greeting in this guild."""
+    try:
+        removed = await greeting_store.unassign(ctx.guild.id, member.id)
+    except Exception as e:
+        await ctx.send(f"Failed to remove greeting: {e}")
+        return
+    if removed:
+        await ctx.send(f"Removed greeting for {member.display_name}")
+    else:
+        await ctx.send(f"{member.display_name} has no stored greeting")
+
+
+def register_greeting_commands(bot):
+    """Add admin-only commands for available greetings and keep them in sync.
+
+    Command names: `play-audio-greeting-<name>` where `<name>` is the lowercase name from file.
+    Commands are added/removed as files appear in or vanish from the directory.
+    """
+    greeting_registry.attach(bot)
@@ -0,0 +1,108 @@
+"""Queued, level-gated logging for the event hot paths.
+
+Each subsystem (VOICE, AUDIO, AUDIT, MOLDA, TASK) has its own logger and
+level. Records are handed to a background thread through a queue and only
+formatted and written there, so the event loop never blocks on stdout or
+pays for string formatting: messages use %-style args, and anything that is
+expensive to build is guarded with `isEnabledFor`.
+
+Text output keeps the familiar `[VOICE] ...` lines; LOG_FORMAT=json writes
+one JSON object per record, including any `extra={"fields": {...}}`.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+from typing import Dict
+
+from config import LOG_FORMAT, LOG_LEVELS, LOG_SUBSYSTEMS, VOICE_LOG_SAMPLE_RATE
+
+_ROOT = "bot"
+
+
+def _subsystem(record: logging.LogRecord) -> str:
+    return record.name.rsplit(".", 1)[-1].upper()
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        line = f"[{_subsystem(record)}] {record.getMessage()}"
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "subsystem": _subsystem(record),
+            "msg": record.getMessage(),
+        }
+        data.update(getattr(record, "fields", None) or {})
+        if record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+        return json.dumps(data, default=str, ensure_ascii=False)
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves formatting to the writer thread.
+
+    The stock `prepare` formats the message on the caller's thread; the
+    writer is in-process, so the record can be queued as-is.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+_listener: logging.handlers.QueueListener
+
+
+def _setup() -> None:
+    global _listener
+    out = logging.StreamHandler(sys.stdout)
+    out.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else TextFormatter())
+    _listener = logging.handlers.QueueListener(_queue, out, respect_handler_level=False)
+    _listener.start()
+    # Flush whatever is still queued when the process exits
+    atexit.register(_listener.stop)
+
+    root = logging.getLogger(_ROOT)
+    root.handlers[:] = [_DeferredQueueHandler(_queue)]
+    # Keep our records out of discord.py's root handler
+    root.propagate = False
+    for name, level in LOG_LEVELS.items():
+        set_level(name, level)
+
+
+def get_logger(subsystem: str) -> logging.Logger:
+    return logging.getLogger(f"{_ROOT}.{subsystem.lower()}")
+
+
+def set_level(subsystem: str, level: str) -> None:
+    """Change a subsystem's level at runtime (e.g. "VOICE", "DEBUG")."""
+    get_logger(subsystem).setLevel(level.upper())
+
+
+def levels() -> Dict[str, str]:
+    return {name: logging.getLevelName(get_logger(name).getEffectiveLevel()) for name in LOG_SUBSYSTEMS}
+
+
+def sample_voice_event() -> bool:
+    """Whether this voice-state event's diagnostic line should be logged."""
+    return VOICE_LOG_SAMPLE_RATE >= 1.0 or random.random() < VOICE_LOG_SAMPLE_RATE
+
+
+_setup()
+
+voice_log = get_logger("VOICE")
+audio_log = get_logger("AUDIO")
+audit_log = get_logger("AUDIT")
+molda_log = get_logger("MOLDA")
+task_log = get_logger("TASK")
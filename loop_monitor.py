@@ -0,0 +1,144 @@
+import asyncio
+import heapq
+import itertools
+import sys
+import threading
+import time
+import traceback
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+import metrics
+from config import LOOP_LAG_INTERVAL, LOOP_STALL_KEEP, LOOP_STALL_THRESHOLD
+from log import task_log
+
+# Innermost frames kept per captured stack
+STACK_DEPTH = 12
+
+
+@dataclass
+class Stall:
+    seconds: float
+    # Wall-clock time the stall ended
+    at: float
+    # "file:line in func" lines, outermost first; empty if the loop resumed before capture
+    stack: List[str] = field(default_factory=list)
+
+
+def _format_stack(frame) -> List[str]:
+    lines = []
+    for fs in traceback.extract_stack(frame)[-STACK_DEPTH:]:
+        where = f"{fs.filename.rsplit('/', 1)[-1]}:{fs.lineno} in {fs.name}"
+        lines.append(f"{where}: {fs.line}" if fs.line else where)
+    return lines
+
+
+class LoopLagMonitor:
+    """Measures event-loop lag and captures what was running during stalls.
+
+    A heartbeat coroutine sleeps `interval` and records how late it woke up.
+    A watchdog thread watches the heartbeat; once it is more than `threshold`
+    overdue the loop is blocked, and the thread grabs the loop thread's stack
+    (sys._current_frames), i.e. the blocking call itself. When the heartbeat
+    finally runs, the stall is timed and kept if it ranks among the `keep`
+    worst seen so far.
+    """
+
+    def __init__(self, interval: float = LOOP_LAG_INTERVAL, threshold: float = LOOP_STALL_THRESHOLD,
+                 keep: int = LOOP_STALL_KEEP):
+        self.interval = interval
+        self.threshold = threshold
+        self.keep = keep
+        # min-heap of (seconds, seq, stall); the smallest is evicted first
+        self._worst: List[Tuple[float, int, Stall]] = []
+        self._seq = itertools.count()
+        self.stalls = 0
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._loop_thread_id = 0
+        # Written by the heartbeat, read by the watchdog thread
+        self._beat = 0
+        self._beat_due = 0.0
+        # (beat, stack) captured by the watchdog thread for an overdue beat
+        self._captured: Optional[Tuple[int, List[str]]] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        """Start the heartbeat and watchdog thread (no-op if running or disabled)."""
+        if self.threshold <= 0 or self.running:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._beat_due = time.monotonic() + self.interval
+        self._task = asyncio.create_task(self._heartbeat())
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+            self._thread.start()
+        task_log.info("Loop lag monitor started (stall threshold %.0f ms)", self.threshold * 1000)
+
+    async def _heartbeat(self) -> None:
+        while True:
+            self._beat += 1
+            self._beat_due = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.monotonic() - self._beat_due)
+            metrics.loop_lag.observe(lag)
+            if lag >= self.threshold:
+                self._record(lag)
+
+    def _record(self, lag: float) -> None:
+        captured, self._captured = self._captured, None
+        stack = captured[1] if captured is not None and captured[0] == self._beat else []
+        stall = Stall(lag, time.time(), stack)
+        self.stalls += 1
+        metrics.loop_stalls.inc()
+        heapq.heappush(self._worst, (lag, next(self._seq), stall))
+        if len(self._worst) > self.keep:
+            heapq.heappop(self._worst)
+        metrics.loop_worst_stall.set(max(s for s, _, _ in self._worst))
+        task_log.warning(
+            "Event loop blocked for %.0f ms%s", lag * 1000,
+            (" in " + stack[-1]) if stack else "",
+        )
+
+    def _watch(self) -> None:
+        poll = max(0.005, min(self.interval, self.threshold) / 2)
+        while True:
+            time.sleep(poll)
+            beat = self._beat
+            if time.monotonic() - self._beat_due < self.threshold:
+                continue
+            if self._captured is not None and self._captured[0] == beat:
+                continue  # already have this stall's stack
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is not None and beat == self._beat:
+                self._captured = (beat, _format_stack(frame))
+
+    def worst(self) -> List[Stall]:
+        return [stall for _, _, stall in sorted(self._worst, reverse=True)]
+
+    def clear(self) -> None:
+        self._worst.clear()
+        metrics.loop_worst_stall.set(0.0)
+
+    def describe(self, frames: int = 6) -> List[str]:
+        if not self.running:
+            return ["Loop lag monitor is off (LOOP_STALL_THRESHOLD=0)"]
+        lag = metrics.loop_lag.summary()
+        lines = [
+            f"Loop lag: p50≤{lag['p50'] * 1000:g}ms p95≤{lag['p95'] * 1000:g}ms | "
+            f"{self.stalls} stall(s) over {self.threshold * 1000:.0f}ms" if lag else "Loop lag: no data yet"
+        ]
+        for i, stall in enumerate(self.worst(), start=1):
+            when = time.strftime("%H:%M:%S", time.localtime(stall.at))
+            lines.append(f"{i}. {stall.seconds * 1000:.0f} ms at {when}")
+            if stall.stack:
+                lines.append("```\n" + "\n".join(stall.stack[-frames:]) + "\n```")
+            else:
+                lines.append("(loop resumed before a stack was captured)")
+        return lines
+
+
+loop_monitor = LoopLagMonitor()
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""Compare the gateway cache memory of the default and lean (LEAN_CACHE) profiles.
+
+    python measure_cache.py                          # 5 guilds of 2.5k/10k/40k members, 1000 messages
+    python measure_cache.py --guilds 20 --members 10000,100000 --messages 5000
+
+Each profile and guild size runs in its own interpreter. A discord.Client
+is built with the profile's intents and options, then fed synthetic
+GUILD_CREATE and MESSAGE_CREATE payloads through its connection state, the
+same parsers the gateway uses. No connection to Discord is made. Reported:
+Python heap growth (tracemalloc) and RSS growth per run, then a linear fit
+over the guild sizes: the cost per 10k members (slope) and the fixed cost
+(intercept, which is where the message cache shows up).
+
+The payloads mirror what Discord sends without the privileged members
+intent: GUILD_CREATE carries only the bot and members who are in voice
+(`--voice-ratio` of the guild).
+"""
+
+import argparse
+import gc
+import json
+import subprocess
+import sys
+import tracemalloc
+from typing import Dict, List, Tuple
+
+import discord
+
+from cache_profile import build_intents, client_options
+
+PROFILES = ("default", "lean")
+BOT_ID = 1
+
+
+def _rss_kb() -> int:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def _user(uid: int) -> dict:
+    return {"id": str(uid), "username": f"user{uid}", "discriminator": "0",
+            "global_name": f"User {uid}", "avatar": None}
+
+
+def _guild_payload(gid: int, members: int, channels: int, roles: int, emojis: int, voice: int) -> dict:
+    base = gid * 1_000_000
+    role_list = [{"id": str(gid), "name": "@everyone", "permissions": "104324673",
+                  "position": 0, "color": 0, "hoist": False, "managed": False, "mentionable": False}]
+    role_list += [{"id": str(base + 1000 + i), "name": f"role{i}", "permissions": "0", "position": i + 1,
+                   "color": 0, "hoist": False, "managed": False, "mentionable": False}
+                  for i in range(roles)]
+    chan_list = [{"id": str(base + 2000 + i), "type": 2 if i % 4 == 0 else 0, "name": f"chan{i}",
+                  "position": i, "permission_overwrites": [], "guild_id": str(gid),
+                  "bitrate": 64000, "user_limit": 0}
+                 for i in range(channels)]
+    voice_chan = str(base + 2000)
+    member_ids = [BOT_ID] + [base + 10_000 + i for i in range(voice)]
+    member_list = [{"user": _user(uid), "roles": [role_list[1]["id"]] if roles else [],
+                "joined_at": "2024-01-01T00:00:00+00:00", "deaf": False, "mute": False, "flags": 0}
+               for uid in member_ids]
+    voice_states = [{"user_id": str(uid), "channel_id": voice_chan, "session_id": "s",
+                     "deaf": False, "mute": False, "self_deaf": False, "self_mute": False,
+                     "self_video": False, "suppress": False}
+                    for uid in member_ids[1:]]
+    return {
+        "id": str(gid), "name": f"guild{gid}", "owner_id": str(BOT_ID), "member_count": members,
+        "roles": role_list, "channels": chan_list, "members": member_list, "voice_states": voice_states,
+        "emojis": [{"id": str(base + 5000 + i), "name": f"emoji{i}", "roles": [],
+                    "require_colons": True, "managed": False, "animated": False, "available": True}
+                   for i in range(emojis)],
+        "threads": [], "stickers": [], "features": [], "large": members > 250,
+    }
+
+
+def _message_payload(gid: int, channel_id: int, mid: int, author_id: int) -> dict:
+    return {
+        "id": str(mid), "channel_id": str(channel_id), "guild_id": str(gid), "type": 0,
+        "author": _user(author_id),
+        "member": {"roles": [], "joined_at": "2024-01-01T00:00:00+00:00", "deaf": False, "mute": False, "flags": 0},
+        "content": f"message number {mid} with some ordinary chat text in it",
+        "timestamp": "2024-01-01T00:00:00+00:00", "edited_timestamp": None, "tts": False,
+        "mention_everyone": False, "mentions": [], "mention_roles": [], "attachments": [],
+        "embeds": [], "pinned": False,
+    }
+
+
+def measure(profile: str, members: int, args) -> Dict[str, int]:
+    lean = profile == "lean"
+    voice = int(members * args.voice_ratio)
+    tracemalloc.start()
+    gc.collect()
+    heap0, rss0 = tracemalloc.get_traced_memory()[0], _rss_kb()
+
+    client = discord.Client(intents=build_intents(lean), **client_options(lean))
+    state = client._connection
+    state.user = discord.ClientUser(state=state, data=_user(BOT_ID))
+    for g in range(args.guilds):
+        gid = 100 + g
+        state._add_guild_from_data(_guild_payload(gid, members, args.channels, args.roles, args.emojis, voice))
+    for i in range(args.messages):
+        gid = 100 + i % args.guilds
+        text_channel = gid * 1_000_000 + 2001
+        state.parse_message_create(_message_payload(gid, text_channel, 10**12 + i, 5 * 10**9 + i % 500))
+
+    gc.collect()
+    heap1, rss1 = tracemalloc.get_traced_memory()[0], _rss_kb()
+    return {
+        "heap": heap1 - heap0,
+        "rss": (rss1 - rss0) * 1024,
+        "members": sum(len(guild._members) for guild in client.guilds),
+        "messages": len(state._messages or ()),
+    }
+
+
+def _mb(n: float) -> str:
+    return f"{round(n / 1_048_576, 2) + 0.0:.2f} MB"  # + 0.0 turns -0.0 into 0.0
+
+
+def _fit(xs: List[float], ys: List[float]) -> Tuple[float, float]:
+    """Least-squares (slope, intercept)."""
+    mx, my = sum(xs) / len(xs), sum(ys) / len(ys)
+    var = sum((x - mx) ** 2 for x in xs)
+    slope = sum((x - mx) * (y - my) for x, y in zip(xs, ys)) / var if var else 0.0
+    return slope, my - slope * mx
+
+
+def main(argv: List[str]) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    ap.add_argument("--guilds", type=int, default=5)
+    ap.add_argument("--members", default="2500,10000,40000",
+                    help="comma-separated guild sizes (members per guild) to sweep")
+    ap.add_argument("--voice-ratio", type=float, default=0.01, help="fraction of members in voice")
+    ap.add_argument("--channels", type=int, default=60, help="channels per guild")
+    ap.add_argument("--roles", type=int, default=40, help="roles per guild")
+    ap.add_argument("--emojis", type=int, default=50, help="emojis per guild")
+    ap.add_argument("--messages", type=int, default=1000, help="messages received (default cache keeps 1000)")
+    ap.add_argument("--profile", choices=PROFILES, help=argparse.SUPPRESS)
+    args = ap.parse_args(argv)
+    sizes = [int(n) for n in args.members.split(",") if n.strip()]
+
+    if args.profile:
+        print(json.dumps(measure(args.profile, sizes[0], args)))
+        return 0
+
+    child_args = [
+        "--guilds", str(args.guilds), "--voice-ratio", str(args.voice_ratio), "--channels", str(args.channels),
+        "--roles", str(args.roles), "--emojis", str(args.emojis), "--messages", str(args.messages),
+    ]
+    results: Dict[str, List[Dict[str, int]]] = {p: [] for p in PROFILES}
+    for members in sizes:
+        for profile in PROFILES:
+            out = subprocess.run(
+                [sys.executable, __file__, *child_args, "--members", str(members), "--profile", profile],
+                stdout=subprocess.PIPE, text=True, check=True,
+            ).stdout
+            results[profile].append(json.loads(out.strip().splitlines()[-1]))
+
+    print(f"{args.guilds} guilds ({args.voice_ratio:.0%} of members in voice, {args.channels} channels, "
+          f"{args.roles} roles, {args.emojis} emojis), {args.messages} messages")
+    print(f"{'members/guild':>13} {'profile':<8} {'cached':>7} {'messages':>9} {'heap':>10} {'rss':>10}")
+    for i, members in enumerate(sizes):
+        for profile in PROFILES:
+            r = results[profile][i]
+            print(f"{members:>13} {profile:<8} {r['members']:>7} {r['messages']:>9} "
+                  f"{_mb(r['heap']):>10} {_mb(r['rss']):>10}")
+
+    total = [members * args.guilds for members in sizes]
+    print()
+    if len(set(sizes)) > 1:
+        print(f"{'':<8} {'heap/10k members':>17} {'rss/10k members':>16} {'fixed heap':>11} {'fixed rss':>10}")
+        fits = {}
+        for profile in PROFILES:
+            heap = _fit(total, [r["heap"] for r in results[profile]])
+            rss = _fit(total, [r["rss"] for r in results[profile]])
+            fits[profile] = heap, rss
+            print(f"{profile:<8} {_mb(heap[0] * 10_000):>17} {_mb(rss[0] * 10_000):>16} "
+                  f"{_mb(heap[1]):>11} {_mb(rss[1]):>10}")
+        (dh, dr), (lh, lr) = fits["default"], fits["lean"]
+        print(f"lean saves {_mb((dh[0] - lh[0]) * 10_000)} heap / {_mb((dr[0] - lr[0]) * 10_000)} RSS "
+              f"per 10k members, plus {_mb(dh[1] - lh[1])} heap / {_mb(dr[1] - lr[1])} RSS fixed")
+    else:
+        d, lean = results["default"][0], results["lean"][0]
+        per = 10_000 / total[0] if total[0] else 0.0
+        print(f"lean saves {_mb(d['heap'] - lean['heap'])} heap, {_mb(d['rss'] - lean['rss'])} RSS "
+              f"({_mb((d['heap'] - lean['heap']) * per)} heap per 10k members, fixed costs included; "
+              f"pass several --members sizes for the slope)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
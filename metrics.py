@@ -0,0 +1,372 @@
+"""In-process counters and latency histograms, exposed as Prometheus text.
+
+Metrics are plain objects updated from the event loop (and, for the first
+audio packet, from discord.py's audio thread), so updates take a small lock.
+`render()` produces the Prometheus text format; `start_http_server()` serves
+it on 127.0.0.1:METRICS_PORT and `!stats` prints a short summary.
+"""
+import asyncio
+import math
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from config import METRICS_PORT
+from log import task_log
+
+PREFIX = "bot_"
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _labels_text(names: Sequence[str], values: LabelValues, extra: str = "") -> str:
+    parts = [f'{n}="{v}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _fmt(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = PREFIX + name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        registry.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        # Text format 0.0.4: the TYPE line must name the samples, so the family is `<name>_total`
+        super().__init__(name + "_total", help_text, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels_text(self.labelnames, key)} {_fmt(value)}")
+        return lines
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def set(self, value: float, **labels: str) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels_text(self.labelnames, key)} {_fmt(value)}")
+        return lines
+
+
+class _Series:
+    __slots__ = ("buckets", "sum", "count")
+
+    def __init__(self, n: int):
+        self.buckets = [0] * n  # non-cumulative; made cumulative when rendered
+        self.sum = 0.0
+        self.count = 0
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, help_text, labelnames)
+        self.bounds = tuple(sorted(buckets)) + (math.inf,)
+        self._series: Dict[LabelValues, _Series] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        # Linear scan: ~14 bounds, cheaper than bisect's call overhead here
+        index = 0
+        for index, bound in enumerate(self.bounds):
+            if value <= bound:
+                break
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = _Series(len(self.bounds))
+            series.buckets[index] += 1
+            series.sum += value
+            series.count += 1
+
+    def count(self, **labels: str) -> int:
+        series = self._series.get(self._key(labels))
+        return series.count if series else 0
+
+    def summary(self, **labels: str) -> Optional[Dict[str, float]]:
+        """count/avg/p50/p95 for one label set, or all sets merged if none given."""
+        with self._lock:
+            if labels:
+                picked = [self._series[k] for k in [self._key(labels)] if k in self._series]
+            else:
+                picked = list(self._series.values())
+            if not picked:
+                return None
+            buckets = [sum(s.buckets[i] for s in picked) for i in range(len(self.bounds))]
+            total = sum(s.sum for s in picked)
+            count = sum(s.count for s in picked)
+        if not count:
+            return None
+        return {
+            "count": count,
+            "avg": total / count,
+            "p50": self._quantile(buckets, count, 0.5),
+            "p95": self._quantile(buckets, count, 0.95),
+        }
+
+    def _quantile(self, buckets: List[int], count: int, q: float) -> float:
+        """Upper bound of the bucket containing the q-quantile (as Prometheus would estimate)."""
+        rank = q * count
+        seen = 0
+        for bound, n in zip(self.bounds, buckets):
+            seen += n
+            if seen >= rank:
+                return bound if bound != math.inf else self.bounds[-2]
+        return self.bounds[-2]
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, n in zip(self.bounds, series.buckets):
+                    cumulative += n
+                    le = 'le="' + _fmt(bound) + '"'
+                    lines.append(f"{self.name}_bucket{_labels_text(self.labelnames, key, le)} {cumulative}")
+                labels = _labels_text(self.labelnames, key)
+                lines.append(f"{self.name}_sum{labels} {_fmt(series.sum)}")
+                lines.append(f"{self.name}_count{labels} {series.count}")
+        return lines
+
+
+class PendingTimer:
+    """Times keyed operations that start in one place and finish in another."""
+
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+        self._started: Dict[Tuple[int, int], float] = {}
+
+    def start(self, key: Tuple[int, int], started: Optional[float] = None) -> None:
+        """`started` is a time.monotonic() timestamp; defaults to now."""
+        # Keep the earliest start if the same key is started twice
+        self._started.setdefault(key, time.monotonic() if started is None else started)
+
+    def finish(self, key: Tuple[int, int], **labels: str) -> None:
+        started = self._started.pop(key, None)
+        if started is not None:
+            self.histogram.observe(time.monotonic() - started, **labels)
+
+    def discard(self, key: Tuple[int, int]) -> None:
+        self._started.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._started)
+
+
+registry: List[_Metric] = []
+
+join_to_first_packet = Histogram(
+    "join_to_first_packet_seconds",
+    "Time from a join greeting becoming due (after JOIN_PLAY_DELAY) or an admin play request "
+    "to the first audio packet sent",
+    ("kind",),
+)
+mute_actor_lookup = Histogram(
+    "mute_actor_lookup_seconds",
+    "find_recent_mute_actor latency by outcome (index = gateway event, rest = audit-log scan, miss)",
+    ("result",),
+)
+audit_log_requests = Counter(
+    "audit_log_requests",
+    "REST audit-log page requests for mute lookups (issued, saved = lookup joined an in-flight request)",
+    ("result",),
+)
+mute_to_unmute = Histogram(
+    "mute_to_unmute_seconds",
+    "Time from detecting a monitored server mute to the automatic unmute succeeding",
+    buckets=(1.0, 2.5, 5.0, 5.5, 6.0, 7.5, 10.0, 15.0, 30.0, 60.0, 120.0),
+)
+voice_connect = Histogram(
+    "voice_connect_seconds",
+    "Duration of each voice connect attempt by caller and outcome",
+    ("source", "result"),
+)
+voice_reconnect = Histogram(
+    "voice_reconnect_seconds",
+    "Time from an unexpected voice disconnect to being connected again",
+    buckets=(0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0),
+)
+voice_events = Counter(
+    "voice_events",
+    "Voice-state updates by routed kind (noop = nothing to handle)",
+    ("kind",),
+)
+unmutes = Counter(
+    "unmutes",
+    "Automatic unmutes by outcome (sent, dropped = no longer needed, failed)",
+    ("result",),
+)
+encode_file = Histogram(
+    "encode_file_seconds",
+    "ffmpeg MP3 -> Opus encode time per file",
+    ("result",),
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0),
+)
+loop_lag = Histogram(
+    "event_loop_lag_seconds",
+    "How late the event-loop heartbeat woke up (time the loop was busy or blocked)",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+loop_stalls = Counter(
+    "event_loop_stalls",
+    "Heartbeats later than LOOP_STALL_THRESHOLD (stack captured while blocked)",
+)
+loop_worst_stall = Gauge(
+    "event_loop_worst_stall_seconds",
+    "Longest stall currently kept in the worst-stalls buffer (!loop-stalls)",
+)
+
+pending_unmutes = PendingTimer(mute_to_unmute)
+
+
+def render() -> str:
+    lines: List[str] = []
+    for metric in registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def describe() -> List[str]:
+    """Human-readable summary for `!stats`."""
+
+    def fmt(name: str, s: Optional[Dict[str, float]], unit: float = 1000.0, suffix: str = "ms") -> str:
+        if s is None:
+            return f"{name}: no data"
+        return (
+            f"{name}: n={s['count']} avg {s['avg'] * unit:.1f}{suffix} "
+            f"p50≤{s['p50'] * unit:g}{suffix} p95≤{s['p95'] * unit:g}{suffix}"
+        )
+
+    lines = [
+        fmt("Join (after delay) → first packet", join_to_first_packet.summary(kind="greeting")),
+        fmt("Play → first packet (admin)", join_to_first_packet.summary(kind="admin")),
+    ]
+
+    hits = mute_actor_lookup.count(result="index") + mute_actor_lookup.count(result="rest")
+    total = hits + mute_actor_lookup.count(result="miss")
+    rate = f"{hits / total * 100:.0f}%" if total else "n/a"
+    lines.append(
+        fmt("Mute actor lookup", mute_actor_lookup.summary())
+        + f" | hit rate {rate} (gateway {mute_actor_lookup.count(result='index')}, "
+        f"REST {mute_actor_lookup.count(result='rest')})"
+    )
+    lines.append(
+        f"Audit-log REST pages: issued {audit_log_requests.value(result='issued'):g}, "
+        f"saved by coalescing {audit_log_requests.value(result='saved'):g}"
+    )
+    lines.append(
+        fmt("Mute → unmute", mute_to_unmute.summary(), 1, "s")
+        + f" | in flight {len(pending_unmutes)} | sent {unmutes.value(result='sent'):g}, "
+        f"dropped {unmutes.value(result='dropped'):g}, failed {unmutes.value(result='failed'):g}"
+    )
+
+    for source in ("auto", "join", "molda", "watchdog"):
+        ok = voice_connect.count(source=source, result="ok")
+        attempts = sum(voice_connect.count(source=source, result=r) for r in ("ok", "timeout", "error"))
+        if attempts:
+            lines.append(
+                fmt(f"Voice connect ({source}, ok)", voice_connect.summary(source=source, result="ok"))
+                + f" | {ok}/{attempts} attempts succeeded"
+            )
+    lines.append(fmt("Voice reconnect after drop", voice_reconnect.summary(), 1, "s"))
+    lines.append(fmt("Encode per file", encode_file.summary(result="ok"), 1, "s"))
+    lines.append(
+        fmt("Event-loop lag", loop_lag.summary())
+        + f" | stalls {loop_stalls.value():g}, worst {loop_worst_stall.value() * 1000:.0f}ms"
+    )
+    return lines
+
+
+_server: Optional[asyncio.AbstractServer] = None
+
+
+async def _handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    try:
+        request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+        # Drain headers; we don't need them
+        while (await asyncio.wait_for(reader.readline(), timeout=5)) not in (b"\r\n", b"\n", b""):
+            pass
+        path = request_line.split()[1].decode() if len(request_line.split()) > 1 else "/"
+        if path.split("?")[0] in ("/metrics", "/"):
+            body = render().encode()
+            status = "200 OK"
+        else:
+            body = b"not found\n"
+            status = "404 Not Found"
+        writer.write(
+            f"HTTP/1.1 {status}\r\n"
+            "Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+    except (asyncio.TimeoutError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def start_http_server(port: int = METRICS_PORT) -> None:
+    """Serve /metrics on 127.0.0.1:`port` (no-op if 0 or already running)."""
+    global _server
+    if not port or _server is not None:
+        return
+    try:
+        _server = await asyncio.start_server(_handle, "127.0.0.1", port)
+        task_log.info("Serving Prometheus metrics on http://127.0.0.1:%s/metrics", port)
+    except OSError as e:
+        task_log.warning("Failed to start metrics server on port %s: %s", port, e)
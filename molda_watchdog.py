@@ -0,0 +1,135 @@
+import asyncio
+from typing import Dict, Optional, Set
+
+import discord
+from discord.ext import commands
+
+from config import MOLDA_SWEEP_INTERVAL
+from log import molda_log
+from voice_supervisor import voice_connections, voice_supervisor
+
+
+class MoldaWatchdog:
+    """Keeps the bot in its molda channel in every guild that has one set.
+
+    One task serves all guilds. It wakes immediately when the bot's own
+    voice state changes or a voice client is torn down (`notify`), and
+    every MOLDA_SWEEP_INTERVAL seconds, however often it was woken in
+    between, runs a sweep over all targets. A sweep is only dict lookups
+    per guild; the supervisor is called just for guilds that are out of
+    place.
+    """
+
+    def __init__(self, interval: float = MOLDA_SWEEP_INTERVAL):
+        self.interval = interval
+        # guild_id -> molda channel_id to stay in
+        self.targets: Dict[int, int] = {}
+        self._pending: Set[int] = set()
+        self._checks: Dict[int, asyncio.Task] = {}
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._bot: Optional[commands.Bot] = None
+        self.sweeps = 0
+        self.repairs = 0
+
+    def start(self, bot: commands.Bot) -> None:
+        """Start the watchdog loop (no-op if already running)."""
+        self._bot = bot
+        if self._task is None or self._task.done():
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+            voice_supervisor.add_drop_listener(self.notify)
+
+    def set_target(self, guild_id: int, channel_id: int) -> None:
+        self.targets[guild_id] = channel_id
+
+    def clear_target(self, guild_id: int) -> None:
+        self.targets.pop(guild_id, None)
+        self._pending.discard(guild_id)
+
+    def notify(self, guild_id: int) -> None:
+        """Check `guild_id` now (called on bot voice-state changes and client teardown)."""
+        if guild_id in self.targets and self._wake is not None:
+            self._pending.add(guild_id)
+            self._wake.set()
+
+    def is_healthy(self, guild_id: int) -> bool:
+        vc = voice_connections.get(guild_id)
+        return (
+            vc is not None
+            and vc.is_connected()
+            and getattr(vc.channel, "id", None) == self.targets.get(guild_id)
+        )
+
+    def describe(self) -> str:
+        healthy = sum(1 for g in self.targets if self.is_healthy(g))
+        return (
+            f"Molda targets: {len(self.targets)} ({healthy} in place) | "
+            f"sweeps: {self.sweeps} every {self.interval:g}s | repairs: {self.repairs}"
+        )
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        last_sweep = loop.time()
+        while True:
+            if not self._pending:
+                # Wake on notify, but never later than the next sweep is due
+                timeout = max(0.0, last_sweep + self.interval - loop.time())
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+            self._wake.clear()
+
+            # Sweep on schedule even if a stream of notifies keeps waking us
+            if loop.time() - last_sweep >= self.interval:
+                last_sweep = loop.time()
+                self.sweeps += 1
+                self._pending.update(g for g in self.targets if not self.is_healthy(g))
+
+            pending, self._pending = self._pending, set()
+            for guild_id in pending:
+                check = self._checks.get(guild_id)
+                if check is None or check.done():
+                    self._checks[guild_id] = asyncio.create_task(self._check(guild_id))
+
+    async def _check(self, guild_id: int) -> None:
+        try:
+            if self.is_healthy(guild_id):
+                return
+            guild = self._bot.get_guild(guild_id) if self._bot else None
+            grace = voice_supervisor.reconnect_grace_left(guild) if guild else 0.0
+            if grace:
+                # discord.py still holds an unconnected client and may be
+                # reconnecting it; give it the rest of the window since the drop
+                await asyncio.sleep(grace)
+                if self.is_healthy(guild_id):
+                    return
+
+            channel_id = self.targets.get(guild_id)
+            if channel_id is None:
+                return
+            channel = self._bot.get_channel(channel_id) if self._bot else None
+            if not channel or not isinstance(channel, discord.VoiceChannel):
+                molda_log.warning("Channel %s not found or not a voice channel", channel_id)
+                return
+            if not channel.permissions_for(channel.guild.me).connect:
+                molda_log.warning("Cannot rejoin %s - bot lacks CONNECT permission", channel.name)
+                return
+
+            molda_log.info("Not in molda channel %s; rejoining...", channel.name)
+            if await voice_supervisor.connect(channel, source="watchdog") is not None:
+                self.repairs += 1
+                molda_log.info("Back in molda channel: %s", channel.name)
+            else:
+                molda_log.error(
+                    "Failed to return to molda channel: %s", voice_supervisor.guild(guild_id).last_error
+                )
+        except Exception as e:
+            molda_log.error("Watchdog check for guild %s failed: %s: %s", guild_id, type(e).__name__, e)
+        finally:
+            if self._checks.get(guild_id) is asyncio.current_task():
+                del self._checks[guild_id]
+
+
+molda_watchdog = MoldaWatchdog()
@@ -0,0 +1,284 @@
+import asyncio
+import itertools
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import discord
+
+import metrics
+from audio_source import build_source
+from config import GREETING_COALESCE_WINDOW
+from ffmpeg_helper import cached_ffmpeg_exec
+from log import audio_log
+
+# Lower value plays first
+PRIORITY_ADMIN = 0
+PRIORITY_GREETING = 1
+
+
+class _FirstPacketTimer(discord.AudioSource):
+    """Passes audio through and records when the first packet is read.
+
+    `read()` runs on discord.py's audio thread; `started` is a loop.time()
+    (monotonic) timestamp, so the two clocks compare directly.
+    """
+
+    def __init__(self, source: discord.AudioSource, started: float, kind: str):
+        self._source = source
+        self._started = started
+        self._kind = kind
+
+    def read(self) -> bytes:
+        data = self._source.read()
+        if self._kind is not None and data:
+            metrics.join_to_first_packet.observe(time.monotonic() - self._started, kind=self._kind)
+            self._kind = None
+        return data
+
+    def is_opus(self) -> bool:
+        return self._source.is_opus()
+
+    def cleanup(self) -> None:
+        self._source.cleanup()
+
+
+@dataclass
+class PlaybackRequest:
+    priority: int
+    path: Path
+    label: str
+    seq: int
+    enqueued_at: float
+    # Loop time before which the request must not start (join delay)
+    not_before: float = 0.0
+    # Join greetings only: channel the members joined and member_id -> greeting
+    channel_id: Optional[int] = None
+    members: Dict[int, Path] = field(default_factory=dict)
+    # Played instead of individual greetings when several members coalesced
+    group_path: Optional[Path] = None
+
+    @property
+    def is_greeting(self) -> bool:
+        return self.priority == PRIORITY_GREETING
+
+
+class GuildPlayer:
+    """Playback queue for one guild's voice client.
+
+    A single pump task plays requests one at a time in (priority, arrival)
+    order. Sources are only built once a request reaches the head, so queued
+    items cost nothing until they actually play.
+    """
+
+    def __init__(self, guild_id: int):
+        self.guild_id = guild_id
+        self.vc: Optional[discord.VoiceClient] = None
+        self.queue: List[PlaybackRequest] = []
+        self.current: Optional[PlaybackRequest] = None
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def _ensure_running(self) -> None:
+        self._wake.set()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def _head(self) -> Optional[PlaybackRequest]:
+        # Queues hold a handful of items; a linear scan beats keeping a heap in sync
+        return min(self.queue, key=lambda r: (r.priority, r.seq), default=None)
+
+    def position(self, request: PlaybackRequest) -> int:
+        """1-based position of `request` among queued items (0 if playing)."""
+        if request is self.current:
+            return 0
+        ordered = sorted(self.queue, key=lambda r: (r.priority, r.seq))
+        return ordered.index(request) + 1
+
+    def clear(self) -> int:
+        dropped = len(self.queue)
+        self.queue.clear()
+        return dropped
+
+    def _resolve_greeting(self, request: PlaybackRequest) -> Optional[Path]:
+        """Drop members who left the channel and pick the file to play."""
+        guild = self.vc.guild if self.vc else None
+        present = []
+        for member_id, path in request.members.items():
+            member = guild.get_member(member_id) if guild else None
+            if member is None or member.voice is None or member.voice.channel is None:
+                audio_log.info("Member %s left or not fully connected after delay; skipping greeting.", member_id)
+                continue
+            if member.voice.channel.id != request.channel_id:
+                audio_log.info("Member %s moved channels after delay; skipping greeting.", member_id)
+                continue
+            present.append(path)
+
+        if not present:
+            return None
+        if len(set(present)) == 1:
+            return present[0]
+        return request.group_path or present[0]
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while self.queue:
+            head = self._head()
+            delay = head.not_before - loop.time()
+            if delay > 0:
+                # Wake early if something with higher priority is queued meanwhile
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            self.queue.remove(head)
+            vc = self.vc
+            if not vc or not getattr(vc, "channel", None):
+                audio_log.warning("Voice connection lost; dropping %d queued item(s).", len(self.queue) + 1)
+                self.queue.clear()
+                break
+
+            path = self._resolve_greeting(head) if head.is_greeting else head.path
+            if path is None:
+                continue
+
+            try:
+                # Never resolve/install ffmpeg here; startup does that off the loop
+                source = await build_source(path, cached_ffmpeg_exec())
+            except Exception as e:
+                audio_log.error("Failed to build source for %s: %s", path.name, e)
+                continue
+            if source is None:
+                audio_log.error("ffmpeg not available; cannot play audio.")
+                continue
+
+            # Timed from when the request became due, so the fixed JOIN_PLAY_DELAY
+            # doesn't swamp the latency we actually control
+            source = _FirstPacketTimer(
+                source, max(head.enqueued_at, head.not_before), "greeting" if head.is_greeting else "admin"
+            )
+            done = loop.create_future()
+
+            def _after(error, _done=done):
+                if error:
+                    audio_log.error("Playback error: %s", error)
+                loop.call_soon_threadsafe(lambda: _done.done() or _done.set_result(None))
+
+            try:
+                # Something outside the queue may still be playing
+                if vc.is_playing():
+                    vc.stop()
+                vc.play(source, after=_after)
+            except Exception as e:
+                audio_log.error("Failed to play %s: %s", path.name, e)
+                source.cleanup()
+                continue
+
+            self.current = head
+            audio_log.info("Playing %s (%s)", path.name, head.label)
+            try:
+                await done
+            finally:
+                self.current = None
+
+    def enqueue(self, request: PlaybackRequest) -> None:
+        self.queue.append(request)
+        # Admin requests cut off an automatic greeting that is already playing
+        if (
+            request.priority == PRIORITY_ADMIN
+            and self.current is not None
+            and self.current.is_greeting
+            and self.vc is not None
+        ):
+            self.vc.stop()
+        self._ensure_running()
+
+
+class PlaybackScheduler:
+    """Per-guild playback queues shared by join greetings and admin commands."""
+
+    def __init__(self, coalesce_window: float):
+        self.coalesce_window = coalesce_window
+        self._players: Dict[int, GuildPlayer] = {}
+        self._seq = itertools.count()
+
+    def player(self, guild_id: int) -> GuildPlayer:
+        player = self._players.get(guild_id)
+        if player is None:
+            player = self._players[guild_id] = GuildPlayer(guild_id)
+        return player
+
+    def _bind(self, vc: discord.VoiceClient) -> GuildPlayer:
+        player = self.player(vc.guild.id)
+        player.vc = vc
+        return player
+
+    def enqueue_admin(
+        self, vc: discord.VoiceClient, path: Path, label: str
+    ) -> PlaybackRequest:
+        """Queue an admin-requested file ahead of any automatic greeting."""
+        player = self._bind(vc)
+        now = asyncio.get_running_loop().time()
+        request = PlaybackRequest(
+            priority=PRIORITY_ADMIN, path=path, label=label,
+            seq=next(self._seq), enqueued_at=now,
+        )
+        player.enqueue(request)
+        return request
+
+    def enqueue_greeting(
+        self,
+        vc: discord.VoiceClient,
+        member: discord.Member,
+        channel_id: int,
+        path: Path,
+        delay: float,
+        group_path: Optional[Path],
+    ) -> PlaybackRequest:
+        """Queue a join greeting to start `delay` seconds from now.
+
+        Joins into the same channel within `coalesce_window` of a greeting
+        that hasn't started yet are folded into it rather than queued again.
+        """
+        player = self._bind(vc)
+        now = asyncio.get_running_loop().time()
+        for queued in player.queue:
+            if (
+                queued.is_greeting
+                and queued.channel_id == channel_id
+                and now - queued.enqueued_at <= self.coalesce_window
+            ):
+                queued.members[member.id] = path
+                queued.label = f"join greeting x{len(queued.members)}"
+                audio_log.info("Coalesced join of %s into queued greeting (%d members)", member, len(queued.members))
+                return queued
+
+        request = PlaybackRequest(
+            priority=PRIORITY_GREETING, path=path, label=f"join greeting for {member}",
+            seq=next(self._seq), enqueued_at=now, not_before=now + delay,
+            channel_id=channel_id, members={member.id: path}, group_path=group_path,
+        )
+        player.enqueue(request)
+        return request
+
+    def describe(self, guild_id: int) -> List[str]:
+        """Human-readable queue state, head first."""
+        player = self._players.get(guild_id)
+        if player is None:
+            return []
+        lines = []
+        if player.current is not None:
+            lines.append(f"▶️ {player.current.label}")
+        loop_now = asyncio.get_running_loop().time()
+        for i, r in enumerate(sorted(player.queue, key=lambda r: (r.priority, r.seq)), start=1):
+            kind = "admin" if r.priority == PRIORITY_ADMIN else "greeting"
+            wait = max(0.0, r.not_before - loop_now)
+            lines.append(f"{i}. [{kind}] {r.label}" + (f" (starts in {wait:.1f}s)" if wait else ""))
+        return lines
+
+
+playback_scheduler = PlaybackScheduler(coalesce_window=GREETING_COALESCE_WINDOW)
@@ -0,0 +1,216 @@
+import asyncio
+import json
+import re
+import shutil
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Dict, Optional
+
+from log import audio_log
+
+BASE_DIR = Path(__file__).resolve().parent
+AUDIO_DIR = BASE_DIR / "Molda Voice" / "greetings"
+INDEX_FILE = BASE_DIR / ".cache" / "probe_index.json"
+
+AUDIO_SUFFIXES = (".opus", ".mp3", ".ogg", ".wav", ".m4a")
+
+
+@dataclass
+class ProbeInfo:
+    size: int
+    mtime_ns: int
+    codec: Optional[str]
+    sample_rate: Optional[int]
+    channels: Optional[int]
+    bit_rate: Optional[int]  # bits per second
+    duration: Optional[float]  # seconds
+
+    @property
+    def is_opus(self) -> bool:
+        return self.codec == "opus"
+
+
+# filename (basename) -> probe metadata
+_index: Dict[str, ProbeInfo] = {}
+
+
+def get_probe_info(path: Path) -> Optional[ProbeInfo]:
+    """Return indexed metadata for `path`, or None if it was never probed or has changed since."""
+    path = Path(path)
+    info = _index.get(path.name)
+    if info is None:
+        return None
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    if st.st_size != info.size or st.st_mtime_ns != info.mtime_ns:
+        return None  # stale: the file was replaced after it was probed
+    return info
+
+
+def _ffprobe_for(ffmpeg_exec: Optional[str]) -> Optional[str]:
+    """Locate ffprobe next to the resolved ffmpeg binary, then on PATH."""
+    if ffmpeg_exec:
+        sibling = Path(ffmpeg_exec).with_name(Path(ffmpeg_exec).name.replace("ffmpeg", "ffprobe"))
+        if sibling.is_file() and sibling != Path(ffmpeg_exec):
+            return str(sibling)
+    return shutil.which("ffprobe")
+
+
+def _int_or_none(value) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _float_or_none(value) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+async def _run(cmd) -> bytes:
+    proc = await asyncio.create_subprocess_exec(
+        *cmd,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.STDOUT,
+    )
+    try:
+        stdout, _ = await asyncio.wait_for(proc.communicate(), timeout=20)
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+        raise
+    return stdout
+
+
+async def _probe_file(path: Path, ffmpeg_exec: Optional[str]) -> Optional[dict]:
+    """Probe the first audio stream of `path`.
+
+    Uses ffprobe's JSON output when available and falls back to parsing
+    `ffmpeg -i` banner output otherwise.
+    """
+    ffprobe = _ffprobe_for(ffmpeg_exec)
+    if ffprobe:
+        out = await _run([
+            ffprobe, "-v", "quiet", "-print_format", "json",
+            "-show_streams", "-show_format", "-select_streams", "a:0", str(path),
+        ])
+        data = json.loads(out or b"{}")
+        streams = data.get("streams") or []
+        if not streams:
+            return None
+        stream = streams[0]
+        fmt = data.get("format") or {}
+        return {
+            "codec": stream.get("codec_name"),
+            "sample_rate": _int_or_none(stream.get("sample_rate")),
+            "channels": _int_or_none(stream.get("channels")),
+            "bit_rate": _int_or_none(stream.get("bit_rate") or fmt.get("bit_rate")),
+            "duration": _float_or_none(stream.get("duration") or fmt.get("duration")),
+        }
+
+    if not ffmpeg_exec:
+        return None
+    out = (await _run([ffmpeg_exec, "-hide_banner", "-i", str(path)])).decode("utf8", "replace")
+    stream = re.search(r"Stream #0.*?Audio: (\w+).*?(\d+) Hz, (mono|stereo|\d+ channels)", out)
+    if not stream:
+        return None
+    layout = stream.group(3)
+    channels = {"mono": 1, "stereo": 2}.get(layout) or _int_or_none(layout.split()[0])
+    duration = re.search(r"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)", out)
+    bitrate = re.search(r"bitrate: (\d+) kb/s", out)
+    return {
+        "codec": stream.group(1),
+        "sample_rate": int(stream.group(2)),
+        "channels": channels,
+        "bit_rate": int(bitrate.group(1)) * 1000 if bitrate else None,
+        "duration": (
+            int(duration.group(1)) * 3600 + int(duration.group(2)) * 60 + float(duration.group(3))
+            if duration else None
+        ),
+    }
+
+
+def load_index() -> int:
+    """Load the persisted index from disk. Returns the number of entries."""
+    _index.clear()
+    try:
+        raw = json.loads(INDEX_FILE.read_text(encoding="utf8"))
+        for name, entry in raw.items():
+            _index[name] = ProbeInfo(**entry)
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError, TypeError) as e:
+        audio_log.warning("Ignoring unreadable probe index %s: %s", INDEX_FILE, e)
+        _index.clear()
+    return len(_index)
+
+
+def save_index() -> None:
+    try:
+        INDEX_FILE.parent.mkdir(exist_ok=True)
+        tmp = INDEX_FILE.with_suffix(".tmp")
+        tmp.write_text(
+            json.dumps({name: asdict(info) for name, info in _index.items()}, indent=2),
+            encoding="utf8",
+        )
+        tmp.replace(INDEX_FILE)
+    except OSError as e:
+        audio_log.error("Failed to save probe index: %s", e)
+
+
+async def refresh_index(ffmpeg_exec: Optional[str], directory: Path = AUDIO_DIR) -> int:
+    """Probe files that are new or whose mtime/size changed, drop deleted ones.
+
+    Returns the number of files that had to be (re)probed.
+    """
+    if not _index:
+        load_index()
+    if not directory.exists():
+        return 0
+    can_probe = bool(ffmpeg_exec or _ffprobe_for(ffmpeg_exec))
+    if not can_probe:
+        audio_log.warning("Neither ffprobe nor ffmpeg available; only cached probe entries will be used")
+
+    seen = set()
+    probed = 0
+    dropped = 0
+    for p in sorted(directory.iterdir()):
+        if p.suffix.lower() not in AUDIO_SUFFIXES or not p.is_file():
+            continue
+        seen.add(p.name)
+        st = p.stat()
+        cached = _index.get(p.name)
+        if cached and cached.size == st.st_size and cached.mtime_ns == st.st_mtime_ns:
+            continue
+        if not can_probe:
+            _index.pop(p.name, None)
+            continue
+        try:
+            meta = await _probe_file(p, ffmpeg_exec)
+        except Exception as e:
+            audio_log.warning("Failed to probe %s: %s: %s", p.name, type(e).__name__, e)
+            meta = None
+        else:
+            if meta is None:
+                audio_log.warning("No audio stream found in %s", p.name)
+        if meta is None:
+            # Don't keep describing the old contents of a changed file
+            if _index.pop(p.name, None) is not None:
+                dropped += 1
+            continue
+        _index[p.name] = ProbeInfo(size=st.st_size, mtime_ns=st.st_mtime_ns, **meta)
+        probed += 1
+
+    stale = [name for name in _index if name not in seen]
+    for name in stale:
+        del _index[name]
+
+    if probed or stale or dropped:
+        save_index()
+    audio_log.info("Probe index ready: %d file(s), %d probed", len(_index), probed)
+    return probed
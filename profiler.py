@@ -0,0 +1,148 @@
+import asyncio
+import cProfile
+import io
+import pstats
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Awaitable, Callable, List, Optional
+
+from config import PROFILE_MAX_SECONDS, PROFILE_TOP_N
+from log import task_log
+
+BASE_DIR = Path(__file__).resolve().parent
+PROFILE_DIR = BASE_DIR / "data" / "profiles"
+
+# Modules whose functions and coroutines get their own table in the report
+# (full paths, so asyncio/events.py doesn't match)
+HANDLER_FILES = {str(BASE_DIR / "events.py"), str(BASE_DIR / "voice_commands.py")}
+
+
+def _label(func: tuple) -> str:
+    filename, line, name = func
+    if filename == "~":
+        return name  # builtin, e.g. <method 'send' of 'socket' objects>
+    return f"{Path(filename).name}:{line}({name})"
+
+
+@dataclass
+class ProfileReport:
+    path: Path
+    seconds: float
+    total_calls: int
+    top: List[str] = field(default_factory=list)
+    handlers: List[str] = field(default_factory=list)
+
+    def render(self) -> str:
+        """Discord-sized text: top functions, then the handler view."""
+        top = list(self.top)
+        while True:
+            text = self._text(top)
+            # Stay under Discord's 2000-character message limit
+            if len(text) <= 1990 or len(top) <= 3:
+                return text
+            top.pop()
+
+    def _text(self, top: List[str]) -> str:
+        lines = [f"Profile `{self.path.name}`: {self.seconds:.1f}s, {self.total_calls} calls", "```"]
+        lines.append(f"{'own s':>8} {'cum s':>8} {'calls':>8}  function (by own time)")
+        lines += top
+        lines.append("```")
+        if self.handlers:
+            lines.append("Handlers (time on the loop; coroutine calls = resumes):")
+            lines.append("```")
+            lines.append(f"{'cum s':>8} {'calls':>8} {'per call':>10}  handler")
+            lines += self.handlers
+            lines.append("```")
+        else:
+            lines.append("No handler in events.py / voice_commands.py ran while profiling.")
+        return "\n".join(lines)
+
+
+def _summarize(prof: cProfile.Profile, path: Path, seconds: float, top_n: int) -> ProfileReport:
+    """Dump the profile to `path` and build the summary (runs in a worker thread)."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    prof.dump_stats(str(path))
+    stats = pstats.Stats(prof, stream=io.StringIO())
+    report = ProfileReport(path, seconds, stats.total_calls)
+
+    # stats.stats: func -> (primitive calls, total calls, own time, cumulative time, callers)
+    by_own = sorted(stats.stats.items(), key=lambda kv: kv[1][2], reverse=True)
+    for func, (_, calls, own, cum, _) in by_own[:top_n]:
+        report.top.append(f"{own:>8.3f} {cum:>8.3f} {calls:>8}  {_label(func)}")
+
+    handlers = [
+        (func, calls, cum) for func, (_, calls, _, cum, _) in stats.stats.items()
+        if func[0] in HANDLER_FILES
+    ]
+    for func, calls, cum in sorted(handlers, key=lambda h: h[2], reverse=True)[:top_n]:
+        per_call_ms = cum / calls * 1000 if calls else 0.0
+        report.handlers.append(f"{cum:>8.3f} {calls:>8} {per_call_ms:>8.2f}ms  {_label(func)}")
+    return report
+
+
+class LiveProfiler:
+    """cProfile the event loop thread for a bounded time, on demand.
+
+    Nothing is installed until `start()`; once stopped the profiler is
+    disabled and dropped, so there is no cost while it is off. Coroutines
+    are measured per resume: their cumulative time is time actually spent
+    running on the loop, not time spent awaiting.
+    """
+
+    def __init__(self):
+        self._prof: Optional[cProfile.Profile] = None
+        self._started = 0.0
+        self._timer: Optional[asyncio.Task] = None
+
+    @property
+    def active(self) -> bool:
+        return self._prof is not None
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self._started if self.active else 0.0
+
+    def start(self, seconds: float, on_done: Callable[[ProfileReport], Awaitable[None]]) -> float:
+        """Start profiling; stops by itself after `seconds` (capped) and calls `on_done`.
+
+        Returns the effective duration. Raises RuntimeError if already running
+        or another profiler is active in this thread.
+        """
+        if self.active:
+            raise RuntimeError("a profile is already running")
+        seconds = max(1.0, min(seconds, PROFILE_MAX_SECONDS))
+        prof = cProfile.Profile()
+        try:
+            prof.enable()
+        except ValueError as e:
+            raise RuntimeError(str(e)) from e
+        self._prof = prof
+        self._started = time.perf_counter()
+        self._timer = asyncio.create_task(self._auto_stop(seconds, on_done))
+        task_log.info("Profiling started for %.0fs", seconds)
+        return seconds
+
+    async def _auto_stop(self, seconds: float, on_done) -> None:
+        await asyncio.sleep(seconds)
+        self._timer = None
+        report = await self.stop()
+        if report is not None:
+            await on_done(report)
+
+    async def stop(self) -> Optional[ProfileReport]:
+        """Stop profiling and write the .prof file. Returns None if not running."""
+        prof, self._prof = self._prof, None
+        if prof is None:
+            return None
+        prof.disable()
+        seconds = time.perf_counter() - self._started
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        path = PROFILE_DIR / time.strftime("profile-%Y%m%d-%H%M%S.prof")
+        report = await asyncio.to_thread(_summarize, prof, path, seconds, PROFILE_TOP_N)
+        task_log.info("Profile written to %s (%.1fs)", path, seconds)
+        return report
+
+
+live_profiler = LiveProfiler()
@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""Replay a recorded voice trace (voice_trace.py) into events.on_voice_state_update.
+
+    python replay.py data/traces/voice-20260101-210000.jsonl --speed 10
+    python replay.py trace.jsonl --speed 0            # as fast as possible
+    python replay.py trace.jsonl --sweep 1,5,20,100   # one process per speed
+    python replay.py --synth raid.jsonl --members 500 --mutes 200 --seconds 60
+
+Events run against fakes.py guilds, so nothing talks to Discord. Mute
+actors from the trace get MONITORED_ROLE_ID, gateway audit entries are fed
+to the audit index at their recorded time, and mutes that were resolved
+over REST find their entry in the fake guild's audit log. Due unmutes are
+counted instead of sent.
+
+The report shows how far dispatch fell behind the trace's schedule and how
+many handler tasks were in flight; lateness that keeps growing with
+`--speed` is where the handlers saturate.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict, deque
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Deque, Dict, List, Optional, Tuple
+
+import log
+from config import MONITORED_ROLE_ID
+from fakes import FakeAuditLogEntry, FakeGuild, FakeMember, FakeRole, FakeVoiceState
+from voice_trace import TRACE_VERSION, read_trace, unpack_flags
+
+
+class TraceReplayer:
+    def __init__(self, header: dict, records: List[dict], speed: float):
+        self.header = header
+        self.records = records
+        self.speed = speed
+        self.bot_id = header["bot"]
+        self.guilds: Dict[int, FakeGuild] = {}
+        self.role = FakeRole(MONITORED_ROLE_ID, "monitored")
+        # (guild, member) -> actors of mutes that were resolved over REST, in order
+        self._rest_actors: Dict[Tuple[int, int], Deque[int]] = defaultdict(deque)
+        self.unmutes_fired = 0
+        self.lateness: List[float] = []
+        self.peak_in_flight = 0
+
+    def guild(self, guild_id: int) -> FakeGuild:
+        guild = self.guilds.get(guild_id)
+        if guild is None:
+            guild = self.guilds[guild_id] = FakeGuild(guild_id, bot_user_id=self.bot_id)
+        return guild
+
+    def member(self, guild: FakeGuild, member_id: int, bot: bool = False) -> FakeMember:
+        return guild.get_member(member_id) or guild.add_member(member_id, bot=bot)
+
+    def actor(self, guild: FakeGuild, actor_id: int) -> FakeMember:
+        actor = self.member(guild, actor_id)
+        if self.role not in actor.roles:
+            actor.roles.append(self.role)
+        return actor
+
+    def state(self, guild: FakeGuild, channel_id: Optional[int], flags: int) -> FakeVoiceState:
+        channel = None
+        if channel_id is not None:
+            channel = guild.get_channel(channel_id) or guild.add_channel(channel_id)
+        return FakeVoiceState(channel, **unpack_flags(flags))
+
+    def _unmuted(self, guild_id: int, member_id: int) -> None:
+        import metrics
+        self.unmutes_fired += 1
+        metrics.pending_unmutes.finish((guild_id, member_id))
+
+    def _setup(self) -> None:
+        from unmute_scheduler import unmute_scheduler
+        from voice_supervisor import voice_connections
+
+        for guild_id, channel_id in self.header.get("voice", {}).items():
+            guild = self.guild(int(guild_id))
+            channel = guild.get_channel(channel_id) or guild.add_channel(channel_id)
+            voice_connections[guild.id] = guild.connect_voice(channel)
+        for rec in self.records:
+            if rec["k"] == "l" and rec.get("s") == "rest" and rec.get("u") is not None:
+                self._rest_actors[(rec["g"], rec["m"])].append(rec["u"])
+        unmute_scheduler.start(self._unmuted)
+
+    async def _apply(self, rec: dict) -> None:
+        import events
+        from voice_supervisor import voice_connections
+
+        kind = rec["k"]
+        guild = self.guild(rec["g"])
+        if kind == "v":
+            member = self.member(guild, rec["m"], bot=bool(rec.get("b")))
+            before = self.state(guild, rec["c"][0], rec["f"][0])
+            after = self.state(guild, rec["c"][1], rec["f"][1])
+            member.voice = after if after.channel is not None else None
+            if member.id == self.bot_id:
+                # Keep the fake voice client where the real one ended up
+                if after.channel is None:
+                    voice_connections.pop(guild.id, None)
+                elif guild.voice_client is None or guild.id not in voice_connections:
+                    voice_connections[guild.id] = guild.connect_voice(after.channel)
+                else:
+                    guild.voice_client.channel = after.channel
+            elif after.mute and not before.mute:
+                rest = self._rest_actors.get((guild.id, member.id))
+                if rest:
+                    guild.add_audit_entry(member, self.actor(guild, rest.popleft()))
+            await events.on_voice_state_update(member, before, after)
+        elif kind == "a":
+            target = self.member(guild, rec["m"])
+            entry = FakeAuditLogEntry(guild, target, self.actor(guild, rec["u"]), datetime.now(timezone.utc))
+            await events.on_audit_log_entry_create(entry)
+
+    async def run(self) -> dict:
+        import events
+        from event_router import voice_router
+        from unmute_scheduler import unmute_scheduler
+
+        self._setup()
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        for rec in self.records:
+            if rec["k"] == "l":
+                continue
+            due = start + (rec["t"] / self.speed if self.speed > 0 else 0.0)
+            delay = due - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self.lateness.append(max(0.0, loop.time() - due))
+            await self._apply(rec)
+            self.peak_in_flight = max(self.peak_in_flight, voice_router.in_flight())
+        dispatched = loop.time() - start
+        await voice_router.drain()
+        handled = loop.time() - start
+        # Let unmutes scheduled near the end fire so mute -> unmute covers every mute
+        settle_until = loop.time() + events.UNMUTE_DELAY + 1
+        while len(unmute_scheduler) and loop.time() < settle_until:
+            await asyncio.sleep(0.1)
+        return self.report(dispatched, handled, len(unmute_scheduler))
+
+    def report(self, dispatched: float, handled: float, pending_unmutes: int) -> dict:
+        import metrics
+
+        replayed = len(self.lateness)
+        ordered = sorted(self.lateness) or [0.0]
+        trace_seconds = self.records[-1]["t"] if self.records else 0.0
+        recorded = defaultdict(int)
+        for rec in self.records:
+            if rec["k"] == "l":
+                recorded[rec["s"]] += 1
+        return {
+            "speed": self.speed,
+            "events": replayed,
+            "trace_seconds": trace_seconds,
+            "dispatch_seconds": dispatched,
+            "handled_seconds": handled,
+            "events_per_sec": replayed / handled if handled else 0.0,
+            "lateness_ms": {
+                "p50": ordered[len(ordered) // 2] * 1000,
+                "p99": ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1000,
+                "max": ordered[-1] * 1000,
+                "mean": statistics.fmean(ordered) * 1000,
+            },
+            "peak_handlers_in_flight": self.peak_in_flight,
+            "unmutes_fired": self.unmutes_fired,
+            "unmutes_pending": pending_unmutes,
+            "recorded_lookups": dict(recorded),
+            "metrics": metrics.describe(),
+        }
+
+
+def print_report(report: dict) -> None:
+    late = report["lateness_ms"]
+    print(f"Replayed {report['events']} events ({report['trace_seconds']:.1f}s of trace) at {report['speed']}x")
+    print(f"  dispatched in {report['dispatch_seconds']:.2f}s, all handlers done in {report['handled_seconds']:.2f}s "
+          f"({report['events_per_sec']:.0f} events/s)")
+    print(f"  dispatch lateness: p50 {late['p50']:.1f} ms | p99 {late['p99']:.1f} ms | max {late['max']:.1f} ms")
+    print(f"  peak handler tasks in flight: {report['peak_handlers_in_flight']}")
+    print(f"  unmutes fired: {report['unmutes_fired']} | still pending: {report['unmutes_pending']}")
+    if report["recorded_lookups"]:
+        print(f"  recorded mute-actor lookups: {report['recorded_lookups']}")
+    for line in report["metrics"]:
+        print(f"  {line}")
+
+
+def synthesize(path: Path, members: int, mutes: int, seconds: float, guild_id: int = 1, seed: int = 0) -> int:
+    """Write a synthetic raid trace: a wave of joins with mass mutes mixed in.
+
+    Mutes are by one moderator; 80% of their audit entries arrive over the
+    gateway 0.2-1.5 s later, the rest are only found over REST. Members
+    stay muted until the bot's unmute fires. Returns the number of records.
+    """
+    rng = random.Random(seed)
+    bot_id, mod_id, channel_id, first = 10, 11, 100, 1000
+    records = []
+    for i in range(members):
+        t = rng.uniform(0, seconds)
+        records.append({"t": t, "k": "v", "g": guild_id, "m": first + i, "c": [None, channel_id], "f": [0, 0]})
+    for i in rng.sample(range(members), min(mutes, members)):
+        joined = next(r["t"] for r in records if r["m"] == first + i and r["k"] == "v")
+        t = rng.uniform(joined, seconds + 1)
+        records.append({"t": t, "k": "v", "g": guild_id, "m": first + i, "c": [channel_id, channel_id], "f": [0, 1]})
+        if rng.random() < 0.8:
+            records.append({"t": t + rng.uniform(0.2, 1.5), "k": "a", "g": guild_id, "m": first + i, "u": mod_id})
+        else:
+            records.append({"t": t + 0.5, "k": "l", "g": guild_id, "m": first + i, "u": mod_id, "s": "rest"})
+    records.sort(key=lambda r: r["t"])
+    header = {"k": "h", "v": TRACE_VERSION, "bot": bot_id, "wall": time.time(), "voice": {str(guild_id): channel_id}}
+    with path.open("w", encoding="utf8") as f:
+        for record in [header] + records:
+            if "t" in record:
+                record["t"] = round(record["t"], 4)
+            f.write(json.dumps(record, separators=(",", ":")) + "\n")
+    return len(records)
+
+
+def sweep(trace: str, speeds: List[float]) -> int:
+    """Replay once per speed in a fresh process and tabulate the results."""
+    print(f"{'speed':>7} {'events/s':>10} {'late p50':>10} {'late p99':>10} {'late max':>10} {'in flight':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for speed in speeds:
+            out = Path(tmp) / f"{speed}.json"
+            result = subprocess.run(
+                [sys.executable, __file__, trace, "--speed", str(speed), "--json", str(out), "--quiet"]
+            )
+            if result.returncode != 0:
+                print(f"{speed:>6}x replay failed (exit {result.returncode})")
+                return result.returncode
+            r = json.loads(out.read_text(encoding="utf8"))
+            late = r["lateness_ms"]
+            print(f"{speed:>6}x {r['events_per_sec']:>10.0f} {late['p50']:>8.1f}ms {late['p99']:>8.1f}ms "
+                  f"{late['max']:>8.1f}ms {r['peak_handlers_in_flight']:>10}")
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("trace", nargs="?", help="trace file written by !trace / VOICE_TRACE_PATH")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed multiplier (0 = no pacing)")
+    parser.add_argument("--sweep", help="comma-separated speeds, each replayed in its own process")
+    parser.add_argument("--json", help="write the report to this file")
+    parser.add_argument("--quiet", action="store_true", help="don't print the report")
+    parser.add_argument("-v", "--verbose", action="store_true", help="keep the bot's INFO logging")
+    synth = parser.add_argument_group("synthetic traces")
+    synth.add_argument("--synth", metavar="OUT", help="write a synthetic raid trace instead of replaying")
+    synth.add_argument("--members", type=int, default=500)
+    synth.add_argument("--mutes", type=int, default=200)
+    synth.add_argument("--seconds", type=float, default=60.0)
+    args = parser.parse_args()
+
+    if args.synth:
+        count = synthesize(Path(args.synth), args.members, args.mutes, args.seconds)
+        print(f"Wrote {count} records to {args.synth}")
+        return 0
+    if not args.trace:
+        parser.error("a trace file is required")
+    if args.sweep:
+        return sweep(args.trace, [float(s) for s in args.sweep.split(",")])
+
+    if not args.verbose:
+        for subsystem in log.LOG_SUBSYSTEMS:
+            log.set_level(subsystem, "WARNING")
+    header, records = read_trace(Path(args.trace))
+    report = asyncio.run(TraceReplayer(header, records, args.speed).run())
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2), encoding="utf8")
+    if not args.quiet:
+        print_report(report)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+"""Run the bot as several processes, each owning a contiguous range of shards.
+
+Usage: SHARD_COUNT=8 SHARD_PROCESSES=2 python shard_launcher.py
+
+Every child gets SHARD_IDS, SHARD_PROCESS_INDEX and SHARD_PROCESSES in its
+environment; set SHARD_IPC_PORT (and ideally SHARD_IPC_TOKEN) so `!shards`
+can aggregate status across processes. Children that exit are restarted
+after a short delay; Ctrl+C stops all of them.
+"""
+import os
+import signal
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+from config import SHARD_COUNT, SHARD_PROCESSES
+
+BOT_PATH = Path(__file__).resolve().parent / "bot.py"
+RESTART_DELAY = 5.0
+
+
+def shard_ranges(shard_count: int, processes: int) -> List[List[int]]:
+    """Split shards 0..shard_count-1 into `processes` contiguous, near-equal ranges."""
+    processes = max(1, min(processes, shard_count))
+    base, extra = divmod(shard_count, processes)
+    ranges, start = [], 0
+    for i in range(processes):
+        size = base + (1 if i < extra else 0)
+        ranges.append(list(range(start, start + size)))
+        start += size
+    return ranges
+
+
+def _spawn(index: int, shard_ids: List[int], processes: int) -> subprocess.Popen:
+    env = dict(os.environ)
+    env.update({
+        "SHARD_IDS": f"{shard_ids[0]}-{shard_ids[-1]}",
+        "SHARD_PROCESS_INDEX": str(index),
+        "SHARD_PROCESSES": str(processes),
+    })
+    print(f"[SHARD] Starting process {index} for shards {env['SHARD_IDS']}")
+    return subprocess.Popen([sys.executable, str(BOT_PATH)], env=env)
+
+
+def main():
+    if not SHARD_COUNT.isdigit():
+        raise RuntimeError("shard_launcher.py needs a numeric SHARD_COUNT so shards can be split across processes")
+    ranges = shard_ranges(int(SHARD_COUNT), SHARD_PROCESSES)
+    children: Dict[int, subprocess.Popen] = {
+        i: _spawn(i, ids, len(ranges)) for i, ids in enumerate(ranges)
+    }
+
+    stopping = False
+
+    def _stop(*_):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGINT, _stop)
+    signal.signal(signal.SIGTERM, _stop)
+
+    while not stopping:
+        time.sleep(1)
+        for i, proc in list(children.items()):
+            code = proc.poll()
+            if code is not None and not stopping:
+                print(f"[SHARD] Process {i} exited with code {code}; restarting in {RESTART_DELAY}s")
+                time.sleep(RESTART_DELAY)
+                children[i] = _spawn(i, ranges[i], len(ranges))
+
+    print("[SHARD] Stopping shard processes...")
+    for proc in children.values():
+        if proc.poll() is None:
+            proc.terminate()
+    for proc in children.values():
+        try:
+            proc.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+import asyncio
+import json
+import math
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+import discord
+from discord.ext import commands
+
+from config import (
+    SHARD_COUNT, SHARD_IDS, SHARD_IPC_PORT, SHARD_IPC_TOKEN,
+    SHARD_PROCESS_INDEX, SHARD_PROCESSES,
+)
+from log import task_log
+
+
+def parse_shard_ids(spec: str) -> Optional[List[int]]:
+    """Parse "0-3,6" into [0, 1, 2, 3, 6]. Empty spec means all shards (None)."""
+    spec = spec.strip()
+    if not spec:
+        return None
+    ids = []
+    for part in spec.split(","):
+        part = part.strip()
+        if "-" in part:
+            lo, hi = part.split("-", 1)
+            ids.extend(range(int(lo), int(hi) + 1))
+        elif part:
+            ids.append(int(part))
+    return sorted(set(ids))
+
+
+def shard_for_guild(guild_id: int, shard_count: int) -> int:
+    """Discord's shard routing formula."""
+    return (guild_id >> 22) % max(shard_count, 1)
+
+
+def create_bot(intents: discord.Intents, **options) -> commands.Bot:
+    """Plain Bot by default, AutoShardedBot when SHARD_COUNT is set.
+
+    `options` (cache settings from cache_profile) go to the constructor as-is.
+    """
+    if not SHARD_COUNT:
+        return commands.Bot(command_prefix="!", intents=intents, **options)
+
+    shard_count = None if SHARD_COUNT == "auto" else int(SHARD_COUNT)
+    shard_ids = parse_shard_ids(SHARD_IDS)
+    if shard_ids is not None and shard_count is None:
+        raise RuntimeError("SHARD_IDS requires an explicit SHARD_COUNT")
+    task_log.info("AutoShardedBot: shard_count=%s, shard_ids=%s", shard_count or "auto", shard_ids or "all")
+    return commands.AutoShardedBot(
+        command_prefix="!", intents=intents, shard_count=shard_count, shard_ids=shard_ids, **options
+    )
+
+
+def local_status(bot: commands.Bot) -> dict:
+    """Per-shard view of this process's guild state."""
+    # Imported lazily: these modules import config/voice state, not the other way round
+    from events import molda_rejoin_targets
+    from voice_commands import voice_connections
+    from unmute_scheduler import unmute_scheduler
+
+    shard_count = bot.shard_count or 1
+    shards: Dict[int, dict] = defaultdict(
+        lambda: {"guilds": 0, "voice_connections": 0, "molda_targets": 0}
+    )
+    for guild in bot.guilds:
+        shards[guild.shard_id]["guilds"] += 1
+    for guild_id, vc in voice_connections.items():
+        if vc is not None and vc.is_connected():
+            shards[shard_for_guild(guild_id, shard_count)]["voice_connections"] += 1
+    for guild_id in molda_rejoin_targets:
+        shards[shard_for_guild(guild_id, shard_count)]["molda_targets"] += 1
+
+    # AutoShardedBot reports one heartbeat latency per shard; plain Bot has a single one
+    latencies = bot.latencies if isinstance(bot, commands.AutoShardedBot) else [(0, bot.latency)]
+    for shard_id, latency in latencies:
+        shards[shard_id]["latency_ms"] = round(latency * 1000, 1) if math.isfinite(latency) else None
+
+    return {
+        "process": SHARD_PROCESS_INDEX,
+        "shard_count": shard_count,
+        "pending_unmutes": len(unmute_scheduler),
+        "shards": {str(k): v for k, v in sorted(shards.items())},
+    }
+
+
+class ShardIPCServer:
+    """Tiny JSON-lines server on localhost answering admin queries from peer processes."""
+
+    def __init__(self, bot: commands.Bot, port: int):
+        self.bot = bot
+        self.port = port
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self) -> None:
+        if self._server is not None:
+            return
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", self.port)
+        task_log.info("Shard IPC listening on 127.0.0.1:%s", self.port)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            line = await asyncio.wait_for(reader.readline(), timeout=5)
+            request = json.loads(line or b"{}")
+            if SHARD_IPC_TOKEN and request.get("token") != SHARD_IPC_TOKEN:
+                response = {"error": "unauthorized"}
+            elif request.get("op") == "status":
+                response = local_status(self.bot)
+            else:
+                response = {"error": f"unknown op {request.get('op')!r}"}
+        except Exception as e:
+            response = {"error": f"{type(e).__name__}: {e}"}
+        try:
+            writer.write(json.dumps(response).encode() + b"\n")
+            await writer.drain()
+        finally:
+            writer.close()
+
+
+async def query_peer(port: int, op: str = "status", timeout: float = 3.0) -> dict:
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection("127.0.0.1", port), timeout)
+        try:
+            writer.write(json.dumps({"op": op, "token": SHARD_IPC_TOKEN}).encode() + b"\n")
+            await writer.drain()
+            line = await asyncio.wait_for(reader.readline(), timeout)
+        finally:
+            writer.close()
+        return json.loads(line)
+    except (OSError, asyncio.TimeoutError, ValueError) as e:
+        return {"error": f"{type(e).__name__}: {e}"}
+
+
+async def cluster_status(bot: commands.Bot) -> List[dict]:
+    """Status of this process plus every peer reachable over IPC."""
+    results = [local_status(bot)]
+    if SHARD_IPC_PORT and SHARD_PROCESSES > 1:
+        peers = [i for i in range(SHARD_PROCESSES) if i != SHARD_PROCESS_INDEX]
+        replies = await asyncio.gather(*(query_peer(SHARD_IPC_PORT + i) for i in peers))
+        for i, reply in zip(peers, replies):
+            reply.setdefault("process", i)
+            results.append(reply)
+    return sorted(results, key=lambda r: r.get("process", 0))
+
+
+_ipc_server: Optional[ShardIPCServer] = None
+
+
+async def start_ipc(bot: commands.Bot) -> None:
+    """Start this process's IPC server if SHARD_IPC_PORT is configured (idempotent)."""
+    global _ipc_server
+    if not SHARD_IPC_PORT:
+        return
+    if _ipc_server is None:
+        _ipc_server = ShardIPCServer(bot, SHARD_IPC_PORT + SHARD_PROCESS_INDEX)
+    try:
+        await _ipc_server.start()
+    except OSError as e:
+        task_log.error("Failed to start shard IPC server: %s", e)
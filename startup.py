@@ -0,0 +1,126 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from discord.ext import commands
+
+import events
+from audio_encoder import encode_all_mp3s
+from audio_prep import audio_prep_lock
+from audio_source import preload_packets
+from decoder_pool import decoder_pool
+from loop_monitor import loop_monitor
+from greeting_store import greeting_store
+from greetings import greeting_registry
+from ffmpeg_helper import get_ffmpeg_info, resolve_ffmpeg
+from probe_index import refresh_index
+from sharding import start_ipc
+import metrics
+from config import METRICS_PORT, SHARD_PROCESS_INDEX, SHARD_PROCESSES, VOICE_TRACE_PATH
+from voice_trace import trace_recorder
+from log import task_log
+
+# Reference point for "how long until the bot was usable"
+PROCESS_START = time.perf_counter()
+
+
+class StartupOrchestrator:
+    """Connect to voice first, prepare audio in the background.
+
+    `on_ready` can fire more than once (gateway resumes/reconnects); voice
+    connect is re-checked each time but audio preparation only ever runs once.
+    Until it finishes, playback simply uses whatever is ready: cached Opus
+    packets, existing .opus files, or the original MP3s through ffmpeg.
+    """
+
+    def __init__(self):
+        # phase name -> seconds
+        self.timings: Dict[str, float] = {}
+        self.ready_count = 0
+        self._audio_task: Optional[asyncio.Task] = None
+
+    @asynccontextmanager
+    async def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = time.perf_counter() - start
+            task_log.info("Startup phase %s: %.2fs", name, self.timings[name])
+
+    @property
+    def audio_ready(self) -> bool:
+        return self._audio_task is not None and self._audio_task.done()
+
+    async def on_ready(self, bot: commands.Bot) -> None:
+        self.ready_count += 1
+        first = self.ready_count == 1
+        # Watch for blocking calls from here on (idempotent)
+        loop_monitor.start()
+        if first:
+            self.timings["process_to_ready"] = time.perf_counter() - PROCESS_START
+            # Stored per-guild greeting assignments, before joins can trigger greetings
+            async with self.phase("greeting_store"):
+                await asyncio.to_thread(greeting_store.load)
+        else:
+            task_log.info("on_ready #%d (gateway reconnect); skipping completed work", self.ready_count)
+
+        async with self.phase("voice_connect" if first else "voice_recheck"):
+            await events.on_ready(bot)
+
+        # Pick up greeting files added/removed while running
+        greeting_registry.start_watching()
+        # Answer `!shards` queries from sibling shard processes
+        await start_ipc(bot)
+        if METRICS_PORT:
+            await metrics.start_http_server(METRICS_PORT + SHARD_PROCESS_INDEX)
+        # Record voice events from startup; the header captures the channels joined above
+        if VOICE_TRACE_PATH and first:
+            path = Path(VOICE_TRACE_PATH)
+            if SHARD_PROCESSES > 1:
+                # One file per shard process rather than all truncating the same one
+                path = path.with_name(f"{path.stem}.p{SHARD_PROCESS_INDEX}{path.suffix}")
+            trace_recorder.start(path, bot.user.id)
+
+        if self._audio_task is None:
+            self._audio_task = asyncio.create_task(self._prepare_audio())
+
+    async def _prepare_audio(self) -> None:
+        try:
+            async with self.phase("ffmpeg_resolve"):
+                ffmpeg_exec = await resolve_ffmpeg()
+                info = await get_ffmpeg_info()
+            # Keep ffmpeg workers waiting so MP3 playback skips process start-up
+            if ffmpeg_exec is not None and (info is None or info.has_libopus):
+                async with self.phase("decoder_pool"):
+                    await decoder_pool.start(ffmpeg_exec)
+            # Shard processes share the output files: the first one to get the
+            # lock encodes and probes, the others find everything up to date
+            async with audio_prep_lock():
+                # Pre-encode MP3s to Opus for lower memory usage
+                async with self.phase("encode"):
+                    if info is not None and not info.has_libopus:
+                        task_log.warning("ffmpeg has no libopus encoder; skipping pre-encoding")
+                    else:
+                        await encode_all_mp3s(ffmpeg_exec=ffmpeg_exec)
+                # Load/refresh codec metadata so playback can skip ffprobe
+                async with self.phase("probe_index"):
+                    await refresh_index(ffmpeg_exec)
+            # Demux greetings into RAM so joins don't spawn ffmpeg
+            async with self.phase("packet_preload"):
+                await asyncio.to_thread(preload_packets)
+        except Exception as e:
+            task_log.error("Audio preparation failed: %s: %s", type(e).__name__, e)
+        finally:
+            self.timings["process_to_audio_ready"] = time.perf_counter() - PROCESS_START
+            task_log.info("Audio ready %.2fs after start", self.timings["process_to_audio_ready"])
+
+    def describe(self) -> List[str]:
+        lines = [f"on_ready calls: {self.ready_count}", f"audio ready: {self.audio_ready}"]
+        lines += [f"{name}: {seconds:.2f}s" for name, seconds in self.timings.items()]
+        return lines
+
+
+startup = StartupOrchestrator()
@@ -0,0 +1,148 @@
+import asyncio
+from collections import deque
+from typing import Deque, Dict, Optional, Set, Tuple
+
+import discord
+
+import metrics
+from log import task_log
+
+# discord.py rate-limit bucket route for Member.edit
+MEMBER_EDIT_ROUTE = "PATCH /guilds/{guild_id}/members/{user_id}"
+
+UNMUTE_REASON = "Auto-unmute after 60s (monitored role action)"
+
+
+def member_edit_budget(http, guild_id: int) -> Tuple[int, float]:
+    """Return (edits we may send right now, seconds until the bucket resets).
+
+    Reads the bucket discord.py keeps from the X-RateLimit-* headers of the
+    last member edit in this guild. Before the first response the limit is
+    unknown, so only one request is allowed out to learn it.
+    """
+    hashes = getattr(http, "_bucket_hashes", None)
+    buckets = getattr(http, "_buckets", None)
+    if hashes is None or buckets is None:
+        return 1, 0.0
+
+    bucket_hash = hashes.get(MEMBER_EDIT_ROUTE)
+    ratelimit = buckets.get(f"{bucket_hash or MEMBER_EDIT_ROUTE}:{guild_id}")
+    if ratelimit is None or ratelimit.expires is None:
+        return 1, 0.0
+
+    now = asyncio.get_running_loop().time()
+    if now > ratelimit.expires:
+        # Window rolled over: discord.py resets the bucket on the next acquire
+        return max(1, ratelimit.limit - ratelimit.outgoing), 0.0
+    return ratelimit.remaining, ratelimit.expires - now
+
+
+class UnmuteDispatcher:
+    """Per-guild queues that send due unmutes as fast as the edit bucket allows.
+
+    Each guild gets one drain task that sends as many edits concurrently as
+    the bucket has remaining, then sleeps until it resets, instead of firing
+    everything at once and stalling on 429 backoff. `voice.mute` is
+    re-checked right before each edit so stale jobs are dropped for free.
+    """
+
+    def __init__(self):
+        self._client: Optional[discord.Client] = None
+        self._queues: Dict[int, Deque[int]] = {}
+        self._queued: Dict[int, Set[int]] = {}
+        self._workers: Dict[int, asyncio.Task] = {}
+        self.sent = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def attach(self, client: discord.Client) -> None:
+        self._client = client
+
+    def depth(self) -> int:
+        return sum(len(q) for q in self._queues.values())
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "queued": self.depth(),
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "failed": self.failed,
+        }
+
+    def submit(self, guild_id: int, member_id: int) -> None:
+        """Queue an unmute for `member_id` and make sure the guild's drain task runs."""
+        queued = self._queued.setdefault(guild_id, set())
+        if member_id in queued:
+            return
+        queued.add(member_id)
+        self._queues.setdefault(guild_id, deque()).append(member_id)
+
+        worker = self._workers.get(guild_id)
+        if worker is None or worker.done():
+            self._workers[guild_id] = asyncio.create_task(self._drain(guild_id))
+
+    async def _drain(self, guild_id: int) -> None:
+        queue = self._queues[guild_id]
+        queued = self._queued[guild_id]
+        try:
+            while queue:
+                guild = self._client.get_guild(guild_id) if self._client else None
+                if guild is None:
+                    task_log.warning("Guild %s unavailable; dropping %d unmute(s)", guild_id, len(queue))
+                    self.dropped += len(queue)
+                    metrics.unmutes.inc(len(queue), result="dropped")
+                    for member_id in queue:
+                        metrics.pending_unmutes.discard((guild_id, member_id))
+                    queue.clear()
+                    queued.clear()
+                    break
+
+                budget, reset_in = member_edit_budget(self._client.http, guild_id)
+                if budget <= 0:
+                    await asyncio.sleep(max(reset_in, 0.05))
+                    continue
+
+                batch = [queue.popleft() for _ in range(min(budget, len(queue)))]
+                for member_id in batch:
+                    queued.discard(member_id)
+                await asyncio.gather(*(self._unmute(guild, member_id) for member_id in batch))
+        finally:
+            if self._workers.get(guild_id) is asyncio.current_task():
+                del self._workers[guild_id]
+
+    async def _unmute(self, guild: discord.Guild, member_id: int) -> None:
+        key = (guild.id, member_id)
+        current = guild.get_member(member_id)
+        if current is None or current.voice is None:
+            task_log.debug("User not in voice anymore -> skip")
+            self.dropped += 1
+            metrics.unmutes.inc(result="dropped")
+            metrics.pending_unmutes.discard(key)
+            return
+
+        if current.voice.mute is False:
+            task_log.debug("Already unmuted -> skip")
+            self.dropped += 1
+            metrics.unmutes.inc(result="dropped")
+            metrics.pending_unmutes.discard(key)
+            return
+
+        try:
+            await current.edit(mute=False, reason=UNMUTE_REASON)
+            self.sent += 1
+            metrics.unmutes.inc(result="sent")
+            metrics.pending_unmutes.finish(key)
+            task_log.info("Unmuted OK: %s", current)
+        except discord.Forbidden:
+            self.failed += 1
+            metrics.unmutes.inc(result="failed")
+            metrics.pending_unmutes.discard(key)
+            task_log.error("Forbidden: bot lacks permission or role is too low.")
+        except discord.HTTPException as e:
+            self.failed += 1
+            metrics.unmutes.inc(result="failed")
+            metrics.pending_unmutes.discard(key)
+            task_log.error("HTTPException: %s", e)
+
+
+unmute_dispatcher = UnmuteDispatcher()
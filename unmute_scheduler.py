@@ -0,0 +1,113 @@
+import asyncio
+import heapq
+import itertools
+from typing import Callable, Dict, List, Optional, Tuple
+
+from log import task_log
+
+Key = Tuple[int, int]  # (guild_id, member_id)
+# Called from the drain loop for each due entry; must not block
+UnmuteHandler = Callable[[int, int], None]
+
+
+class UnmuteScheduler:
+    """One min-heap of pending auto-unmutes, drained by a single loop task.
+
+    Entries are compact `(due, seq, guild_id, member_id)` tuples rather than
+    one sleeping Task per member. Cancel and reschedule are O(1): the live
+    entry for a key is tracked in `_live` and superseded heap items are
+    skipped lazily when they reach the top.
+    """
+
+    def __init__(self):
+        self._heap: List[Tuple[float, int, int, int]] = []
+        # key -> seq of the live heap entry
+        self._live: Dict[Key, int] = {}
+        self._seq = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._handler: Optional[UnmuteHandler] = None
+        # lateness = how long after its due time an entry actually fired
+        self.fired = 0
+        self.total_lateness = 0.0
+        self.max_lateness = 0.0
+
+    def __len__(self) -> int:
+        return len(self._live)
+
+    def start(self, handler: UnmuteHandler) -> None:
+        """Start the drain loop (no-op if already running)."""
+        self._handler = handler
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self) -> None:
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+        self._task = None
+
+    def is_scheduled(self, guild_id: int, member_id: int) -> bool:
+        return (guild_id, member_id) in self._live
+
+    def schedule(self, guild_id: int, member_id: int, delay: float) -> None:
+        """Schedule (or reschedule) an unmute `delay` seconds from now."""
+        due = asyncio.get_running_loop().time() + delay
+        seq = next(self._seq)
+        self._live[(guild_id, member_id)] = seq
+        heapq.heappush(self._heap, (due, seq, guild_id, member_id))
+        # Only wake the loop if this entry became the new head
+        if self._wakeup is not None and self._heap[0][1] == seq:
+            self._wakeup.set()
+
+    def cancel(self, guild_id: int, member_id: int) -> bool:
+        """Cancel a pending unmute. Returns True if one was pending."""
+        return self._live.pop((guild_id, member_id), None) is not None
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "depth": len(self._live),
+            "heap_size": len(self._heap),
+            "fired": self.fired,
+            "avg_lateness_ms": (self.total_lateness / self.fired * 1000) if self.fired else 0.0,
+            "max_lateness_ms": self.max_lateness * 1000,
+        }
+
+    def _pop_stale(self) -> None:
+        heap = self._heap
+        while heap and self._live.get((heap[0][2], heap[0][3])) != heap[0][1]:
+            heapq.heappop(heap)
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            self._pop_stale()
+            if not self._heap:
+                timeout = None
+            else:
+                timeout = self._heap[0][0] - loop.time()
+
+            if timeout is None or timeout > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            due, _, guild_id, member_id = heapq.heappop(self._heap)
+            del self._live[(guild_id, member_id)]
+
+            lateness = loop.time() - due
+            self.fired += 1
+            self.total_lateness += lateness
+            self.max_lateness = max(self.max_lateness, lateness)
+
+            # The handler only enqueues; the network I/O is paced elsewhere
+            try:
+                self._handler(guild_id, member_id)
+            except Exception as e:
+                task_log.error("Unmute handler failed for %s: %s: %s", member_id, type(e).__name__, e)
+
+
+unmute_scheduler = UnmuteScheduler()
@@ -1,39 +1,99 @@
+import asyncio
 import time
+from typing import Dict, Optional, Tuple
+
 import discord
 
+import metrics
+from audit_index import MUTE_WINDOW_SEC, audit_log_coalescer, is_server_mute_entry, mute_audit_index
+from config import AUDIT_EVENT_WAIT
+from log import audit_log
+from voice_trace import trace_recorder
+
+# Seconds a member fetched over REST is reused (roles rarely change mid-raid)
+MEMBER_FETCH_TTL = 60.0
+
+# (guild_id, member_id) -> (fetched at, fetch task); concurrent lookups share one request
+_member_fetches: Dict[Tuple[int, int], Tuple[float, asyncio.Task]] = {}
+
 
 def has_role(member: discord.Member, role_id: int) -> bool:
     return any(r.id == role_id for r in member.roles)
 
 
+async def get_or_fetch_member(guild: discord.Guild, member_id: int) -> Optional[discord.Member]:
+    """Cached member, else fetched over REST (None if they aren't in the guild).
+
+    With LEAN_CACHE only members in voice are cached, so e.g. a moderator
+    muting from outside voice is fetched here. A mass mute by one moderator
+    shares a single request, and the result is reused for MEMBER_FETCH_TTL.
+    """
+    member = guild.get_member(member_id)
+    if member is not None:
+        return member
+
+    key = (guild.id, member_id)
+    now = time.monotonic()
+    hit = _member_fetches.get(key)
+    if hit is None or now - hit[0] > MEMBER_FETCH_TTL:
+        if len(_member_fetches) > 256:
+            for stale in [k for k, (at, _) in _member_fetches.items() if now - at > MEMBER_FETCH_TTL]:
+                del _member_fetches[stale]
+        task = asyncio.create_task(_fetch_member(guild, member_id))
+        _member_fetches[key] = (now, task)
+    else:
+        task = hit[1]
+    # shield: one caller being cancelled must not cancel the shared request
+    return await asyncio.shield(task)
+
+
+async def _fetch_member(guild: discord.Guild, member_id: int) -> Optional[discord.Member]:
+    try:
+        return await guild.fetch_member(member_id)
+    except discord.NotFound:
+        return None
+    except discord.HTTPException as e:
+        # Don't keep a transient failure for the whole TTL
+        _member_fetches.pop((guild.id, member_id), None)
+        audit_log.warning("Could not fetch member %s in guild %s: %s", member_id, guild.id, e)
+        return None
+
+
 async def find_recent_mute_actor(
     guild: discord.Guild,
     target: discord.Member,
-    window_sec: int = 30
+    window_sec: int = MUTE_WINDOW_SEC
 ):
     """
     Повертає user, який замутив target (server mute), якщо знайде в audit log.
+
+    Спочатку дивиться в індекс, який наповнює gateway-подія
+    `on_audit_log_entry_create` (чекає до AUDIT_EVENT_WAIT с), і лише потім
+    сканує audit log через REST.
     """
+    start = time.perf_counter()
+    actor = await mute_audit_index.wait_for(guild.id, target.id, AUDIT_EVENT_WAIT)
+    if actor is not None:
+        return _lookup_done(guild, target, start, actor, "index")
+
     now = time.time()
 
-    async for entry in guild.audit_logs(
-        limit=50,
-        action=discord.AuditLogAction.member_update
-    ):
+    # Під час масового муту всі пошуки в гільдії ділять один REST-запит
+    for entry in await audit_log_coalescer.fetch(guild):
         if not entry.target or entry.target.id != target.id:
             continue
 
         if now - entry.created_at.timestamp() > window_sec:
             continue
 
-        before = entry.changes.before
-        after = entry.changes.after
+        if is_server_mute_entry(entry):
+            return _lookup_done(guild, target, start, entry.user, "rest")
 
-        before_mute = getattr(before, "mute", None)
-        after_mute = getattr(after, "mute", None)
+    return _lookup_done(guild, target, start, None, "miss")
 
-        # Дозволяємо (False або None) -> True
-        if after_mute is True and (before_mute is False or before_mute is None):
-            return entry.user
 
-    return None
+def _lookup_done(guild, target, start: float, actor, result: str):
+    metrics.mute_actor_lookup.observe(time.perf_counter() - start, result=result)
+    if trace_recorder.active:
+        trace_recorder.lookup(guild.id, target.id, actor, result)
+    return actor
@@ -1,21 +1,10 @@
 import discord
 from discord.ext import commands
-from pathlib import Path
-import asyncio
 
-from ffmpeg_helper import get_ffmpeg_exec
-
-
-voice_connections: dict[int, discord.VoiceClient] = {}
-
-# Default audio directory and file
-BASE_DIR = Path(__file__).resolve().parent
-DEFAULT_JOIN_AUDIO = BASE_DIR / "Molda Voice" / "greetings" / "New_comers_molda.mp3"
-
-# Resolve ffmpeg executable once at import
-FFMPEG_EXEC = get_ffmpeg_exec()
-if not FFMPEG_EXEC:
-    print("[FFMPEG] ffmpeg executable not found. Set FFMPEG_PATH env var or ensure ffmpeg is available.")
+from greetings import greeting_registry
+from playback_queue import playback_scheduler
+# voice_connections lives with its only writer; re-exported for existing imports
+from voice_supervisor import voice_connections, voice_supervisor
 
 
 async def join_voice(ctx: commands.Context, bot: commands.Bot, channel_id: int):
@@ -30,48 +19,26 @@ async def join_voice(ctx: commands.Context, bot: commands.Bot, channel_id: int):
         await ctx.send(f"Channel {channel_id} is not a voice channel!")
         return
     
-    guild_id = ctx.guild.id
-    
-    # Disconnect from existing connection if any
-    if guild_id in voice_connections:
-        try:
-            await voice_connections[guild_id].disconnect(force=True)
-        except Exception as e:
-            print(f"[VOICE] Error disconnecting: {e}")
-    
-    try:
-        # Try to connect with timeout and reconnect enabled
-        vc = await asyncio.wait_for(channel.connect(reconnect=True), timeout=10)
-        voice_connections[guild_id] = vc
+    # The supervisor moves an existing connection or connects with retries
+    vc = await voice_supervisor.connect(channel, source="join")
+    if vc is not None:
         await ctx.send(f"Joined {channel.name}!")
-    except asyncio.TimeoutError:
-        await ctx.send(f"Connection timeout. Check your network and try again.")
-    except discord.errors.ConnectionClosed as e:
-        await ctx.send(f"Connection closed with code {e.code}. Try again later.")
-    except Exception as e:
-        await ctx.send(f"Failed to join channel: {e}")
+    else:
+        await ctx.send(f"Failed to join {channel.name}: {voice_supervisor.guild(ctx.guild.id).last_error}")
 
 
 async def leave_voice(ctx: commands.Context):
     """Leave the current voice channel."""
-    guild_id = ctx.guild.id
-    
-    if guild_id not in voice_connections or voice_connections[guild_id] is None:
+    if not await voice_supervisor.disconnect(ctx.guild.id):
         await ctx.send("I'm not in a voice channel!")
         return
-    
-    try:
-        await voice_connections[guild_id].disconnect(force=True)
-    except Exception as e:
-        print(f"[VOICE] Error disconnecting: {e}")
-    finally:
-        voice_connections.pop(guild_id, None)
     await ctx.send("Left the voice channel!")
 
 
 async def play_join(ctx: commands.Context, filename: str | None = None):
     """Play a join audio file in the guild's connected voice channel.
-    `filename` is optional and should be the name of a file inside `Molda Voice`.
+    `filename` is optional and should be the name of a file in the greetings
+    directory; paths come pre-resolved (opus preferred) from the registry.
     """
     guild_id = ctx.guild.id
 
@@ -87,30 +54,18 @@ async def play_join(ctx: commands.Context, filename: str | None = None):
         voice_connections.pop(guild_id, None)
         return
 
-    if filename:
-        file_path = BASE_DIR / "Molda Voice" / "greetings" / filename
-        # For explicit filenames, don't convert - use as-is
-    else:
-        file_path = DEFAULT_JOIN_AUDIO
-
-    if not file_path.exists():
-        await ctx.send(f"Audio file not found: {file_path.name}")
+    file_path = greeting_registry.resolve_file(filename) if filename else greeting_registry.resolve_default()
+    if file_path is None:
+        await ctx.send(f"Audio file not found: {filename or 'default greeting'}")
         return
 
-    try:
-        if vc.is_playing():
-            vc.stop()
-        if FFMPEG_EXEC is None:
-            await ctx.send("ffmpeg not available on the server. Set FFMPEG_PATH or install ffmpeg.")
-            return
-        try:
-            source = await discord.FFmpegOpusAudio.from_probe(str(file_path), executable=FFMPEG_EXEC)
-            vc.play(source)
-            await ctx.send(f"Playing {file_path.name}")
-        except Exception as e:
-            await ctx.send(f"Failed to play audio: {e}")
-    except Exception as e:
-        await ctx.send(f"Failed to play audio: {e}")
+    request = playback_scheduler.enqueue_admin(vc, file_path, f"{file_path.name} (requested by {ctx.author})")
+    player = playback_scheduler.player(guild_id)
+    position = player.position(request)
+    if position <= 1 and (player.current is None or player.current.is_greeting):
+        await ctx.send(f"Playing {file_path.name}")
+    else:
+        await ctx.send(f"Queued {file_path.name} (position {position})")
 
 
 async def stop_audio(ctx: commands.Context):
@@ -129,8 +84,19 @@ async def stop_audio(ctx: commands.Context):
         voice_connections.pop(guild_id, None)
         return
 
+    # Drop anything queued behind the current item so stopping means silence
+    dropped = playback_scheduler.player(guild_id).clear()
     if vc.is_playing():
         vc.stop()
-        await ctx.send("⏹️ Audio stopped!")
+        await ctx.send("⏹️ Audio stopped!" + (f" (cleared {dropped} queued)" if dropped else ""))
     else:
         await ctx.send("❌ No audio currently playing")
+
+
+async def show_playback_queue(ctx: commands.Context):
+    """Show what is playing and queued in this guild."""
+    lines = playback_scheduler.describe(ctx.guild.id)
+    if not lines:
+        await ctx.send("Playback queue is empty")
+        return
+    await ctx.send("\n".join(lines))
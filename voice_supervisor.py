@@ -0,0 +1,359 @@
+import asyncio
+import random
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+import discord
+
+import metrics
+from config import (
+    VOICE_BACKOFF_BASE, VOICE_BACKOFF_MAX, VOICE_CIRCUIT_COOLDOWN, VOICE_CIRCUIT_THRESHOLD,
+    VOICE_CONNECT_RETRIES, VOICE_CONNECT_TIMEOUT, VOICE_RECONNECT_GRACE,
+)
+from log import voice_log
+
+# guild_id -> live voice client. Only the supervisor connects, moves or
+# disconnects; other modules read it (voice_commands re-exports it).
+voice_connections: Dict[int, discord.VoiceClient] = {}
+
+# Per-guild connection states
+IDLE = "idle"
+CONNECTING = "connecting"
+CONNECTED = "connected"
+BACKOFF = "backoff"
+DROPPED = "dropped"
+
+
+def backoff_delay(attempt: int) -> float:
+    """Jittered exponential backoff: half fixed, half random, capped at VOICE_BACKOFF_MAX."""
+    ceiling = min(VOICE_BACKOFF_MAX, VOICE_BACKOFF_BASE * (2 ** attempt))
+    return ceiling / 2 + random.uniform(0, ceiling / 2)
+
+
+@dataclass
+class CircuitBreaker:
+    """Stops connect attempts to a channel that keeps failing the voice handshake.
+
+    Opens after VOICE_CIRCUIT_THRESHOLD consecutive handshake failures (close
+    code 4006, or the IndexError discord.py raises when Discord offers no
+    encryption modes). While open, connects fail fast; after the cooldown one
+    trial attempt is let through (half-open) and its result closes or reopens it.
+    """
+
+    failures: int = 0
+    opened_at: Optional[float] = None
+    cooldown: float = VOICE_CIRCUIT_COOLDOWN
+
+    def allow(self) -> bool:
+        return self.opened_at is None or time.monotonic() - self.opened_at >= self.cooldown
+
+    def remaining(self) -> float:
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, self.cooldown - (time.monotonic() - self.opened_at))
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self) -> bool:
+        """Count a handshake failure. Returns True if this opened the breaker."""
+        self.failures += 1
+        if self.failures >= VOICE_CIRCUIT_THRESHOLD:
+            self.opened_at = time.monotonic()
+            return True
+        return False
+
+
+class GuildVoice:
+    """Connection state machine for one guild.
+
+    connect / move / disconnect are serialized by a lock, so a reconnect
+    after a drop, an admin command and a periodic health check can't race
+    each other on the same voice client.
+    """
+
+    def __init__(self, guild_id: int):
+        self.guild_id = guild_id
+        self.lock = asyncio.Lock()
+        self.state = IDLE
+        # Channel we intend to be in; None after an intentional disconnect
+        self.target_channel_id: Optional[int] = None
+        self.dropped_at: Optional[float] = None
+        # A drop reported while the lock was held; re-checked once it's released
+        self.drop_pending = False
+        self.last_error: Optional[str] = None
+        self.last_reconnect_seconds: Optional[float] = None
+
+    @property
+    def voice_client(self) -> Optional[discord.VoiceClient]:
+        return voice_connections.get(self.guild_id)
+
+
+class VoiceSupervisor:
+    """Single owner of every voice connection the bot makes."""
+
+    def __init__(self):
+        self._guilds: Dict[int, GuildVoice] = {}
+        self._breakers: Dict[int, CircuitBreaker] = {}
+        self._drop_listeners: List[Callable[[int], None]] = []
+
+    def guild(self, guild_id: int) -> GuildVoice:
+        gv = self._guilds.get(guild_id)
+        if gv is None:
+            gv = self._guilds[guild_id] = GuildVoice(guild_id)
+        return gv
+
+    def breaker(self, channel_id: int) -> CircuitBreaker:
+        br = self._breakers.get(channel_id)
+        if br is None:
+            br = self._breakers[channel_id] = CircuitBreaker()
+        return br
+
+    def add_drop_listener(self, listener: Callable[[int], None]) -> None:
+        """`listener(guild_id)` is called whenever a connection drops unexpectedly."""
+        if listener not in self._drop_listeners:
+            self._drop_listeners.append(listener)
+
+    def _mark_dropped(self, guild_id: int) -> None:
+        gv = self.guild(guild_id)
+        # Teardown after an intentional disconnect isn't a drop
+        if gv.target_channel_id is None:
+            return
+        if gv.lock.locked():
+            # A connect or move is running; its own stale-client cleanup looks
+            # just like a real drop, so decide once the lock is released
+            gv.drop_pending = True
+            return
+        vc = voice_connections.get(guild_id)
+        if vc is not None and vc.guild.voice_client is not vc:
+            # discord.py has let go of it, so it won't reconnect on its own.
+            # A client it still holds stays put: it may be mid-reconnect.
+            voice_connections.pop(guild_id, None)
+        self._note_drop(gv)
+        for listener in self._drop_listeners:
+            listener(guild_id)
+
+    def _note_drop(self, gv: GuildVoice) -> None:
+        if gv.dropped_at is None:
+            gv.dropped_at = time.monotonic()
+            gv.state = DROPPED
+            voice_log.warning("Voice connection in guild %s dropped", gv.guild_id)
+
+    def _replay_drop(self, gv: GuildVoice) -> None:
+        """Handle a drop that arrived while the lock was held, if we're still not connected."""
+        if not gv.drop_pending or gv.lock.locked():
+            return
+        gv.drop_pending = False
+        vc = gv.voice_client
+        if vc is None or not vc.is_connected():
+            self._mark_dropped(gv.guild_id)
+
+    def reconnect_grace_left(self, guild: discord.Guild) -> float:
+        """Seconds left for discord.py to finish reconnecting on its own; 0 if it isn't.
+
+        It is reconnecting while `guild.voice_client` exists but isn't
+        connected. The window is VOICE_RECONNECT_GRACE from the recorded drop;
+        a dead client nobody reported yet is recorded as dropped now (unless
+        a connect holding the lock is still handshaking it).
+        """
+        vc = guild.voice_client
+        if vc is None or vc.is_connected():
+            return 0.0
+        gv = self.guild(guild.id)
+        if gv.target_channel_id is not None and not gv.lock.locked():
+            self._note_drop(gv)
+        since = gv.dropped_at if gv.dropped_at is not None else time.monotonic()
+        return max(0.0, since + VOICE_RECONNECT_GRACE - time.monotonic())
+
+    def note_bot_voice_state(self, guild_id: int, channel: Optional[discord.abc.Connectable]) -> None:
+        """Called for the bot's own voice-state updates to notice unexpected drops."""
+        if channel is None:
+            self._mark_dropped(guild_id)
+
+    def client_closed(self, vc: discord.VoiceClient) -> None:
+        """Called by SupervisedVoiceClient when discord.py tears a client down."""
+        guild_id = vc.guild.id
+        if voice_connections.get(guild_id) is vc:
+            self._mark_dropped(guild_id)
+
+    async def connect(
+        self,
+        channel: discord.VoiceChannel,
+        source: str,
+        retries: int = VOICE_CONNECT_RETRIES,
+    ) -> Optional[discord.VoiceClient]:
+        """Be connected to `channel`, moving or (re)connecting as needed.
+
+        Returns the voice client, or None when every attempt failed or the
+        channel's circuit breaker is open (`guild(...).last_error` says why).
+        `source` labels the attempt in metrics (auto, join, molda, watchdog).
+        """
+        gv = self.guild(channel.guild.id)
+        try:
+            async with gv.lock:
+                return await self._connect_locked(gv, channel, source, retries)
+        finally:
+            self._replay_drop(gv)
+
+    async def _connect_locked(self, gv, channel, source, retries) -> Optional[discord.VoiceClient]:
+        gv.target_channel_id = channel.id
+        gv.last_error = None
+        vc = channel.guild.voice_client
+        if vc is not None and not vc.is_connected():
+            # Don't tear down a client discord.py is still reconnecting
+            deadline = time.monotonic() + self.reconnect_grace_left(channel.guild)
+            while not vc.is_connected() and channel.guild.voice_client is vc:
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    break
+                await asyncio.sleep(min(left, 0.25))
+        vc = channel.guild.voice_client or gv.voice_client
+
+        if vc is not None and vc.is_connected():
+            if vc.channel is not None and vc.channel.id == channel.id:
+                voice_connections[gv.guild_id] = vc
+                self._connected(gv, channel, vc)
+                return vc
+            try:
+                await asyncio.wait_for(vc.move_to(channel), timeout=VOICE_CONNECT_TIMEOUT)
+                voice_connections[gv.guild_id] = vc
+                self._connected(gv, channel, vc)
+                voice_log.info("Moved to voice channel: %s", channel.name)
+                return vc
+            except Exception as e:
+                voice_log.warning("Move to %s failed (%s: %s); reconnecting", channel.name, type(e).__name__, e)
+
+        breaker = self.breaker(channel.id)
+        if not breaker.allow():
+            gv.state = IDLE if gv.dropped_at is None else DROPPED
+            gv.last_error = (
+                f"channel {channel.name} is failing voice handshakes; "
+                f"retrying in {breaker.remaining():.0f}s"
+            )
+            voice_log.info("Circuit open for %s; not connecting (%.0fs left)", channel.name, breaker.remaining())
+            return None
+
+        if vc is not None:
+            try:
+                await vc.disconnect(force=True)
+            except Exception as e:
+                voice_log.warning("Error disconnecting stale voice client in %s: %s", gv.guild_id, e)
+            voice_connections.pop(gv.guild_id, None)
+
+        for attempt in range(retries):
+            if attempt:
+                gv.state = BACKOFF
+                await asyncio.sleep(backoff_delay(attempt - 1))
+            gv.state = CONNECTING
+            voice_log.info("Connecting to %s (attempt %d/%d, %s)", channel.name, attempt + 1, retries, source)
+            start = time.perf_counter()
+            handshake_failure = False
+            try:
+                vc = await asyncio.wait_for(
+                    channel.connect(reconnect=True, cls=SupervisedVoiceClient), timeout=VOICE_CONNECT_TIMEOUT
+                )
+            except asyncio.TimeoutError:
+                result, gv.last_error = "timeout", "connection timed out"
+            except IndexError:
+                # discord.py fails picking an encryption mode Discord didn't offer
+                result, gv.last_error = "error", "voice handshake failed (no encryption modes offered)"
+                handshake_failure = True
+            except discord.errors.ConnectionClosed as e:
+                result, gv.last_error = "error", f"voice websocket closed with code {e.code}"
+                handshake_failure = e.code == 4006
+            except discord.Forbidden:
+                metrics.voice_connect.observe(time.perf_counter() - start, source=source, result="error")
+                gv.last_error = "missing permission to join"
+                break
+            except discord.ClientException as e:
+                # Already connected (e.g. discord.py reconnected on its own meanwhile)
+                existing = channel.guild.voice_client
+                if existing is not None and existing.is_connected():
+                    vc = existing
+                    result = "ok"
+                else:
+                    result, gv.last_error = "error", f"{type(e).__name__}: {e}"
+            except Exception as e:
+                result, gv.last_error = "error", f"{type(e).__name__}: {e}"
+            else:
+                result = "ok"
+
+            metrics.voice_connect.observe(time.perf_counter() - start, source=source, result=result)
+            if result == "ok":
+                breaker.record_success()
+                voice_connections[gv.guild_id] = vc
+                self._connected(gv, channel, vc)
+                voice_log.info("Joined voice channel: %s", channel.name)
+                return vc
+
+            voice_log.warning(
+                "Connect to %s failed (attempt %d/%d): %s", channel.name, attempt + 1, retries, gv.last_error
+            )
+            if handshake_failure and breaker.record_failure():
+                voice_log.error(
+                    "Opening circuit for %s after %d handshake failures; cooling down %.0fs",
+                    channel.name, breaker.failures, breaker.cooldown,
+                )
+                break
+
+        gv.state = DROPPED if gv.dropped_at is not None else IDLE
+        return None
+
+    def _connected(self, gv: GuildVoice, channel, vc) -> None:
+        gv.state = CONNECTED
+        if gv.dropped_at is not None:
+            gv.last_reconnect_seconds = time.monotonic() - gv.dropped_at
+            metrics.voice_reconnect.observe(gv.last_reconnect_seconds)
+            voice_log.info("Reconnected to %s %.2fs after drop", channel.name, gv.last_reconnect_seconds)
+            gv.dropped_at = None
+
+    async def disconnect(self, guild_id: int) -> bool:
+        """Intentionally leave voice in `guild_id`. Returns False if not connected."""
+        gv = self.guild(guild_id)
+        async with gv.lock:
+            gv.target_channel_id = None
+            gv.dropped_at = None
+            gv.drop_pending = False
+            gv.state = IDLE
+            vc = voice_connections.pop(guild_id, None)
+            if vc is None:
+                return False
+            try:
+                await vc.disconnect(force=True)
+            except Exception as e:
+                voice_log.warning("Error disconnecting from %s: %s", guild_id, e)
+            return True
+
+    def describe(self) -> List[str]:
+        lines = []
+        for guild_id, gv in sorted(self._guilds.items()):
+            vc = gv.voice_client
+            where = getattr(getattr(vc, "channel", None), "name", None) or "-"
+            line = f"Guild {guild_id}: {gv.state} | in {where}"
+            if gv.last_reconnect_seconds is not None:
+                line += f" | last reconnect {gv.last_reconnect_seconds:.1f}s"
+            if gv.last_error:
+                line += f" | last error: {gv.last_error}"
+            lines.append(line)
+        for channel_id, br in sorted(self._breakers.items()):
+            if br.opened_at is not None:
+                lines.append(f"Channel {channel_id}: circuit open ({br.failures} failures, {br.remaining():.0f}s left)")
+        return lines or ["No voice connections"]
+
+
+class SupervisedVoiceClient(discord.VoiceClient):
+    """VoiceClient that tells the supervisor when it is torn down.
+
+    discord.py calls `cleanup()` once a client is finished for good
+    (disconnect, failed internal reconnect, kicked from the channel), which
+    catches drops that never show up as a voice-state update.
+    """
+
+    def cleanup(self) -> None:
+        super().cleanup()
+        voice_supervisor.client_closed(self)
+
+
+voice_supervisor = VoiceSupervisor()
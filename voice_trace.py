@@ -0,0 +1,151 @@
+import atexit
+import json
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import discord
+
+from log import voice_log
+from voice_supervisor import voice_connections
+
+TRACE_VERSION = 1
+TRACE_DIR = Path(__file__).resolve().parent / "data" / "traces"
+
+# VoiceState flags packed into one int per side of a diff
+FLAG_BITS = (
+    ("mute", 1), ("deaf", 2), ("self_mute", 4),
+    ("self_deaf", 8), ("self_stream", 16), ("self_video", 32),
+)
+
+
+def pack_flags(state: discord.VoiceState) -> int:
+    return sum(bit for name, bit in FLAG_BITS if getattr(state, name, False))
+
+
+def unpack_flags(bits: int) -> Dict[str, bool]:
+    return {name: bool(bits & bit) for name, bit in FLAG_BITS}
+
+
+def _channel_id(state: discord.VoiceState) -> Optional[int]:
+    return state.channel.id if state.channel is not None else None
+
+
+def default_trace_path() -> Path:
+    return TRACE_DIR / time.strftime("voice-%Y%m%d-%H%M%S.jsonl")
+
+
+def read_trace(path: Path) -> Tuple[dict, List[dict]]:
+    """Return (header, records) of a trace file."""
+    with Path(path).open(encoding="utf8") as f:
+        lines: Iterator[str] = (line for line in f if line.strip())
+        header = json.loads(next(lines))
+        if header.get("k") != "h":
+            raise ValueError(f"{path} does not start with a trace header")
+        return header, [json.loads(line) for line in lines]
+
+
+class TraceRecorder:
+    """Records voice-state diffs and mute audit results as compact JSON lines.
+
+    One line per event, ids only (no names or message content):
+
+        {"k": "h", "v": 1, "bot": id, "voice": {guild: channel}, "wall": epoch}   header
+        {"t": s, "k": "v", "g": guild, "m": member, "b": 1, "c": [before, after], "f": [flags, flags]}
+        {"t": s, "k": "a", "g": guild, "m": target, "u": actor}                    gateway mute entry
+        {"t": s, "k": "l", "g": guild, "m": target, "u": actor, "s": source}       mute-actor lookup
+
+    `t` is seconds since recording started; "b" marks bot members. Callers
+    check `active` first, so nothing is built while recording is off.
+    Records are serialized and written by a background thread.
+    """
+
+    def __init__(self):
+        self.active = False
+        self.path: Optional[Path] = None
+        self.events = 0
+        self._t0 = 0.0
+        self._queue: "queue.SimpleQueue[Optional[dict]]" = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, path: Path, bot_id: int) -> Path:
+        """Start writing a new trace to `path` (stopping any current one)."""
+        self.stop()
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        out = path.open("w", encoding="utf8")
+        self._write(out, {
+            "k": "h", "v": TRACE_VERSION, "bot": bot_id, "wall": time.time(),
+            "voice": {
+                str(gid): vc.channel.id for gid, vc in voice_connections.items()
+                if getattr(vc, "channel", None) is not None
+            },
+        })
+        self.path, self.events = path, 0
+        self._t0 = time.monotonic()
+        self._thread = threading.Thread(target=self._writer, args=(out,), name="voice-trace", daemon=True)
+        self._thread.start()
+        self.active = True
+        voice_log.info("Recording voice trace to %s", path)
+        return path
+
+    def stop(self) -> int:
+        """Stop recording and flush. Returns the number of events written."""
+        if not self.active:
+            return 0
+        self.active = False
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+        voice_log.info("Voice trace %s closed (%d events)", self.path, self.events)
+        return self.events
+
+    @staticmethod
+    def _write(out, record: dict) -> None:
+        out.write(json.dumps(record, separators=(",", ":")))
+        out.write("\n")
+
+    def _writer(self, out) -> None:
+        with out:
+            while True:
+                record = self._queue.get()
+                if record is None:
+                    return
+                self._write(out, record)
+
+    def _emit(self, record: dict) -> None:
+        record["t"] = round(time.monotonic() - self._t0, 4)
+        self.events += 1
+        self._queue.put(record)
+
+    def voice(self, member: discord.Member, before: discord.VoiceState, after: discord.VoiceState) -> None:
+        record = {
+            "k": "v", "g": member.guild.id, "m": member.id,
+            "c": [_channel_id(before), _channel_id(after)],
+            "f": [pack_flags(before), pack_flags(after)],
+        }
+        if member.bot:
+            record["b"] = 1
+        self._emit(record)
+
+    def audit(self, entry: discord.AuditLogEntry) -> None:
+        actor_id = entry.user.id if entry.user is not None else entry.user_id
+        self._emit({"k": "a", "g": entry.guild.id, "m": entry.target.id, "u": actor_id})
+
+    def lookup(self, guild_id: int, target_id: int, actor, source: str) -> None:
+        self._emit({
+            "k": "l", "g": guild_id, "m": target_id,
+            "u": actor.id if actor is not None else None, "s": source,
+        })
+
+    def describe(self) -> str:
+        if not self.active:
+            return "Voice trace: off"
+        return f"Voice trace: recording to {self.path} ({self.events} events)"
+
+
+trace_recorder = TraceRecorder()
+# Flush whatever is still queued when the process exits
+atexit.register(trace_recorder.stop)